@@ -0,0 +1,137 @@
+import os
+import queue
+import logging
+import threading
+from datetime import datetime
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+QUEUE_SIZE     = int(os.getenv("ACTIVITY_QUEUE_SIZE",       10_000))  # events
+BATCH_SIZE     = int(os.getenv("ACTIVITY_BATCH_SIZE",       500))     # rows per COPY
+FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", 1.0))     # seconds
+PUT_TIMEOUT    = float(os.getenv("ACTIVITY_PUT_TIMEOUT",    0.0))     # 0 → drop at once
+
+COLUMNS = ("user_id", "action", "details", "ip_address", "user_agent", "severity", "created_at")
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def _copy_rows(db_config: dict, rows: list[tuple]):
+    """Write a batch of activity rows with a single COPY."""
+    with psycopg.connect(**db_config) as conn:
+        with conn.cursor() as cur:
+            with cur.copy(f"COPY activity_logs ({', '.join(COLUMNS)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+        conn.commit()
+
+
+# ── ActivityWriter thread ──────────────────────────────────────────────────────
+
+class ActivityWriter(threading.Thread):
+    """
+    Write-behind pipeline for activity_logs.
+
+    Request handlers call enqueue(), which never touches the database; this
+    daemon thread drains the bounded queue and flushes batches of up to
+    BATCH_SIZE rows every FLUSH_INTERVAL seconds. When the queue is full the
+    event is dropped and counted, so a slow DB never slows user-facing routes.
+
+    on_flush, if given, is called with the set of user ids in each batch once
+    it is committed – caches derived from activity_logs are dropped then,
+    not when the event was queued and the row didn't exist yet.
+    """
+
+    def __init__(self, db_config: dict, writer=_copy_rows,
+                 queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, put_timeout: float = PUT_TIMEOUT,
+                 on_flush=None):
+        super().__init__(name="ActivityWriter", daemon=True)
+        self._db_config      = db_config
+        self._writer         = writer
+        self._queue          = queue.Queue(maxsize=queue_size)
+        self._batch_size     = batch_size
+        self._flush_interval = flush_interval
+        self._put_timeout    = put_timeout
+        self._on_flush       = on_flush
+        self._stop_event     = threading.Event()
+
+        self._lock     = threading.Lock()
+        self._counters = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    # ── Public API ─────────────────────────────────────────────────────────────
+
+    def enqueue(self, user_id, action, details=None, ip_address=None,
+                user_agent=None, severity="info") -> bool:
+        """Queue one event. Returns False if it was dropped because the queue is full."""
+        row = (user_id, action, details, ip_address, user_agent, severity, datetime.utcnow())
+        try:
+            if self._put_timeout > 0:
+                self._queue.put(row, timeout=self._put_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters["queue_depth"] = self._queue.qsize()
+        return counters
+
+    def stop(self, timeout: float = 10.0):
+        """Signal the writer to exit and wait for the queue to be flushed."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
+
+    def run(self):
+        logger.info("ActivityWriter started (batch=%d, interval=%.2fs)",
+                    self._batch_size, self._flush_interval)
+        while not self._stop_event.is_set():
+            self._stop_event.wait(timeout=self._flush_interval)
+            self._drain()
+        self._drain()
+        logger.info("ActivityWriter stopped")
+
+    # ── Internal ───────────────────────────────────────────────────────────────
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _drain(self):
+        while True:
+            batch = []
+            try:
+                while len(batch) < self._batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                return
+            self._flush(batch)
+            if len(batch) < self._batch_size:
+                return
+
+    def _flush(self, batch: list[tuple]):
+        try:
+            self._writer(self._db_config, batch)
+            self._count("written", len(batch))
+            self._count("batches")
+        except Exception as exc:
+            self._count("failed", len(batch))
+            logger.error("ActivityWriter: batch of %d rows failed – %s", len(batch), exc)
+            return
+        if self._on_flush is not None:
+            try:
+                self._on_flush({row[0] for row in batch if row[0] is not None})
+            except Exception as exc:
+                logger.warning("ActivityWriter: on_flush hook failed – %s", exc)
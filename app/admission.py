@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+WORKSPACE_MEM_MB     = int(os.getenv("WORKSPACE_MEM_MB",            512))
+WORKSPACE_MIN_MEM_MB = int(os.getenv("WORKSPACE_MIN_MEM_MB",        256))   # downsize floor
+WORKSPACE_CPUS       = float(os.getenv("WORKSPACE_CPUS",            1.0))
+WORKSPACE_MIN_CPUS   = float(os.getenv("WORKSPACE_MIN_CPUS",        0.5))
+MEM_RESERVE_MB       = int(os.getenv("ADMISSION_MEM_RESERVE_MB",    1024))  # never hand out
+CPU_HIGH_PERCENT     = float(os.getenv("ADMISSION_CPU_HIGH",        85.0))  # → fewer CPUs
+CPU_MAX_PERCENT      = float(os.getenv("ADMISSION_CPU_MAX",         95.0))  # → wait
+MAX_WORKSPACES       = int(os.getenv("ADMISSION_MAX_WORKSPACES",    0))     # 0 → no host cap
+USER_QUOTA           = int(os.getenv("WORKSPACE_QUOTA_PER_USER",    3))     # running at once
+QUEUE_TIMEOUT        = float(os.getenv("ADMISSION_QUEUE_TIMEOUT",   20.0))  # seconds
+POLL_INTERVAL        = float(os.getenv("ADMISSION_POLL_INTERVAL",   1.0))
+RETRY_AFTER          = 10                                                   # seconds, on 503
+MONITOR_MAX_AGE      = 60                                                   # seconds
+
+
+class AdmissionError(Exception):
+    """A launch was refused. *status* is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 503, reason: str = "capacity",
+                 retry_after: int | None = None):
+        super().__init__(message)
+        self.status      = status
+        self.reason      = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Decision:
+    action: str            # admit | downsize | queue | reject
+    mem_mb: int = 0
+    cpus: float = 0.0
+    reason: str = ""
+
+
+# ── Host snapshot ──────────────────────────────────────────────────────────────
+
+def host_resources(summary: dict | None = None) -> dict:
+    """
+    CPU % and available memory for the host. Uses the SystemMonitor summary
+    when it is recent, otherwise asks psutil directly (non-blocking).
+    """
+    host = (summary or {}).get("host") or {}
+    fresh = False
+    if summary and "mem_available_mb" in host:
+        try:
+            from datetime import datetime
+            age = (datetime.utcnow() - datetime.fromisoformat(summary["timestamp"])).total_seconds()
+            fresh = age <= MONITOR_MAX_AGE
+        except (KeyError, ValueError):
+            pass
+    if fresh:
+        return {"cpu_percent": host.get("cpu_percent", 0.0),
+                "mem_available_mb": host["mem_available_mb"], "source": "monitor"}
+
+    import psutil
+    return {"cpu_percent": psutil.cpu_percent(interval=None),
+            "mem_available_mb": round(psutil.virtual_memory().available / 1024**2, 2),
+            "source": "psutil"}
+
+
+# ── Policy ─────────────────────────────────────────────────────────────────────
+
+def decide(host: dict, running_workspaces: int, user_workspaces: int,
+           pending_mb: int = 0, quota: int = USER_QUOTA,
+           max_workspaces: int = MAX_WORKSPACES) -> Decision:
+    """
+    Pure admission policy. *host* has cpu_percent and mem_available_mb;
+    *pending_mb* is memory promised to launches that haven't started yet.
+    """
+    if quota and user_workspaces >= quota:
+        return Decision("reject", reason=f"You already have {user_workspaces} workspaces running "
+                                         f"(limit {quota}). Stop one first.")
+    if max_workspaces and running_workspaces >= max_workspaces:
+        return Decision("queue", reason="Host is at its workspace limit.")
+
+    cpu  = host.get("cpu_percent", 0.0)
+    free = host.get("mem_available_mb", 0.0) - MEM_RESERVE_MB - pending_mb
+    if cpu >= CPU_MAX_PERCENT:
+        return Decision("queue", reason=f"Host CPU is saturated ({cpu:.0f}%).")
+    if free < WORKSPACE_MIN_MEM_MB:
+        return Decision("queue", reason="Not enough free memory on the host.")
+
+    mem_mb = min(WORKSPACE_MEM_MB, int(free))
+    cpus   = WORKSPACE_MIN_CPUS if cpu >= CPU_HIGH_PERCENT else WORKSPACE_CPUS
+    if mem_mb < WORKSPACE_MEM_MB or cpus < WORKSPACE_CPUS:
+        why = "memory is tight" if mem_mb < WORKSPACE_MEM_MB else f"CPU is busy ({cpu:.0f}%)"
+        return Decision("downsize", mem_mb, cpus, f"Started with reduced resources because host {why}.")
+    return Decision("admit", mem_mb, cpus)
+
+
+# ── Controller ─────────────────────────────────────────────────────────────────
+
+class Ticket:
+    """Resources promised to one launch; release() once the container is up (or failed)."""
+
+    def __init__(self, controller, user_id, decision: Decision, slot=None):
+        self.user_id  = user_id
+        self.decision = decision
+        self._controller = controller
+        self._slot       = slot
+        self._released   = False
+
+    @property
+    def mem_mb(self) -> int:
+        return self.decision.mem_mb
+
+    @property
+    def cpus(self) -> float:
+        return self.decision.cpus
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+            if self._slot is not None:
+                self._slot.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Gatekeeper for launch_workspace.
+
+    admit() checks the user's quota and the host's headroom. When the host
+    is full, callers wait in FIFO order (up to QUEUE_TIMEOUT) for capacity to
+    free up; memory granted to launches still in flight is counted so that
+    concurrent launches can't all see the same free memory.
+
+    With *slots* (a cluster.SlotPool sized to the quota) each launch in
+    flight also holds a slot in the shared store, so a user's quota counts
+    launches on every worker, not only this one.
+    """
+
+    def __init__(self, snapshot, sleep=time.sleep, queue_timeout: float = QUEUE_TIMEOUT,
+                 poll_interval: float = POLL_INTERVAL, slots=None):
+        self._snapshot      = snapshot          # () -> (host, running, {user_id: count})
+        self._slots         = slots
+        self._sleep         = sleep
+        self._queue_timeout = queue_timeout
+        self._poll_interval = poll_interval
+
+        self._lock     = threading.Lock()
+        self._waiting  = deque()
+        self._pending: list[Ticket] = []
+        self._counters = {"admitted": 0, "downsized": 0, "queued": 0,
+                          "rejected_quota": 0, "rejected_capacity": 0}
+
+    def admit(self, user_id) -> Ticket:
+        """Return a Ticket, or raise AdmissionError with user-facing feedback."""
+        marker   = object()
+        deadline = time.monotonic() + self._queue_timeout
+        queued   = False
+        with self._lock:
+            self._waiting.append(marker)
+        try:
+            while True:
+                with self._lock:
+                    at_head = self._waiting[0] is marker
+                if at_head:
+                    host, running, per_user = self._snapshot()
+                    slot = self._claim(user_id)
+                    # Launches in flight elsewhere, on any worker (ours holds the slot just taken).
+                    user_pending = self._slots.count(user_id) - 1 if slot is not None else None
+                    with self._lock:
+                        pending_mb = sum(t.mem_mb for t in self._pending)
+                        if user_pending is None:
+                            user_pending = sum(1 for t in self._pending if t.user_id == user_id)
+                        decision = decide(host, running + len(self._pending),
+                                          per_user.get(user_id, 0) + user_pending, pending_mb)
+                        if decision.action in ("admit", "downsize"):
+                            ticket = Ticket(self, user_id, decision, slot)
+                            self._pending.append(ticket)
+                            self._counters["admitted"] += 1
+                            if decision.action == "downsize":
+                                self._counters["downsized"] += 1
+                            return ticket
+                    if slot is not None:
+                        slot.release()
+                    with self._lock:
+                        if decision.action == "reject":
+                            self._counters["rejected_quota"] += 1
+                            raise AdmissionError(decision.reason, status=429, reason="quota")
+                        if not queued:
+                            queued = True
+                            self._counters["queued"] += 1
+                if time.monotonic() >= deadline:
+                    with self._lock:
+                        self._counters["rejected_capacity"] += 1
+                    reason = decision.reason if at_head else "Too many launches are waiting."
+                    raise AdmissionError(f"{reason} Please try again shortly.",
+                                         status=503, reason="capacity",
+                                         retry_after=RETRY_AFTER)
+                self._sleep(self._poll_interval)
+        finally:
+            with self._lock:
+                self._waiting.remove(marker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["waiting"]    = len(self._waiting)
+            counters["in_flight"]  = len(self._pending)
+            counters["pending_mb"] = sum(t.mem_mb for t in self._pending)
+        counters["limits"] = {
+            "per_user": USER_QUOTA, "max_workspaces": MAX_WORKSPACES,
+            "mem_mb": WORKSPACE_MEM_MB, "min_mem_mb": WORKSPACE_MIN_MEM_MB,
+            "cpus": WORKSPACE_CPUS, "min_cpus": WORKSPACE_MIN_CPUS,
+        }
+        return counters
+
+    def _claim(self, user_id):
+        """A shared in-flight slot for *user_id*, or AdmissionError when all are taken."""
+        if self._slots is None:
+            return None
+        slot = self._slots.acquire(user_id)
+        if slot is None:
+            with self._lock:
+                self._counters["rejected_quota"] += 1
+            raise AdmissionError(f"You already have {self._slots.limit} workspaces launching "
+                                 f"(limit {self._slots.limit}). Wait for one to start.",
+                                 status=429, reason="quota")
+        return slot
+
+    def _release(self, ticket: Ticket):
+        with self._lock:
+            if ticket in self._pending:
+                self._pending.remove(ticket)
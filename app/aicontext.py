@@ -0,0 +1,278 @@
+import os
+import re
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+CONTEXT_TOKENS    = int(os.getenv("AI_CONTEXT_TOKENS",        6000))   # budget for code context
+CHARS_PER_TOKEN   = float(os.getenv("AI_CHARS_PER_TOKEN",     4.0))    # estimate, no tokenizer
+CURSOR_WINDOW     = int(os.getenv("AI_CONTEXT_WINDOW",        40))     # lines around the cursor
+CHUNK_CACHE_FILES = int(os.getenv("AI_CONTEXT_CACHE_FILES",   64))
+MAX_CONTEXT_CHARS = int(os.getenv("AI_MAX_CONTEXT_CHARS",     2_000_000))
+HEAD_LINES        = 30                                                 # imports / module header
+GAP_TOKENS        = 8                                                  # cost of an omission marker
+
+_DEF_RE = re.compile(
+    r"^(?P<indent>[ \t]*)"
+    r"(?:export\s+)?(?:default\s+)?(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?"
+    r"(?:(?:public|private|protected|static|abstract|final)\s+)*"
+    r"(?:(?P<kind>def|class|function\*?|func|fn|interface|struct|enum|trait|impl|type)\s+"
+    r"(?P<name>[A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+(?P<var>[A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?"
+    r"(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>))"
+)
+_IDENT_RE = re.compile(r"[A-Za-z_$][\w$]*")
+_CLOSERS  = (")", "}", "]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (chars / AI_CHARS_PER_TOKEN); errs on the high side for prose."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def _indent(line: str) -> int:
+    line = line.expandtabs(4)
+    return len(line) - len(line.lstrip())
+
+
+# ── Chunking ───────────────────────────────────────────────────────────────────
+
+@dataclass
+class Definition:
+    name: str
+    start: int      # first line, decorators included (0-based)
+    line: int       # the def / class line itself
+    end: int        # last line, inclusive
+    indent: int = 0
+
+
+def _find_definitions(lines: list) -> list:
+    """
+    Function / class / type definitions across common languages. A block
+    ends before the next non-blank line indented no deeper than its header;
+    a closing bracket at the header's indent belongs to the block.
+    """
+    defs = []
+    n = len(lines)
+    for i, line in enumerate(lines):
+        m = _DEF_RE.match(line)
+        if not m:
+            continue
+        indent = _indent(line)
+        start = i
+        while start > 0 and lines[start - 1].strip().startswith("@") and _indent(lines[start - 1]) == indent:
+            start -= 1
+        end = i
+        for j in range(i + 1, n):
+            s = lines[j].strip()
+            if not s:
+                continue
+            if _indent(lines[j]) > indent:
+                end = j
+                continue
+            if s.startswith(_CLOSERS):
+                end = j
+                if s.endswith((":", "{")):      # multi-line signature, body follows
+                    continue
+            break
+        defs.append(Definition(m.group("name") or m.group("var"), start, i, end, indent))
+    return defs
+
+
+class FileChunks:
+    """A file split into lines and definitions, with a char prefix sum for cheap token counts."""
+
+    def __init__(self, text: str):
+        self.lines = text.split("\n")
+        self._prefix = [0]
+        for line in self.lines:
+            self._prefix.append(self._prefix[-1] + len(line) + 1)
+        self.definitions = _find_definitions(self.lines)
+        self.by_name: dict = {}
+        for d in self.definitions:
+            self.by_name.setdefault(d.name, []).append(d)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def tokens(self, start: int, end: int) -> int:
+        """Estimated tokens for lines start..end inclusive."""
+        return math.ceil((self._prefix[end + 1] - self._prefix[start]) / CHARS_PER_TOKEN)
+
+    def enclosing(self, line: int) -> list:
+        """Definitions containing *line*, outermost first."""
+        return sorted((d for d in self.definitions if d.start <= line <= d.end), key=lambda d: d.start)
+
+    def head_end(self) -> int:
+        """Last line of the module header (imports, constants) before the first definition."""
+        first = min((d.start for d in self.definitions), default=len(self.lines))
+        return max(0, min(first, HEAD_LINES) - 1)
+
+
+class ChunkCache:
+    """LRU of FileChunks keyed by the file's sha256, so edits re-chunk and re-asks don't."""
+
+    def __init__(self, max_files: int = CHUNK_CACHE_FILES):
+        self._max   = max_files
+        self._lock  = threading.Lock()
+        self._files: OrderedDict = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, text: str) -> FileChunks:
+        key = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            chunks = self._files.get(key)
+            if chunks is not None:
+                self._files.move_to_end(key)
+                self._counters["hits"] += 1
+                return chunks
+            self._counters["misses"] += 1
+        chunks = FileChunks(text)
+        with self._lock:
+            self._files[key] = chunks
+            while len(self._files) > self._max:
+                self._files.popitem(last=False)
+        return chunks
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "files": len(self._files)}
+
+
+chunk_cache = ChunkCache()
+
+
+# ── Selection ──────────────────────────────────────────────────────────────────
+
+@dataclass
+class Context:
+    text: str
+    tokens: int
+    original_tokens: int
+    truncated: bool
+    ranges: list = field(default_factory=list)     # kept (first, last), 1-based
+
+
+class _Picker:
+    """Greedily collects line ranges while the rendered excerpt stays within budget."""
+
+    def __init__(self, chunks: FileChunks, budget: int):
+        self.chunks = chunks
+        self.budget = budget
+        self.ranges: list = []
+
+    def cost(self, ranges) -> int:
+        gaps = sum(1 for a, b in zip(ranges, ranges[1:]) if b[0] > a[1] + 1)
+        gaps += bool(ranges and ranges[0][0] > 0) + bool(ranges and ranges[-1][1] < len(self.chunks) - 1)
+        return sum(self.chunks.tokens(a, b) for a, b in ranges) + gaps * GAP_TOKENS
+
+    def add(self, start: int, end: int, partial: bool = False) -> bool:
+        """Keep lines start..end; with *partial*, as much of it from *start* as fits."""
+        start, end = max(0, start), min(end, len(self.chunks) - 1)
+        if start > end:
+            return False
+        if self.cost(self._merged(start, end)) <= self.budget:
+            self.ranges = self._merged(start, end)
+            return True
+        if not partial:
+            return False
+        lo, hi = start - 1, end           # binary search the last line that still fits
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.cost(self._merged(start, mid)) <= self.budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        if lo < start:
+            return False
+        self.ranges = self._merged(start, lo)
+        return True
+
+    def _merged(self, start: int, end: int) -> list:
+        result = []
+        for a, b in sorted(self.ranges + [(start, end)]):
+            if result and a <= result[-1][1] + 1:
+                result[-1] = (result[-1][0], max(result[-1][1], b))
+            else:
+                result.append((a, b))
+        return result
+
+    def render(self) -> str:
+        lines, out, pos = self.chunks.lines, [], 0
+        for a, b in self.ranges:
+            if a > pos:
+                out.append(f"⋯ lines {pos + 1}-{a} omitted ⋯")
+            out.extend(lines[a:b + 1])
+            pos = b + 1
+        if pos < len(lines):
+            out.append(f"⋯ lines {pos + 1}-{len(lines)} omitted ⋯")
+        return "\n".join(out)
+
+
+def build_context(text: str, query: str = "", cursor_line: int | None = None,
+                  selection: tuple | None = None, budget: int = CONTEXT_TOKENS,
+                  cache: ChunkCache = chunk_cache) -> Context:
+    """
+    Fit *text* into *budget* tokens. Small files pass through untouched;
+    larger ones are cut down to, in priority order: the selection (or a
+    window around the cursor), the headers and body of the definitions
+    enclosing it, definitions referenced from the query or the focus, the
+    module header, an outline of top-level definitions, then the rest of
+    the file from the top while budget remains.
+    *cursor_line* and *selection* (first, last) are 1-based.
+    """
+    chunks = cache.get(text)
+    n = len(chunks)
+    total = chunks.tokens(0, n - 1)
+    if total <= budget:
+        return Context(text, total, total, False, [(1, n)])
+
+    picker = _Picker(chunks, budget)
+    focus = []
+    if selection:
+        lo, hi = sorted(selection)
+        lo, hi = max(1, lo) - 1, min(n, hi) - 1
+    elif cursor_line:
+        cur = min(max(1, cursor_line), n) - 1
+        lo, hi = cur - CURSOR_WINDOW // 2, cur + CURSOR_WINDOW // 2
+        picker.add(cur, cur)
+    else:
+        lo = hi = None
+
+    if lo is not None:
+        picker.add(lo, hi, partial=True)
+        focus = chunks.lines[max(0, lo):hi + 1]
+        enclosing = chunks.enclosing(max(0, lo))
+        for d in enclosing:
+            picker.add(d.start, d.line)
+        if enclosing:
+            picker.add(enclosing[-1].start, enclosing[-1].end)
+        skip = {id(d) for d in enclosing}
+    else:
+        skip = set()
+
+    seen = set()
+    for name in _IDENT_RE.findall(query + "\n" + "\n".join(focus)):
+        if name in seen:
+            continue
+        seen.add(name)
+        for d in chunks.by_name.get(name, ()):
+            if id(d) not in skip and not picker.add(d.start, d.end):
+                picker.add(d.start, d.line)
+
+    picker.add(0, chunks.head_end(), partial=True)
+    for d in chunks.definitions:
+        if d.indent == 0:
+            picker.add(d.line, d.line)
+    picker.add(0, n - 1, partial=True)                   # spend what's left from the top
+
+    rendered = picker.render()
+    return Context(rendered, picker.cost(picker.ranges), total, True,
+                   [(a + 1, b + 1) for a, b in picker.ranges])
@@ -1,37 +1,64 @@
-from flask import Flask, jsonify, render_template, request, session, redirect, url_for, flash
+from flask import (
+    Flask, jsonify, render_template, request, session, redirect, url_for, flash,
+    stream_with_context
+)
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import (
-    LoginManager, UserMixin, login_user, logout_user,
+    LoginManager, login_user, logout_user,
     login_required, current_user
 )
 from werkzeug.security import generate_password_hash, check_password_hash
 import psycopg
 from psycopg.rows import dict_row
 import os
-import git
 from datetime import datetime, timedelta
 import secrets
+import importlib.util
 import hashlib
+import base64
 import json
 import logging
 from functools import wraps
-import docker
+from collections import Counter
 import time
 import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# google-generativeai takes most of a second to import, so it is only
+# located here and imported by _get_gemini_client() on the first AI request.
 try:
-    import google.generativeai as genai
-    _GENAI_AVAILABLE = True
-except ImportError:
-    genai = None
+    _GENAI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except ModuleNotFoundError:         # no "google" namespace package at all
     _GENAI_AVAILABLE = False
+if not _GENAI_AVAILABLE:
     logging.warning("google-generativeai not installed. AI assistant will be disabled.")
 
+from store import get_store, RedisStore
+from activity import ActivityWriter
+from terminal import TerminalManager, TerminalLimitError, TERMINAL_MAX_PER_USER, TERMINAL_REAP_INTERVAL
+from logstream import LogTailRegistry, parse_time, parse_line, split_lines
+from hibernate import WorkspaceHibernator, CHECK_INTERVAL as HIBERNATE_CHECK_INTERVAL
+from jsonprovider import FastJSONProvider
+from compression import enable_compression
+from health import HealthChecker, DatabaseProbe, monitor_probe, HEALTH_TIMEOUT
+from cluster import WorkerBus, TerminalDirectory, Lease, SlotPool, MESSAGE_QUEUE, socketio_options
+from admission import AdmissionController, AdmissionError, host_resources, USER_QUOTA, QUEUE_TIMEOUT
+from dockerclient import get_docker, docker_stats
+from aicontext import build_context, chunk_cache, MAX_CONTEXT_CHARS
+from retrieval import RetrievalRegistry
+from assistant import (AIMetrics, ResponseCache, AIConcurrencyLimiter, AIBusyError, FakeModel,
+                       cache_key, cached_events, complete, response_text, usage_of, sse,
+                       stream_events, AI_MAX_PER_USER, AI_RETRIES, AI_TIMEOUT)
+
 try:
-    from monitor import SystemMonitor
+    from monitor import SystemMonitor, scope_summary, HISTORY_MINUTES, POLL_INTERVAL as MONITOR_POLL_INTERVAL
 except ImportError:
     SystemMonitor = None
+    scope_summary = None
+    HISTORY_MINUTES = 0
+    MONITOR_POLL_INTERVAL = 0
     logging.warning("monitor.py not found. Real-time stats will be disabled.")
 
 logging.basicConfig(level=logging.INFO)
@@ -40,11 +67,14 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(32))
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-app.config['JSON_SORT_KEYS'] = False
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
+app.json = FastJSONProvider(app)       # compact; datetimes / Decimals handled
+enable_compression(app)                # gzip / br for /api/ responses
 
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*", ping_timeout=120, ping_interval=25)
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor'])
+# With SOCKETIO_MESSAGE_QUEUE set, emits and rooms go through Redis so any
+# number of gunicorn workers (and hosts) can serve clients.
+socketio = SocketIO(app, cors_allowed_origins="*", ping_timeout=120, ping_interval=25,
+                    **socketio_options())
 
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
@@ -52,8 +82,27 @@ login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
 
-class User(UserMixin):
-    """Lightweight User model backed by PostgreSQL."""
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))   # seconds, shared store
+USER_LOCAL_TTL = float(os.getenv("USER_LOCAL_TTL", 5))  # seconds, per-worker copy
+_USER_COLUMNS  = "id, username, email, password_hash, created_at"
+
+_user_cache: dict = {}              # user_id → (expires_at, User)
+_user_cache_lock = threading.Lock()
+
+
+class User:
+    """
+    Lightweight User model backed by PostgreSQL.
+
+    Implements the Flask-Login user interface directly (instead of UserMixin)
+    so instances can use __slots__ – they are cached per worker by load_user.
+    """
+    __slots__ = ('id', 'username', 'email', 'password_hash', 'created_at')
+
+    is_authenticated = True
+    is_active        = True
+    is_anonymous     = False
+
     def __init__(self, id, username, email, password_hash, created_at=None):
         self.id = id
         self.username = username
@@ -61,15 +110,43 @@ class User(UserMixin):
         self.password_hash = password_hash
         self.created_at = created_at
 
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # Cached users carry no hash; callers re-read the row before checking.
+        return bool(self.password_hash) and check_password_hash(self.password_hash, password)
+
+    def to_cache(self):
+        """Shared-store payload. The password hash is deliberately left out."""
+        return json.dumps({
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        })
+
+    @staticmethod
+    def from_cache(raw):
+        data = json.loads(raw)
+        if data.get('created_at'):
+            data['created_at'] = datetime.fromisoformat(data['created_at'])
+        return User(password_hash=None, **data)
 
     @staticmethod
     def get_by_id(user_id):
         try:
             with get_db_connection() as conn:
                 with conn.cursor(row_factory=dict_row) as cur:
-                    cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+                    cur.execute(f"SELECT {_USER_COLUMNS} FROM users WHERE id = %s", (user_id,))
                     row = cur.fetchone()
                     if row:
                         return User(**row)
@@ -77,12 +154,56 @@ class User(UserMixin):
             logger.error(f"User.get_by_id error: {e}")
         return None
 
+    @staticmethod
+    def get_cached(user_id):
+        """
+        Resolve a user through the per-worker cache, then the shared store,
+        and only then the database. Store entries live for USER_CACHE_TTL
+        seconds; the per-worker copy only USER_LOCAL_TTL, because invalidate()
+        can't reach other workers' memory and that bounds how stale they get.
+        The cached User has no password hash.
+        """
+        now = time.monotonic()
+        with _user_cache_lock:
+            hit = _user_cache.get(user_id)
+        if hit and hit[0] > now:
+            return hit[1]
+
+        user = None
+        raw = get_store().get(f"user:{user_id}")
+        if raw:
+            try:
+                user = User.from_cache(raw)
+            except (ValueError, TypeError, KeyError):
+                user = None
+
+        if user is None:
+            user = User.get_by_id(user_id)
+            if user is None:
+                return None
+            get_store().set(f"user:{user_id}", user.to_cache(), ttl=USER_CACHE_TTL)
+            user.password_hash = None
+
+        with _user_cache_lock:
+            _user_cache[user_id] = (now + USER_LOCAL_TTL, user)
+        return user
+
+    @staticmethod
+    def invalidate(user_id):
+        """
+        Drop a user from the shared store and this worker's copy after their
+        row changes; other workers' copies expire within USER_LOCAL_TTL.
+        """
+        with _user_cache_lock:
+            _user_cache.pop(user_id, None)
+        get_store().delete(f"user:{user_id}")
+
     @staticmethod
     def get_by_username(username):
         try:
             with get_db_connection() as conn:
                 with conn.cursor(row_factory=dict_row) as cur:
-                    cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+                    cur.execute(f"SELECT {_USER_COLUMNS} FROM users WHERE username = %s", (username,))
                     row = cur.fetchone()
                     if row:
                         return User(**row)
@@ -95,7 +216,7 @@ class User(UserMixin):
         try:
             with get_db_connection() as conn:
                 with conn.cursor(row_factory=dict_row) as cur:
-                    cur.execute("SELECT * FROM users WHERE email = %s", (email,))
+                    cur.execute(f"SELECT {_USER_COLUMNS} FROM users WHERE email = %s", (email,))
                     row = cur.fetchone()
                     if row:
                         return User(**row)
@@ -106,7 +227,7 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get_by_id(int(user_id))
+    return User.get_cached(int(user_id))
 
 
 DB_CONFIG = {
@@ -118,9 +239,6 @@ DB_CONFIG = {
     'connect_timeout': 10
 }
 
-cache = {'metrics': {}, 'projects': {}, 'last_update': {}}
-
-
 def get_db_connection():
     try:
         return psycopg.connect(**DB_CONFIG)
@@ -129,113 +247,34 @@ def get_db_connection():
         raise
 
 
-def init_db():
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id            SERIAL PRIMARY KEY,
-                        username      VARCHAR(80)  NOT NULL UNIQUE,
-                        email         VARCHAR(255) NOT NULL UNIQUE,
-                        password_hash VARCHAR(255) NOT NULL,
-                        created_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS projects (
-                        id             SERIAL PRIMARY KEY,
-                        name           VARCHAR(255) NOT NULL,
-                        description    TEXT,
-                        repository_url VARCHAR(500),
-                        status         VARCHAR(50)  DEFAULT 'active',
-                        owner_id       INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                        tags           TEXT,
-                        env_vars       JSONB        DEFAULT '{}'::jsonb,
-                        created_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                cursor.execute("""
-                    ALTER TABLE projects
-                        ADD COLUMN IF NOT EXISTS env_vars JSONB DEFAULT '{}'::jsonb
-                """)
+_activity_writer = None
+_activity_writer_lock = threading.Lock()
 
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS activity_logs (
-                        id         SERIAL PRIMARY KEY,
-                        user_id    INTEGER REFERENCES users(id) ON DELETE SET NULL,
-                        action     VARCHAR(255) NOT NULL,
-                        details    TEXT,
-                        ip_address VARCHAR(45),
-                        user_agent TEXT,
-                        severity   VARCHAR(20) DEFAULT 'info',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
 
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS deployments (
-                        id          SERIAL PRIMARY KEY,
-                        project_id  INTEGER REFERENCES projects(id) ON DELETE CASCADE,
-                        environment VARCHAR(50),
-                        status      VARCHAR(50),
-                        version     VARCHAR(50),
-                        commit_hash VARCHAR(100),
-                        deployed_by VARCHAR(255),
-                        duration_ms INTEGER,
-                        deployed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS system_metrics (
-                        id           SERIAL PRIMARY KEY,
-                        metric_name  VARCHAR(100),
-                        metric_value FLOAT,
-                        unit         VARCHAR(50),
-                        recorded_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS user_sessions (
-                        id            SERIAL PRIMARY KEY,
-                        session_id    VARCHAR(255) UNIQUE,
-                        user_agent    TEXT,
-                        ip_address    VARCHAR(45),
-                        connected_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                conn.commit()
-                logger.info("Database initialized successfully")
-    except Exception as e:
-        logger.error(f"Database initialization error: {e}")
-
-
-with app.app_context():
-    init_db()
+def get_activity_writer():
+    """Start the background activity log writer on first use (one per worker)."""
+    global _activity_writer
+    if _activity_writer is None:
+        with _activity_writer_lock:
+            if _activity_writer is None:
+                writer = ActivityWriter(DB_CONFIG, on_flush=invalidate_dashboards)
+                writer.start()
+                atexit.register(writer.stop)
+                _activity_writer = writer
+    return _activity_writer
 
 
 def log_activity(action, details=None, severity='info'):
-    """Log user activity to database, scoped to the current authenticated user."""
+    """
+    Queue a user activity event for the background writer, scoped to the
+    current authenticated user. Never blocks on the database.
+    """
     try:
         user_id = current_user.id if current_user.is_authenticated else None
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    """INSERT INTO activity_logs
-                           (user_id, action, details, ip_address, user_agent, severity)
-                       VALUES (%s, %s, %s, %s, %s, %s)""",
-                    (user_id, action, details,
-                     request.remote_addr, request.headers.get('User-Agent'), severity)
-                )
-                conn.commit()
+        get_activity_writer().enqueue(
+            user_id, action, details,
+            request.remote_addr, request.headers.get('User-Agent'), severity
+        )
     except Exception as e:
         logger.error(f"Activity logging error: {e}")
 
@@ -304,6 +343,70 @@ def logout():
     logout_user()
     return jsonify({'success': True, 'message': 'Logged out'})
 
+@app.route('/api/account', methods=['PATCH'])
+@login_required
+def update_account():
+    data = request.get_json(silent=True) or {}
+    username = (data.get('username') or current_user.username).strip()
+    email    = (data.get('email') or current_user.email).strip().lower()
+
+    if not username or not email:
+        return jsonify({'success': False, 'error': 'Username and email cannot be empty'}), 400
+
+    existing = User.get_by_username(username)
+    if existing and existing.id != current_user.id:
+        return jsonify({'success': False, 'error': 'Username already taken'}), 400
+
+    existing = User.get_by_email(email)
+    if existing and existing.id != current_user.id:
+        return jsonify({'success': False, 'error': 'Email already registered'}), 400
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE users SET username = %s, email = %s WHERE id = %s",
+                    (username, email, current_user.id)
+                )
+                conn.commit()
+        User.invalidate(current_user.id)
+        log_activity('profile_updated', f"User '{username}' updated their profile")
+        return jsonify({'success': True, 'message': 'Profile updated'})
+    except Exception as e:
+        logger.error(f"Profile update error: {e}")
+        return jsonify({'success': False, 'error': 'Database error'}), 500
+
+
+@app.route('/api/account/password', methods=['POST'])
+@login_required
+def change_password():
+    data = request.get_json(silent=True) or {}
+    current_password = data.get('current_password', '')
+    new_password     = data.get('new_password', '')
+
+    user = User.get_by_id(current_user.id)
+    if not user or not user.check_password(current_password):
+        return jsonify({'success': False, 'error': 'Current password is incorrect'}), 400
+
+    if len(new_password) < 8:
+        return jsonify({'success': False, 'error': 'Password must be 8+ chars'}), 400
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE users SET password_hash = %s WHERE id = %s",
+                    (generate_password_hash(new_password), current_user.id)
+                )
+                conn.commit()
+        User.invalidate(current_user.id)
+        log_activity('password_changed', f"User '{current_user.username}' changed their password",
+                     severity='warning')
+        return jsonify({'success': True, 'message': 'Password updated'})
+    except Exception as e:
+        logger.error(f"Password change error: {e}")
+        return jsonify({'success': False, 'error': 'Database error'}), 500
+
 @app.route('/')
 @login_required
 def home():
@@ -365,6 +468,31 @@ def instances():
 
 # ── API: PROJECTS (tenant-isolated) ───────────────────────────────────────────
 
+MAX_PAGE_SIZE = 100
+
+
+def _encode_cursor(ts, row_id):
+    """Opaque keyset cursor for the (timestamp, id) of the last row on a page."""
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Inverse of _encode_cursor. Raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _next_cursor(rows, limit, ts_key):
+    if len(rows) < limit:
+        return None
+    return _encode_cursor(rows[-1][ts_key], rows[-1]['id'])
+
+
 @app.route('/api/projects', methods=['GET', 'POST'])
 @login_required
 def api_projects():
@@ -399,6 +527,8 @@ def api_projects():
                     project_id = cursor.fetchone()[0]
                     conn.commit()
 
+            invalidate_dashboard(current_user.id)
+            invalidate_project_map(current_user.id)
             log_activity('project_created', f"Project: {data.get('name')} by User: {current_user.username}")
             return jsonify({'success': True, 'project_id': project_id, 'message': 'Project created successfully'}), 201
         except Exception as e:
@@ -406,23 +536,43 @@ def api_projects():
             return jsonify({'success': False, 'error': str(e)}), 400
 
     # GET: only fetch projects belonging to the logged-in user
+    # ?cursor= (keyset) takes precedence over ?page= (offset) when both are given;
+    # keyset pages report total and pages as null.
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 10, type=int)
+        page  = max(request.args.get('page', 1, type=int), 1)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_PAGE_SIZE)
         offset = (page - 1) * limit
 
+        cursor_arg = request.args.get('cursor')
+        try:
+            after = _decode_cursor(cursor_arg) if cursor_arg else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         with get_db_connection() as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
-                cursor.execute("""
-                    SELECT * FROM projects
-                    WHERE owner_id = %s
-                    ORDER BY created_at DESC
-                    LIMIT %s OFFSET %s
-                """, (current_user.id, limit, offset))
+                if after:
+                    cursor.execute("""
+                        SELECT * FROM projects
+                        WHERE owner_id = %s AND (created_at, id) < (%s, %s)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, (current_user.id, after[0], after[1], limit))
+                else:
+                    cursor.execute("""
+                        SELECT * FROM projects
+                        WHERE owner_id = %s
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s OFFSET %s
+                    """, (current_user.id, limit, offset))
                 projects_list = cursor.fetchall()
 
-                cursor.execute("SELECT COUNT(*) as total FROM projects WHERE owner_id = %s", (current_user.id,))
-                total = cursor.fetchone()['total']
+                # Keyset pages don't need the total; skip the count they'd pay for on every page.
+                total = None
+                if not after:
+                    cursor.execute("SELECT COUNT(*) as total FROM projects WHERE owner_id = %s",
+                                   (current_user.id,))
+                    total = cursor.fetchone()['total']
 
         return jsonify({
             'data': projects_list,
@@ -430,7 +580,8 @@ def api_projects():
                 'page': page,
                 'limit': limit,
                 'total': total,
-                'pages': (total + limit - 1) // limit
+                'pages': (total + limit - 1) // limit if total is not None else None,
+                'next_cursor': _next_cursor(projects_list, limit, 'created_at'),
             }
         })
     except Exception as e:
@@ -462,6 +613,9 @@ def delete_project(project_id):
                 )
                 conn.commit()
 
+        invalidate_dashboard(current_user.id)
+        invalidate_project_map(current_user.id)
+        workspace_indexes.drop(project_id)
         log_activity(
             'project_deleted',
             f"Project '{project['name']}' (ID: {project_id}) and "
@@ -507,24 +661,48 @@ def api_deployments():
                     deployment_id = cursor.fetchone()[0]
                     conn.commit()
 
+            invalidate_dashboard(current_user.id)
             log_activity('deployment_created', f"Deployment ID: {deployment_id}")
             return jsonify({'success': True, 'deployment_id': deployment_id}), 201
         except Exception as e:
             logger.error(f"Deployment creation error: {e}")
             return jsonify({'success': False, 'error': str(e)}), 400
 
+    # The body stays a plain list; the keyset cursor for the next page is
+    # returned in the X-Next-Cursor header and passed back as ?before=.
     try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
+        before_arg = request.args.get('before')
+        try:
+            before = _decode_cursor(before_arg) if before_arg else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         with get_db_connection() as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
-                cursor.execute("""
-                    SELECT d.*, p.name AS project_name
-                    FROM deployments d
-                    JOIN projects p ON d.project_id = p.id
-                    WHERE p.owner_id = %s
-                    ORDER BY d.deployed_at DESC LIMIT 50
-                """, (current_user.id,))
+                if before:
+                    cursor.execute("""
+                        SELECT d.*, p.name AS project_name
+                        FROM deployments d
+                        JOIN projects p ON d.project_id = p.id
+                        WHERE p.owner_id = %s AND (d.deployed_at, d.id) < (%s, %s)
+                        ORDER BY d.deployed_at DESC, d.id DESC LIMIT %s
+                    """, (current_user.id, before[0], before[1], limit))
+                else:
+                    cursor.execute("""
+                        SELECT d.*, p.name AS project_name
+                        FROM deployments d
+                        JOIN projects p ON d.project_id = p.id
+                        WHERE p.owner_id = %s
+                        ORDER BY d.deployed_at DESC, d.id DESC LIMIT %s
+                    """, (current_user.id, limit))
                 deployments = cursor.fetchall()
-        return jsonify(deployments)
+
+        response = jsonify(deployments)
+        next_cursor = _next_cursor(deployments, limit, 'deployed_at')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except Exception as e:
         logger.error(f"Deployments API error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -595,6 +773,7 @@ def redeploy():
                 deployment_id = cursor.fetchone()[0]
                 conn.commit()
 
+        invalidate_dashboard(current_user.id)
         log_activity('deployment_redeployed',
                      f"Project {project_id} redeployed – Deployment ID: {deployment_id}")
         return jsonify({
@@ -635,27 +814,44 @@ def api_metrics():
 @app.route('/api/activities')
 @login_required
 def api_activities():
-    """Return only the current user's activity logs."""
+    """
+    Return only the current user's activity logs, newest first.
+    Pass the X-Next-Cursor header of one page as ?before= to fetch the next.
+    """
     try:
-        limit    = request.args.get('limit', 50, type=int)
+        limit    = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
         severity = request.args.get('severity', None)
 
+        before_arg = request.args.get('before')
+        try:
+            before = _decode_cursor(before_arg) if before_arg else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        clauses = ["user_id = %s"]
+        params  = [current_user.id]
+        if severity:
+            clauses.append("severity = %s")
+            params.append(severity)
+        if before:
+            clauses.append("(created_at, id) < (%s, %s)")
+            params.extend(before)
+        params.append(limit)
+
         with get_db_connection() as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
-                if severity:
-                    cursor.execute("""
-                        SELECT * FROM activity_logs
-                        WHERE user_id = %s AND severity = %s
-                        ORDER BY created_at DESC LIMIT %s
-                    """, (current_user.id, severity, limit))
-                else:
-                    cursor.execute("""
-                        SELECT * FROM activity_logs
-                        WHERE user_id = %s
-                        ORDER BY created_at DESC LIMIT %s
-                    """, (current_user.id, limit))
+                cursor.execute(f"""
+                    SELECT * FROM activity_logs
+                    WHERE {' AND '.join(clauses)}
+                    ORDER BY created_at DESC, id DESC LIMIT %s
+                """, params)
                 activities = cursor.fetchall()
-        return jsonify(activities)
+
+        response = jsonify(activities)
+        next_cursor = _next_cursor(activities, limit, 'created_at')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except Exception as e:
         logger.error(f"Activities API error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -676,46 +872,132 @@ Guidelines:
 """
 
 
+AI_FAKE_MODEL = os.getenv("AI_FAKE_MODEL", "0") == "1"   # offline stand-in for local runs
+
+_gemini_model = None
+_gemini_lock = threading.Lock()
+
+
 def _get_gemini_client():
     """
-    Lazily configure and return the Gemini GenerativeModel.
+    Return the process-wide Gemini GenerativeModel, configured on first use.
     Uses 'rest' transport to bypass potential gRPC firewall blocks.
     """
-    if not _GENAI_AVAILABLE:
-        raise RuntimeError("google-generativeai is not installed.")
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_lock:
+            if _gemini_model is None:
+                if AI_FAKE_MODEL:
+                    _gemini_model = FakeModel()
+                    return _gemini_model
+
+                if not _GENAI_AVAILABLE:
+                    raise RuntimeError("google-generativeai is not installed.")
+
+                api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise RuntimeError("AI assistant is not configured. Set GEMINI_API_KEY.")
+
+                import google.generativeai as genai
+                genai.configure(api_key=api_key, transport='rest')
+
+                _gemini_model = genai.GenerativeModel(
+                    model_name=_GEMINI_MODEL,
+                    system_instruction=_AI_SYSTEM_PROMPT,
+                )
+    return _gemini_model
 
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise RuntimeError("AI assistant is not configured. Set GEMINI_API_KEY.")
 
-    genai.configure(api_key=api_key, transport='rest')
+ai_metrics = AIMetrics()
+# Per-user limits hold across workers through slots in the shared store.
+ai_limiter = AIConcurrencyLimiter(slots=SlotPool(get_store(), "ai", AI_MAX_PER_USER,
+                                                   ttl=(AI_RETRIES + 2) * AI_TIMEOUT))
+workspace_indexes = RetrievalRegistry(socketio.start_background_task)
 
-    return genai.GenerativeModel(
-        model_name=_GEMINI_MODEL,
-        system_instruction=_AI_SYSTEM_PROMPT,
-    )
+# Answers are shared across workers through Redis when it is configured.
+AI_CACHE_SHARED = os.getenv("AI_CACHE_SHARED", "1") == "1"
+_ai_store = get_store()
+ai_cache = ResponseCache(shared=_ai_store if AI_CACHE_SHARED and isinstance(_ai_store, RedisStore) else None)
 
 
-@app.route('/api/ai/assist', methods=['POST'])
-@login_required
-def ai_assist():
+def _ai_cache_key(code_context, user_query):
+    """Content address for a request, or None when the client asked to bypass the cache."""
+    if (request.get_json(silent=True) or {}).get('no_cache'):
+        return None
+    return cache_key(_GEMINI_MODEL, _AI_SYSTEM_PROMPT, code_context, user_query)
+
+
+def _positive_int(value):
+    try:
+        line = int(value)
+    except (TypeError, ValueError):
+        return None
+    return line if line > 0 else None
+
+
+def _ai_request():
+    """
+    Parse an assist request body into (prompt, code_context, user_query), or
+    return an error response tuple as the first element. code_context is the
+    context section as it will be sent – trimmed to the token budget around
+    the optional cursor_line / selection {start_line, end_line}, plus the
+    best-matching snippets from the project's workspace when project_id is
+    given.
+    """
     data = request.get_json(silent=True)
     if not data:
-        return jsonify({'success': False, 'error': 'Request body must be JSON.'}), 400
+        return (jsonify({'success': False, 'error': 'Request body must be JSON.'}), 400), None, None
 
-    code_context = (data.get('code_context') or '').strip()
-    user_query   = (data.get('user_query')   or '').strip()
+    raw_context = data.get('code_context') or ''
+    user_query  = (data.get('user_query') or '').strip()
 
     if not user_query:
-        return jsonify({'success': False, 'error': "'user_query' is required."}), 400
+        return (jsonify({'success': False, 'error': "'user_query' is required."}), 400), None, None
+    if len(raw_context) > MAX_CONTEXT_CHARS:
+        return (jsonify({'success': False,
+                         'error': f"'code_context' is too large (max {MAX_CONTEXT_CHARS} characters)."}),
+                413), None, None
+
+    code_context = ''
+    if raw_context.strip():
+        cursor_line = _positive_int(data.get('cursor_line'))
+        selection = data.get('selection') if isinstance(data.get('selection'), dict) else {}
+        first, last = _positive_int(selection.get('start_line')), _positive_int(selection.get('end_line'))
+        context = build_context(raw_context, user_query, cursor_line=cursor_line,
+                                selection=(first, last) if first and last else None)
+
+        heading = "### Code Context"
+        if data.get('file_path'):
+            heading += f" ({str(data['file_path'])[:200]})"
+        if context.truncated:
+            heading += "\nExcerpts of a larger file; omitted lines are marked with ⋯."
+            ai_metrics.count('context_trimmed')
+            ai_metrics.count('context_tokens_saved', context.original_tokens - context.tokens)
+        if cursor_line:
+            heading += f"\nThe cursor is on line {cursor_line}."
+        code_context = f"{heading}\n```\n{context.text.strip()}\n```\n"
+
+    project_id = _positive_int(data.get('project_id'))
+    if project_id and str(project_id) in _get_user_project_ids():
+        workspace_indexes.ensure(project_id, lambda: _get_project_container(project_id))
+        current_file = str(data.get('file_path') or '').lstrip('/')
+        snippets = workspace_indexes.search(project_id, user_query, exclude={current_file})
+        if snippets:
+            code_context += "### Related Workspace Code\n" + "".join(
+                f"#### {s.path} (lines {s.start}-{s.end})\n```\n{s.text}\n```\n" for s in snippets
+            )
 
-    prompt_parts = []
-    if code_context:
-        prompt_parts.append(
-            f"### Code Context\n```\n{code_context}\n```\n"
-        )
+    prompt_parts = [code_context] if code_context else []
     prompt_parts.append(f"### Question / Task\n{user_query}")
-    full_prompt = "\n".join(prompt_parts)
+    return "\n".join(prompt_parts), code_context, user_query
+
+
+@app.route('/api/ai/assist', methods=['POST'])
+@login_required
+def ai_assist():
+    full_prompt, code_context, user_query = _ai_request()
+    if not isinstance(full_prompt, str):
+        return full_prompt
 
     try:
         model = _get_gemini_client()
@@ -723,22 +1005,41 @@ def ai_assist():
         logger.warning("AI assist – configuration error: %s", exc)
         return jsonify({'success': False, 'error': str(exc)}), 503
 
+    start = time.perf_counter()
+    key = _ai_cache_key(code_context, user_query)
+    if key is not None:
+        hit, cached = ai_cache.claim(key)
+        if hit:
+            return jsonify({
+                'success':    True,
+                'suggestion': cached['suggestion'],
+                'model':      _GEMINI_MODEL,
+                'usage':      cached.get('usage') or {},
+                'total_ms':   round((time.perf_counter() - start) * 1000, 1),
+                'cached':     True,
+            })
+
+    answer = None
     try:
-        response = model.generate_content(full_prompt)
-
-        suggestion = ""
-        if response.candidates:
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, 'text'):
-                    suggestion += part.text
-        suggestion = suggestion.strip()
-
-        usage = {}
-        if hasattr(response, 'usage_metadata') and response.usage_metadata:
-            usage = {
-                'prompt_tokens':     getattr(response.usage_metadata, 'prompt_token_count',     None),
-                'candidates_tokens': getattr(response.usage_metadata, 'candidates_token_count', None),
-            }
+        slot = ai_limiter.acquire(str(current_user.id))
+    except AIBusyError as exc:
+        if key is not None:
+            ai_cache.release(key, None)
+        return (jsonify({'success': False, 'error': str(exc)}), exc.status,
+                {'Retry-After': str(exc.retry_after)})
+
+    ai_metrics.count('requests')
+    try:
+        response = complete(model, full_prompt, ai_metrics)
+
+        suggestion = response_text(response).strip()
+        usage = usage_of(response)
+
+        total_ms = (time.perf_counter() - start) * 1000
+        ai_metrics.total.observe(total_ms)
+        ai_metrics.count('completed')
+        if suggestion:
+            answer = {'suggestion': suggestion, 'usage': usage}
 
         log_activity(
             'ai_assist_request',
@@ -752,9 +1053,12 @@ def ai_assist():
             'suggestion': suggestion,
             'model':      _GEMINI_MODEL,
             'usage':      usage,
+            'total_ms':   round(total_ms, 1),
+            'cached':     False,
         })
 
     except Exception as exc:
+        ai_metrics.count('errors')
         logger.error("AI assist – Gemini API error: %s", exc, exc_info=True)
         return jsonify({
             'success': False,
@@ -762,53 +1066,247 @@ def ai_assist():
             'detail':  str(exc),   
         }), 502
 
+    finally:
+        slot.release()
+        if key is not None:
+            ai_cache.release(key, answer)
+
 
+@app.route('/api/ai/assist/stream', methods=['POST'])
+@login_required
+def ai_assist_stream():
+    """
+    Same request body as /api/ai/assist, answered as server-sent events:
+    ``meta`` {model}, then ``token`` {text} per chunk as Gemini produces it,
+    then ``done`` {usage, ttft_ms, total_ms, cached} or ``error`` {error}.
+    Aborting the request cancels the upstream stream. A cached answer is
+    replayed as a single token event.
+    """
+    full_prompt, code_context, user_query = _ai_request()
+    if not isinstance(full_prompt, str):
+        return full_prompt
 
-def _get_user_project_ids():
+    try:
+        model = _get_gemini_client()
+    except RuntimeError as exc:
+        logger.warning("AI assist – configuration error: %s", exc)
+        return jsonify({'success': False, 'error': str(exc)}), 503
+
+    key = _ai_cache_key(code_context, user_query)
+    user_id = str(current_user.id)
+    answer = {}
+
+    def on_finish(result, text):
+        if text.strip():
+            answer.update(suggestion=text.strip(), usage=result['usage'])
+        log_activity(
+            'ai_assist_request',
+            f"query_len={len(user_query)} ctx_len={len(code_context)} "
+            f"tokens={result['usage'].get('prompt_tokens', '?')} "
+            f"ttft_ms={result['ttft_ms']} total_ms={result['total_ms']}",
+            severity='info'
+        )
+
+    def generate():
+        yield sse('meta', {'model': _GEMINI_MODEL})
+        start = time.perf_counter()
+        if key is not None:
+            hit, cached = ai_cache.claim(key)
+            if hit:
+                yield from cached_events(cached, (time.perf_counter() - start) * 1000)
+                return
+        try:
+            try:
+                slot = ai_limiter.acquire(user_id)
+            except AIBusyError as exc:
+                yield sse('error', {'error': str(exc), 'retry_after': exc.retry_after})
+                return
+            with slot:
+                yield from slot.hold(stream_events(model, full_prompt, ai_metrics, on_finish))
+        finally:
+            if key is not None:
+                ai_cache.release(key, answer or None)
+
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.route('/api/metrics/ai', methods=['GET'])
+@login_required
+def api_ai_metrics():
+    """
+    AI request counts, latency histograms, response-cache hit rates and
+    queueing. Per-project index stats cover the caller's own projects only.
+    """
+    return jsonify({'success': True, 'ai': ai_metrics.snapshot(), 'cache': ai_cache.stats(),
+                    'limiter': ai_limiter.stats(), 'context': chunk_cache.stats(),
+                    'retrieval': workspace_indexes.stats(projects=_get_user_project_ids())})
+
+
+
+# ── Container ownership ──
+# Workspaces are stamped with these labels at launch so Docker can filter by
+# owner or project server-side. Containers started before the labels existed
+# are still matched by their cloudx-project-<id>-* name while
+# CONTAINER_NAME_FALLBACK is on.
+LABEL_OWNER   = "cloudx.owner"
+LABEL_PROJECT = "cloudx.project"
+LABEL_LAUNCH  = "cloudx.launch"
+
+PROJECT_MAP_TTL         = int(os.getenv("PROJECT_MAP_TTL", 60))   # seconds
+CONTAINER_NAME_FALLBACK = os.getenv("CONTAINER_NAME_FALLBACK", "1").lower() in ("1", "true", "yes")
+
+
+def _get_user_project_ids(user_id=None):
+    """
+    Project ids (as strings) owned by *user_id* – the current user by
+    default – cached in the shared store for PROJECT_MAP_TTL seconds.
+    """
+    user_id = current_user.id if user_id is None else user_id
+    key = f"projects:{user_id}"
+    cached = get_store().get(key)
+    if cached is not None:
+        return set(json.loads(cached))
     try:
         with get_db_connection() as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
-                cursor.execute("SELECT id FROM projects WHERE owner_id = %s", (current_user.id,))
-                return {str(row['id']) for row in cursor.fetchall()}
+                cursor.execute("SELECT id FROM projects WHERE owner_id = %s", (user_id,))
+                project_ids = {str(row['id']) for row in cursor.fetchall()}
     except Exception as e:
         logger.error(f"Error fetching user project IDs: {e}")
         return set()
+    get_store().set(key, json.dumps(sorted(project_ids)), ttl=PROJECT_MAP_TTL)
+    return project_ids
 
 
-def _container_belongs_to_user(container_name, user_project_ids):
-    try:
-        name = container_name.lstrip('/')
+def invalidate_project_map(user_id):
+    """Drop the cached owner→projects map after a project is created or deleted."""
+    get_store().delete(f"projects:{user_id}")
+
 
-        if name.startswith('cloudx-project-'):
-            parts = name.split('-')
-            if len(parts) >= 3:
-                project_id_str = str(parts[2])
-                return project_id_str in user_project_ids
+def _legacy_project_id(container_name):
+    """Project id parsed from an unlabelled cloudx-project-<id>-* name, or None."""
+    name = container_name.lstrip('/')
+    if name.startswith('cloudx-project-'):
+        parts = name.split('-')
+        if len(parts) >= 3:
+            return parts[2]
+    return None
+
+
+def _container_belongs_to_user(container, user_id=None):
+    user_id = current_user.id if user_id is None else user_id
+    try:
+        owner = (container.labels or {}).get(LABEL_OWNER)
+        if owner is not None:
+            return owner == str(user_id)
+        if CONTAINER_NAME_FALLBACK:
+            return _legacy_project_id(container.name) in _get_user_project_ids(user_id)
     except Exception:
         pass
     return False
 
 
+def _list_user_containers(client, user_id=None):
+    """All of a user's workspace containers, found with Docker label filters."""
+    user_id = current_user.id if user_id is None else user_id
+    containers = client.containers.list(all=True, filters={'label': f'{LABEL_OWNER}={user_id}'})
+    if CONTAINER_NAME_FALLBACK:
+        project_ids = None
+        for c in client.containers.list(all=True, filters={'name': 'cloudx-project-'}):
+            if LABEL_OWNER in (c.labels or {}):
+                continue
+            if project_ids is None:
+                project_ids = _get_user_project_ids(user_id)
+            if _legacy_project_id(c.name) in project_ids:
+                containers.append(c)
+    return containers
+
+
+# ── Workspace hibernation ──
+# Idle workspaces are paused (or stopped) by a background thread and resumed
+# on the next launch, file access or terminal join. Every worker runs one to
+# publish its activity; only the holder of the "hibernator" lease acts on it.
+_hibernator = None
+_hibernator_lock = threading.Lock()
+
+
+def _monitor_cpu(container):
+    """Latest CPU % for *container* from the SystemMonitor snapshot, if running."""
+    if system_monitor is None:
+        return None
+    safe_name = container.name.lstrip('/').replace('-', '_')
+    values = (system_monitor.latest_summary() or {}).get('containers', {}).get(safe_name)
+    return values.get('cpu_percent') if values else None
+
+
+def get_hibernator():
+    """Start the workspace hibernator on first use (one per worker)."""
+    global _hibernator
+    if _hibernator is None:
+        with _hibernator_lock:
+            if _hibernator is None:
+                hibernator = WorkspaceHibernator(
+                    get_docker, get_store(), LABEL_OWNER,
+                    busy_containers=terminal_manager.container_ids,
+                    cpu_lookup=_monitor_cpu,
+                    lease=Lease(get_store(), "hibernator", ttl=3 * HIBERNATE_CHECK_INTERVAL),
+                )
+                hibernator.start()
+                atexit.register(hibernator.stop)
+                _hibernator = hibernator
+    return _hibernator
+
+
+def _wake_workspace(container):
+    """Resume *container* if it was hibernated and mark it active."""
+    return get_hibernator().wake(container)
+
+
+def _container_password(container):
+    for entry in container.attrs.get('Config', {}).get('Env') or []:
+        if entry.startswith('PASSWORD='):
+            return entry.split('=', 1)[1]
+    return None
+
+
+# ── Admission control ──
+# Launches are admitted against the host's live headroom and the user's
+# workspace quota (admission.py). Running and paused workspaces both count,
+# since a paused container still holds its memory.
+def _admission_snapshot():
+    client = get_docker()
+    live = client.containers.list(filters={'label': LABEL_OWNER, 'status': ['running', 'paused']})
+    per_user = Counter((c.labels or {}).get(LABEL_OWNER) for c in live)
+    summary = system_monitor.latest_summary() if system_monitor else None
+    return host_resources(summary), len(live), per_user
+
+
+admission = AdmissionController(
+    _admission_snapshot, sleep=socketio.sleep,
+    slots=SlotPool(get_store(), "launch", USER_QUOTA, ttl=QUEUE_TIMEOUT + 120) if USER_QUOTA else None,
+)
+
+
 @app.route('/api/containers', methods=['GET'])
 @login_required
 def list_containers():
     try:
-        user_project_ids = _get_user_project_ids()
-        client = docker.from_env()
-
-        all_containers = client.containers.list(all=True)
+        client = get_docker()
 
         container_list = []
-        for c in all_containers:
-            if _container_belongs_to_user(c.name, user_project_ids):
-                container_list.append({
-                    'id':      c.short_id,
-                    'name':    c.name,
-                    'status':  c.status,
-                    'image':   c.image.tags[0] if c.image.tags else 'unknown',
-                    'created': c.attrs['Created'],
-                    'ports':   c.ports
-                })
+        for c in _list_user_containers(client):
+            container_list.append({
+                'id':      c.short_id,
+                'name':    c.name,
+                'status':  c.status,
+                'image':   c.image.tags[0] if c.image.tags else 'unknown',
+                'created': c.attrs['Created'],
+                'ports':   c.ports
+            })
 
         return jsonify({'success': True, 'containers': container_list})
     except Exception as e:
@@ -816,54 +1314,241 @@ def list_containers():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+CONTAINER_STOP_TIMEOUT = int(os.getenv("CONTAINER_STOP_TIMEOUT", 10))   # seconds before SIGKILL
+MAX_STOP_TIMEOUT       = 120
+BULK_ACTION_WORKERS    = int(os.getenv("BULK_ACTION_WORKERS", 8))
+BULK_ACTION_MAX_IDS    = int(os.getenv("BULK_ACTION_MAX_IDS", 200))   # ids per request
+CONTAINER_ACTIONS      = {'stop': 'stopped', 'restart': 'restarted', 'delete': 'deleted'}
+
+
+def _stop_timeout(data) -> int:
+    """Stop timeout from the request body, clamped to [0, MAX_STOP_TIMEOUT]."""
+    try:
+        timeout = int(data.get('timeout', CONTAINER_STOP_TIMEOUT))
+    except (TypeError, ValueError):
+        timeout = CONTAINER_STOP_TIMEOUT
+    return min(max(timeout, 0), MAX_STOP_TIMEOUT)
+
+
+def _apply_container_action(container, action, timeout):
+    if action == 'stop':
+        container.stop(timeout=timeout)
+    elif action == 'restart':
+        container.restart(timeout=timeout)
+    elif action == 'delete':
+        container.remove(force=True)
+    return f"Container {CONTAINER_ACTIONS[action]} successfully"
+
+
 @app.route('/api/containers/<container_id>/action', methods=['POST'])
 @login_required
 def container_action(container_id):
     """Allow stop/restart/delete only for containers the user owns."""
-    data   = request.json
+    data   = request.json or {}
     action = data.get('action')
+    if action not in CONTAINER_ACTIONS:
+        return jsonify({'success': False, 'error': 'Invalid action'}), 400
 
     try:
-        user_project_ids = _get_user_project_ids()
-        client    = docker.from_env()
+        client    = get_docker()
         container = client.containers.get(container_id)
 
-        if not _container_belongs_to_user(container.name, user_project_ids):
+        if not _container_belongs_to_user(container):
             return jsonify({'success': False, 'error': 'Access denied'}), 403
 
-        if action == 'stop':
-            container.stop()
-            msg = "Container stopped successfully"
-        elif action == 'restart':
-            container.restart()
-            msg = "Container restarted successfully"
-        elif action == 'delete':
-            container.remove(force=True)
-            msg = "Container deleted successfully"
-        else:
-            return jsonify({'success': False, 'error': 'Invalid action'}), 400
-
+        msg = _apply_container_action(container, action, _stop_timeout(data))
         return jsonify({'success': True, 'message': msg})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/containers/bulk-action', methods=['POST'])
+@login_required
+def container_bulk_action():
+    """
+    Apply one action to many containers at once. Body:
+    {action, container_ids: [...] | "all", timeout}. Ownership is checked
+    once against a single container listing, the actions run on a pool of
+    BULK_ACTION_WORKERS, and the response is an NDJSON stream with one
+    {id, name, success, message|error} record per container as it finishes,
+    then a {done, succeeded, failed} summary.
+    """
+    data    = request.json or {}
+    action  = data.get('action')
+    wanted  = data.get('container_ids')
+    timeout = _stop_timeout(data)
+    if action not in CONTAINER_ACTIONS:
+        return jsonify({'success': False, 'error': 'Invalid action'}), 400
+    if wanted != 'all' and not (isinstance(wanted, list) and wanted
+                                and all(isinstance(cid, str) for cid in wanted)):
+        return jsonify({'success': False, 'error': "'container_ids' must be a list of ids or \"all\""}), 400
+    if wanted != 'all' and len(wanted) > BULK_ACTION_MAX_IDS:
+        return jsonify({'success': False,
+                        'error': f"At most {BULK_ACTION_MAX_IDS} container ids per request"}), 400
+
+    try:
+        client = get_docker()
+        owned  = _list_user_containers(client)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    if wanted == 'all':
+        targets, denied = owned, []
+    else:
+        by_id   = {}
+        for c in owned:
+            by_id[c.id] = by_id[c.short_id] = by_id[c.name] = c
+        targets = list({by_id[cid].id: by_id[cid] for cid in wanted if cid in by_id}.values())
+        denied  = [cid for cid in wanted if cid not in by_id]
+
+    def run(container):
+        try:
+            msg = _apply_container_action(container, action, timeout)
+            return {'id': container.short_id, 'name': container.name, 'success': True, 'message': msg}
+        except Exception as e:
+            return {'id': container.short_id, 'name': container.name, 'success': False, 'error': str(e)}
+
+    def generate():
+        succeeded = failed = 0
+        for cid in denied:
+            failed += 1
+            yield json.dumps({'id': cid, 'success': False, 'error': 'Access denied'}) + '\n'
+        if targets:
+            with ThreadPoolExecutor(max_workers=min(BULK_ACTION_WORKERS, len(targets))) as pool:
+                for future in as_completed([pool.submit(run, c) for c in targets]):
+                    result = future.result()
+                    if result['success']:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    yield json.dumps(result) + '\n'
+        log_activity(f'containers_bulk_{action}',
+                     f'{succeeded} succeeded, {failed} failed', severity='info' if not failed else 'warning')
+        yield json.dumps({'done': True, 'succeeded': succeeded, 'failed': failed}) + '\n'
+
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+# ── CONTAINER LOGS ───────
+
+# Each container gets at most one Docker log stream per worker (logstream.py);
+# one-off reads are served from its cached tail and followers subscribe to it
+# with their own bounded buffer.
+log_tails = LogTailRegistry(socketio)
+atexit.register(log_tails.shutdown)
+
+LOG_MAX_TAIL  = 5000   # lines per one-off read
+LOG_HEARTBEAT = 15     # seconds between keep-alive newlines on a quiet follow
+
+
+def _log_record(line) -> str:
+    ts, _, text = line
+    return json.dumps({'ts': ts, 'line': text}) + '\n'
+
+
+def _docker_log_lines(container, tail=None, after_ns=0, until_ns=None):
+    """Fetch lines straight from Docker, for ranges the shared tail doesn't cover."""
+    kwargs = {'timestamps': True, 'tail': tail or 'all'}
+    if after_ns:
+        kwargs['since'] = after_ns / 1e9
+    if until_ns:
+        kwargs['until'] = until_ns / 1e9
+    raw_lines, rest = split_lines(b'', container.logs(**kwargs))
+    if rest:
+        raw_lines.append(rest)
+    return [l for l in map(parse_line, raw_lines)
+            if l[1] > after_ns and (until_ns is None or l[1] <= until_ns)]
+
+
 @app.route('/api/containers/<container_id>/logs', methods=['GET'])
 @login_required
 def container_logs(container_id):
+    """
+    Container logs. By default returns {success, logs, cursor} for the last
+    ``tail`` lines. ``since``/``until`` (unix seconds or ISO-8601) bound the
+    range and ``cursor`` (the ``ts`` of the last line seen) resumes after it.
+    With ``follow=1`` the response is a chunked NDJSON stream of
+    {"ts", "line"} records; {"dropped": n} marks lines lost because the
+    client fell behind, and {"end": true} that the container's stream closed.
+    """
+    args   = request.args
+    tail   = min(max(args.get('tail', 100, type=int), 1), LOG_MAX_TAIL)
+    follow = args.get('follow', '').lower() in ('1', 'true', 'yes')
     try:
-        user_project_ids = _get_user_project_ids()
-        client    = docker.from_env()
+        after_ns = parse_time(args['cursor']) if args.get('cursor') else (
+                   parse_time(args['since']) - 1 if args.get('since') else 0)
+        until_ns = parse_time(args['until']) if args.get('until') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid since/until/cursor'}), 400
+    bounded = bool(after_ns)
+
+    try:
+        client    = get_docker()
         container = client.containers.get(container_id)
 
-        if not _container_belongs_to_user(container.name, user_project_ids):
+        if not _container_belongs_to_user(container):
             return jsonify({'success': False, 'error': 'Access denied'}), 403
 
-        logs = container.logs(tail=100).decode('utf-8')
-        return jsonify({'success': True, 'logs': logs})
+        if not follow:
+            shared = log_tails.get(container.id)
+            if shared and until_ns is None and (
+                    shared.covers(after_ns) if bounded else len(shared.lines) >= tail):
+                lines = shared.snapshot(None if bounded else tail, after_ns)
+            else:
+                lines = _docker_log_lines(container, None if bounded else tail, after_ns, until_ns)
+            return jsonify({
+                'success': True,
+                'logs':    ''.join(text + '\n' for _, _, text in lines),
+                'cursor':  lines[-1][0] if lines else args.get('cursor'),
+            })
+
+        shared = log_tails.get_or_start(container)
+        backlog = []
+        if bounded and not shared.covers(after_ns):
+            backlog = _docker_log_lines(container, None, after_ns, until_ns)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    def generate():
+        last_ns = backlog[-1][1] if backlog else after_ns
+        sub = shared.subscribe(last_ns, None if bounded else tail)
+        try:
+            if backlog:
+                yield ''.join(map(_log_record, backlog))
+            while True:
+                lines, dropped = sub.drain(timeout=LOG_HEARTBEAT)
+                out = [json.dumps({'dropped': dropped}) + '\n'] if dropped else []
+                for line in lines:
+                    if until_ns is not None and line[1] > until_ns:
+                        yield ''.join(out) + json.dumps({'end': True}) + '\n'
+                        return
+                    if line[1] and line[1] <= last_ns:
+                        continue
+                    last_ns = line[1] or last_ns
+                    out.append(_log_record(line))
+                if out:
+                    yield ''.join(out)
+                elif sub.closed:
+                    yield json.dumps({'end': True}) + '\n'
+                    return
+                else:
+                    yield '\n'
+        finally:
+            shared.unsubscribe(sub)
+
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+LAUNCH_SETTLE_SECONDS = float(os.getenv("LAUNCH_SETTLE_SECONDS", 2))   # let the container boot before exec
+
 
 @app.route('/api/projects/<int:project_id>/launch', methods=['POST'])
 @login_required
@@ -889,10 +1574,40 @@ def launch_workspace(project_id):
                         'error': 'Database error during authorization check.'}), 500
 
     try:
-        client = docker.from_env()
+        existing = _get_project_container(project_id)
+        if existing is not None and get_hibernator().is_hibernated(existing):
+            _wake_workspace(existing)
+            log_activity('workspace_resumed',
+                         f"Resumed {existing.name} by {current_user.username}")
+            return jsonify({
+                'success': True,
+                'status': 'resumed',
+                'connection': {
+                    'web_url':  f"http://proj{project_id}.cloudx.local",
+                    'password': _container_password(existing),
+                },
+            })
+    except Exception as e:
+        logger.error(f"Resume failure: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    try:
+        ticket = admission.admit(str(current_user.id))
+    except AdmissionError as e:
+        response = jsonify({'success': False, 'error': str(e), 'reason': e.reason})
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status
+    except Exception as e:
+        logger.error(f"Admission check failed: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    try:
+        client = get_docker()
         session_password = secrets.token_hex(4)
 
-        container_name = f"cloudx-project-{project_id}-{secrets.token_hex(2)}"
+        launch_id      = secrets.token_hex(8)
+        container_name = f"cloudx-project-{project_id}-{launch_id[:4]}"
         volume_name    = f"cloudx_data_u{current_user.id}_p{project_id}"
 
 
@@ -916,23 +1631,29 @@ def launch_workspace(project_id):
             f"traefik.http.services.{service_name}.loadbalancer.server.port": "8080",
         }
 
-        container = client.containers.run(
-            image="cloudx-workspace:latest",
-            detach=True,
-            environment={"PASSWORD": session_password},
-            name=container_name,
-            volumes={volume_name: {'bind': '/workspace', 'mode': 'rw'}},
-            network="cloudx_cloudx-network",
-            labels={
-                "traefik.enable": "true",
-                f"traefik.http.routers.cloudx-proj-{project_id}.rule": f"Host(`proj{project_id}.cloudx.local`)",
-                f"traefik.http.services.cloudx-proj-{project_id}.loadbalancer.server.port": "8080"
-            },
-            mem_limit='512m',
-            nano_cpus=1_000_000_000,  
-        )
+        try:
+            container = client.containers.run(
+                image="cloudx-workspace:latest",
+                detach=True,
+                environment={"PASSWORD": session_password},
+                name=container_name,
+                volumes={volume_name: {'bind': '/workspace', 'mode': 'rw'}},
+                network="cloudx_cloudx-network",
+                labels={
+                    "traefik.enable": "true",
+                    f"traefik.http.routers.cloudx-proj-{project_id}.rule": f"Host(`proj{project_id}.cloudx.local`)",
+                    f"traefik.http.services.cloudx-proj-{project_id}.loadbalancer.server.port": "8080",
+                    LABEL_OWNER:   str(current_user.id),
+                    LABEL_PROJECT: str(project_id),
+                    LABEL_LAUNCH:  launch_id,
+                },
+                mem_limit=f'{ticket.mem_mb}m',
+                nano_cpus=int(ticket.cpus * 1_000_000_000),
+            )
+        finally:
+            ticket.release()
 
-        time.sleep(2)
+        time.sleep(LAUNCH_SETTLE_SECONDS)
         container.reload()
 
         repository_url = (project.get('repository_url') or '').strip()
@@ -973,6 +1694,7 @@ def launch_workspace(project_id):
                 )
                 clone_result = {'status': 'skipped', 'reason': 'workspace_not_empty'}
 
+        get_hibernator().touch(container.id)
         log_activity('workspace_provisioned',
                      f"Launched {container_name} by {current_user.username}")
 
@@ -985,6 +1707,14 @@ def launch_workspace(project_id):
             },
         }
 
+        response_payload['resources'] = {
+            'mem_mb':    ticket.mem_mb,
+            'cpus':      ticket.cpus,
+            'downsized': ticket.decision.action == 'downsize',
+        }
+        if ticket.decision.action == 'downsize':
+            response_payload['notice'] = ticket.decision.reason
+
         if clone_result is not None:
             response_payload['repository'] = clone_result
 
@@ -993,19 +1723,24 @@ def launch_workspace(project_id):
     except Exception as e:
         logger.error(f"Provisioning Failure: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        ticket.release()
 
 # ── API: WORKSPACE FILE I/O ───────────────────────────────────────────────────
 
 def _get_project_container(project_id: int):
     """
-    Return the first running container whose name matches
-    the cloudx-project-<project_id>-* pattern, or None.
+    Return the first container labelled with *project_id* (or, for
+    unlabelled containers, named cloudx-project-<project_id>-*), or None.
     """
-    client = docker.from_env()
-    for c in client.containers.list(all=True):
-        name = c.name.lstrip('/')
-        if name.startswith(f'cloudx-project-{project_id}-'):
-            return c
+    client = get_docker()
+    labelled = client.containers.list(all=True, filters={'label': f'{LABEL_PROJECT}={project_id}'})
+    if labelled:
+        return labelled[0]
+    if CONTAINER_NAME_FALLBACK:
+        for c in client.containers.list(all=True, filters={'name': f'cloudx-project-{project_id}-'}):
+            if _legacy_project_id(c.name) == str(project_id):
+                return c
     return None
 
 
@@ -1038,6 +1773,10 @@ def workspace_files(project_id):
             'error': 'No running container found for this project. '
                      'Launch the workspace first.'
         }), 404
+    try:
+        _wake_workspace(container)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Could not resume workspace: {e}'}), 503
 
     # ── GET: read file ───────────────────────────────────────────────────────
     if request.method == 'GET':
@@ -1064,6 +1803,8 @@ def workspace_files(project_id):
             })
 
         content = result.output.decode('utf-8', errors='replace')
+        workspace_indexes.ensure(project_id, lambda: container)
+        workspace_indexes.file_changed(project_id, rel_path, content)
         log_activity('file_read', f'Project {project_id}: {rel_path}')
         return jsonify({'success': True, 'content': content, 'path': rel_path})
 
@@ -1091,7 +1832,7 @@ def workspace_files(project_id):
         demux=False,
     )
     # exec_run with stdin=True doesn't pipe directly; use exec_create/start instead
-    client = docker.from_env()
+    client = get_docker()
     exec_inst = client.api.exec_create(
         container.id,
         cmd=['tee', full_path],
@@ -1114,6 +1855,7 @@ def workspace_files(project_id):
         logger.error(f"tee write failed (exit {exit_code}) for {full_path}")
         return jsonify({'success': False, 'error': f'Write failed (exit {exit_code})'}), 500
 
+    workspace_indexes.file_changed(project_id, rel_path, content)
     log_activity('file_write', f'Project {project_id}: {rel_path} ({len(content)} bytes)')
     return jsonify({
         'success': True,
@@ -1158,30 +1900,127 @@ def test_database():
         return render_template('db_error.html', error=str(e)), 500
 
 
+_health_checker = None
+_health_lock = threading.Lock()
+
+
+def _docker_probe():
+    get_docker().ping()
+    return {}
+
+
+def _websocket_probe():
+    """The message queue link: this worker's bus must keep its heartbeat going."""
+    bus = worker_bus.stats()
+    details = {'message_queue': ('local' if MESSAGE_QUEUE == 'local'
+                                 else 'redis' if MESSAGE_QUEUE else 'none'),
+               **bus, **terminal_directory.stats()}
+    if bus['enabled'] and (bus['heartbeat_ago_s'] is None or bus['heartbeat_ago_s'] > worker_bus.ttl):
+        details['status'] = 'degraded'
+    return details
+
+
+def _ai_probe():
+    """Configuration only – a real model call per probe would cost money."""
+    if AI_FAKE_MODEL:
+        return {'mode': 'fake'}
+    configured = bool(os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"))
+    if not configured:
+        return {'status': 'disabled', 'mode': 'gemini', 'error': 'GEMINI_API_KEY not set'}
+    if not _GENAI_AVAILABLE:
+        raise RuntimeError("GEMINI_API_KEY is set but google-generativeai is not installed")
+    limiter = ai_limiter.stats()
+    return {'mode': 'gemini', 'model': _GEMINI_MODEL,
+            'active': limiter['active'], 'queue_depth': limiter['queue_depth']}
+
+
+def get_health_checker():
+    """Start the background health probes on first use (one set per worker)."""
+    global _health_checker
+    if _health_checker is None:
+        with _health_lock:
+            if _health_checker is None:
+                checker = HealthChecker(spawn=socketio.start_background_task, sleep=socketio.sleep)
+                checker.register('database', DatabaseProbe(lambda: psycopg.connect(
+                    **{**DB_CONFIG, 'connect_timeout': max(1, int(HEALTH_TIMEOUT))}, autocommit=True)))
+                checker.register('docker', _docker_probe, critical=False)
+                checker.register('redis', lambda: get_store().ping(), critical=False)
+                checker.register('websocket', _websocket_probe, critical=False)
+                checker.register('monitor', monitor_probe(lambda: system_monitor), critical=False)
+                checker.register('ai', _ai_probe, critical=False)
+                checker.start()
+                _health_checker = checker
+    return _health_checker
+
+
 @app.route('/health')
 def health_check():
+    """
+    Served from the background probes' last results (see health.py), so
+    frequent polling by Docker and load balancers costs no DB connection.
+    503 when a critical component (the database) is down; "pending" until
+    the worker's first probe round is in. Unauthenticated, so it carries
+    only statuses and latencies – details are at /api/metrics/health.
+    """
+    snapshot = get_health_checker().snapshot()
     health_status = {
-        'status': 'healthy',
+        'status': snapshot['status'],
         'timestamp': datetime.now().isoformat(),
         'service': 'CloudX Platform',
         'version': '2.1.0',
-        'components': {}
+        'checked_ago_s': snapshot['checked_ago_s'],
+        'components': {
+            name: {key: result[key] for key in ('status', 'latency_ms') if key in result}
+            for name, result in snapshot['components'].items()
+        },
     }
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT 1")
-        health_status['components']['database'] = {
-            'status': 'healthy', 'response_time': '< 100ms'
-        }
-    except Exception as e:
-        health_status['components']['database'] = {
-            'status': 'unhealthy', 'error': str(e)
-        }
-        health_status['status'] = 'degraded'
+    return jsonify(health_status), 503 if snapshot['status'] == 'unhealthy' else 200
+
+
+@app.route('/api/metrics/health', methods=['GET'])
+@login_required
+def api_health_metrics():
+    """Full probe results for this worker, plus terminal, log stream, admission and hibernation state."""
+    snapshot = get_health_checker().snapshot()
+    terminals = terminal_manager.stats()
+    components = snapshot['components']
+    components['terminals'] = {
+        'status': 'healthy',
+        'sessions': terminals['sessions'],
+        'attached': terminals['attached'],
+        'memory_bytes': terminals['memory_bytes'],
+    }
+    components['log_streams'] = {'status': 'healthy', **log_tails.stats()}
+    components['admission'] = {'status': 'healthy', **admission.stats()}
+    components['hibernation'] = (
+        {'status': 'healthy', **_hibernator.stats()} if _hibernator else {'status': 'not_started'}
+    )
+    return jsonify({'success': True, **snapshot})
 
-    health_status['components']['websocket'] = {'status': 'healthy'}
-    return jsonify(health_status)
+
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", 15))   # seconds
+
+_DASHBOARD_SQL = """
+    WITH stats AS (
+        SELECT COALESCE(us.project_count, 0)  AS total_projects,
+               COALESCE(us.activity_count, 0) AS total_activities,
+               (SELECT COUNT(*) FROM deployments d
+                JOIN projects p ON d.project_id = p.id
+                WHERE d.status = 'active' AND p.owner_id = %(user_id)s) AS active_deployments
+        FROM (SELECT %(user_id)s::integer AS user_id) u
+        LEFT JOIN user_stats us ON us.user_id = u.user_id
+    )
+    SELECT s.total_projects, s.active_deployments, s.total_activities,
+           r.action, r.details, r.created_at
+    FROM stats s
+    LEFT JOIN LATERAL (
+        SELECT action, details, created_at, id
+        FROM activity_logs
+        WHERE user_id = %(user_id)s
+        ORDER BY created_at DESC, id DESC LIMIT 15
+    ) r ON TRUE
+    ORDER BY r.created_at DESC, r.id DESC
+"""
 
 
 def get_dashboard_stats():
@@ -1196,60 +2035,56 @@ def get_dashboard_stats():
     if not current_user.is_authenticated:
         return stats
 
+    # One round trip: counters come from user_stats (kept by triggers), the
+    # recent activities ride along as extra rows of the same result set.
     try:
         with get_db_connection() as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
-                cursor.execute(
-                    "SELECT COUNT(*) as count FROM projects WHERE owner_id = %s",
-                    (current_user.id,)
-                )
-                stats['total_projects'] = cursor.fetchone()['count']
-
-                cursor.execute("""
-                    SELECT COUNT(*) as count FROM deployments d
-                    JOIN projects p ON d.project_id = p.id
-                    WHERE d.status = 'active' AND p.owner_id = %s
-                """, (current_user.id,))
-                stats['active_deployments'] = cursor.fetchone()['count']
-
-                cursor.execute(
-                    "SELECT COUNT(*) as count FROM activity_logs WHERE user_id = %s",
-                    (current_user.id,)
-                )
-                stats['total_activities'] = cursor.fetchone()['count']
-
-                cursor.execute("""
-                    SELECT action, details, created_at
-                    FROM activity_logs
-                    WHERE user_id = %s
-                    ORDER BY created_at DESC LIMIT 15
-                """, (current_user.id,))
-                stats['recent_activities'] = cursor.fetchall()
+                cursor.execute(_DASHBOARD_SQL, {'user_id': current_user.id})
+                rows = cursor.fetchall()
+        if rows:
+            stats['total_projects']     = rows[0]['total_projects']
+            stats['active_deployments'] = rows[0]['active_deployments']
+            stats['total_activities']   = rows[0]['total_activities']
+            stats['recent_activities']  = [
+                {'action': r['action'], 'details': r['details'], 'created_at': r['created_at']}
+                for r in rows if r['action'] is not None
+            ]
     except Exception as e:
         logger.error(f"Dashboard stats error: {e}")
 
     return stats
 
+
+def invalidate_dashboard(user_id):
+    """Drop the cached /api/dashboard payload after a write that changes it."""
+    get_store().delete(f"dashboard:{user_id}")
+
+
+def invalidate_dashboards(user_ids):
+    """ActivityWriter hook: the batch's rows are committed, so their counters and feed changed."""
+    if user_ids:
+        get_store().delete(*(f"dashboard:{user_id}" for user_id in user_ids))
+
+
 @app.route('/api/dashboard')
 @login_required
 def api_dashboard():
     """
     Dashboard stats endpoint for the React frontend.
-    Returns the result of get_dashboard_stats() as JSON, with all datetime
-    objects serialised to ISO-8601 strings.
+    Returns the result of get_dashboard_stats() as JSON (datetimes become
+    ISO-8601 in the JSON provider). The serialised body is cached per user
+    for DASHBOARD_CACHE_TTL seconds and invalidated by project and
+    deployment writes, and by the activity writer once queued events land.
     """
-    stats = get_dashboard_stats()
+    cache_key = f"dashboard:{current_user.id}"
+    cached = get_store().get(cache_key)
+    if cached:
+        return app.response_class(cached, mimetype='application/json')
 
-    serialisable_activities = []
-    for row in stats.get('recent_activities', []):
-        item = dict(row)
-        for key, val in item.items():
-            if hasattr(val, 'isoformat'):
-                item[key] = val.isoformat()
-        serialisable_activities.append(item)
-
-    stats['recent_activities'] = serialisable_activities
-    return jsonify(stats)
+    response = jsonify(get_dashboard_stats())
+    get_store().set(cache_key, response.get_data(as_text=True), ttl=DASHBOARD_CACHE_TTL)
+    return response
 
 # ── WEBSOCKET EVENTS
 
@@ -1266,12 +2101,65 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    terminal_manager.detach_sid(request.sid)
+    owner = terminal_directory.unrelay(request.sid)
+    if owner:
+        worker_bus.send(owner, 'terminal_detach', {'sid': request.sid})
     log_activity('websocket_disconnect', 'Client disconnected')
 
 
+# ── System monitor ──
+# Started in every worker by start_worker_services() (see below), never on
+# import. The "monitor" lease picks the one worker that polls Docker and
+# writes system_metrics; the others follow its summaries through the store.
+# The leader renews it every tick, so a dead leader is replaced within
+# three poll intervals.
+system_monitor = None
+_system_monitor_lock = threading.Lock()
+
+
+def start_system_monitor():
+    global system_monitor
+    if SystemMonitor is None or system_monitor is not None:
+        return system_monitor
+    with _system_monitor_lock:
+        if system_monitor is None:
+            monitor = SystemMonitor(socketio, store=get_store(),
+                                    lease=Lease(get_store(), "monitor", ttl=3 * MONITOR_POLL_INTERVAL))
+            monitor.start()
+            atexit.register(monitor.stop)
+            system_monitor = monitor
+            logger.info("Background SystemMonitor started")
+    return system_monitor
+
+
 @socketio.on('request_metrics')
-def handle_metrics_request():
-    pass
+def handle_metrics_request(data=None):
+    """
+    Reply with the latest in-memory snapshot (scoped to the caller's containers)
+    and backfill up to ``data['minutes']`` of history, without a DB round-trip.
+    """
+    if not current_user.is_authenticated or system_monitor is None:
+        return
+
+    latest = system_monitor.latest_summary()
+    if not latest:
+        return
+
+    project_ids = _get_user_project_ids()
+    emit('metrics_update', scope_summary(latest, project_ids))
+
+    minutes = data.get('minutes') if isinstance(data, dict) else None
+    if minutes:
+        try:
+            minutes = max(1, min(int(minutes), HISTORY_MINUTES))
+        except (TypeError, ValueError):
+            return
+        emit('metrics_history', {
+            'minutes': minutes,
+            'points': [scope_summary(s, project_ids)
+                       for s in system_monitor.history(minutes)],
+        })
 
 
 @socketio.on('join')
@@ -1301,142 +2189,195 @@ def server_error(error):
 
 # ── TERMINAL SESSIONS ───────
 
-terminal_sessions = {}
+# Sessions are keyed by (user_id, container_id) and survive a client
+# disconnect for TERMINAL_DETACH_GRACE, so a reconnecting browser reattaches
+# to the same shell and gets its scrollback replayed. The manager enforces
+# per-user/global caps and reaps idle sessions.
+#
+# With several workers a session stays on the worker that opened its exec.
+# terminal_directory records that worker in the shared store; a join that
+# lands anywhere else is relayed to it over the worker bus, and its output
+# comes back through the Socket.IO message queue like any other emit.
+worker_bus = WorkerBus(MESSAGE_QUEUE, get_store(), socketio.start_background_task, socketio.sleep)
+terminal_directory = TerminalDirectory(get_store(), worker_bus)
+terminal_manager = TerminalManager(
+    socketio, on_close=lambda term: terminal_directory.release(term.user_id, term.container_id),
+    slots=SlotPool(get_store(), "terminal", TERMINAL_MAX_PER_USER, ttl=3 * TERMINAL_REAP_INTERVAL),
+)
+worker_bus.on_heartbeat(lambda: terminal_directory.refresh(terminal_manager.session_keys()))
+atexit.register(terminal_manager.shutdown)
+atexit.register(worker_bus.stop)
 
-TERMINAL_BUFFER_BYTES    = int(os.getenv("TERMINAL_BUFFER_BYTES",    4096))
-TERMINAL_FLUSH_INTERVAL  = float(os.getenv("TERMINAL_FLUSH_INTERVAL", 0.05))
 
+@socketio.on('terminal_join')
+def on_terminal_join(data):
+    container_id = data.get('container_id')
+    binary = data.get('encoding', 'binary') != 'text'
+    sid = request.sid
 
-def _buffered_docker_reader(container_id: str, exec_sock, sid: str):
-    raw_sock = exec_sock._sock if hasattr(exec_sock, '_sock') else exec_sock
+    if not current_user.is_authenticated:
+        emit('terminal_output', {'output': '\r\n\x1b[31mAccess denied.\x1b[0m\r\n'})
+        return
 
-    raw_sock.setblocking(False)
+    owner = terminal_directory.owner(current_user.id, container_id)
+    previous = terminal_directory.unrelay(sid)
+    if previous and previous != owner:
+        worker_bus.send(previous, 'terminal_detach', {'sid': sid})
+    if owner is not None:
+        terminal_manager.detach_sid(sid)
+        terminal_directory.relay(sid, owner)
+        worker_bus.send(owner, 'terminal_attach', {
+            'sid': sid, 'user_id': current_user.id,
+            'container_id': container_id, 'binary': binary,
+        })
+        return
 
-    buf: list[bytes] = []
-    buf_size: int = 0
-    last_flush: float = time.monotonic()
+    term = terminal_manager.get(current_user.id, container_id)
 
-    def flush():
-        nonlocal buf, buf_size, last_flush
-        if not buf:
+    if term is None:
+        try:
+            client    = get_docker()
+            container = client.containers.get(container_id)
+            if not _container_belongs_to_user(container):
+                emit('terminal_output', {
+                    'output': '\r\n\x1b[31mAccess denied.\x1b[0m\r\n'
+                })
+                return
+            if _wake_workspace(container):
+                emit('terminal_output', {'output': '\r\n\x1b[33mWorkspace resumed.\x1b[0m\r\n'})
+        except Exception as e:
+            emit('terminal_output', {
+                'output': f"\r\n\x1b[31mError: {e}\x1b[0m\r\n"
+            })
             return
-        payload = b"".join(buf).decode("utf-8", errors="ignore")
-        socketio.emit("terminal_output", {"output": payload}, room=sid)
-        buf = []
-        buf_size = 0
-        last_flush = time.monotonic()
 
-    try:
-        import select  # POSIX-only; available on Linux containers
-
-        while True:
-            now = time.monotonic()
-            time_until_flush = TERMINAL_FLUSH_INTERVAL - (now - last_flush)
-
-            readable, _, _ = select.select(
-                [raw_sock], [], [],
-                max(0.0, time_until_flush)
+        def start_exec():
+            exec_inst = client.api.exec_create(
+                container_id, "/bin/bash",
+                stdin=True, tty=True, stdout=True, stderr=True
             )
+            return client.api.exec_start(exec_inst['Id'], detach=False, tty=True, socket=True)
 
-            if readable:
-                try:
-                    chunk = raw_sock.recv(4096)
-                except BlockingIOError:
-                    chunk = b""
-
-                if not chunk:
-                    # EOF – the container exec session ended
-                    break
-
-                buf.append(chunk)
-                buf_size += len(chunk)
-
-                # Size-based flush
-                if buf_size >= TERMINAL_BUFFER_BYTES:
-                    flush()
-            else:
-                flush()
-
-    except Exception as exc:
-        logger.error("Terminal reader error (sid=%s): %s", sid, exc)
-    finally:
-        flush()
-        logger.debug("Terminal reader exited (sid=%s)", sid)
-
-
-@socketio.on('terminal_join')
-def on_terminal_join(data):
-    container_id = data.get('container_id')
-    sid = request.sid
-
-    try:
-        user_project_ids = _get_user_project_ids()
-        client    = docker.from_env()
-        container = client.containers.get(container_id)
-        if not _container_belongs_to_user(container.name, user_project_ids):
+        try:
+            term = terminal_manager.open(current_user.id, container_id, start_exec)
+        except TerminalLimitError as e:
+            emit('terminal_output', {'output': f"\r\n\x1b[31m{e}\x1b[0m\r\n"})
+            return
+        except Exception as e:
+            logger.error(f"Terminal connect error: {e}")
             emit('terminal_output', {
-                'output': '\r\n\x1b[31mAccess denied.\x1b[0m\r\n'
+                'output': f"\r\n\x1b[31mError connecting to container: {e}\x1b[0m\r\n"
             })
             return
-    except Exception as e:
-        emit('terminal_output', {
-            'output': f"\r\n\x1b[31mError: {e}\x1b[0m\r\n"
-        })
-        return
+        terminal_directory.claim(current_user.id, container_id)
 
-    try:
-        exec_inst = client.api.exec_create(
-            container_id, "/bin/bash",
-            stdin=True, tty=True, stdout=True, stderr=True
-        )
-        sock = client.api.exec_start(exec_inst['Id'], detach=False, tty=True, socket=True)
-        terminal_sessions[sid] = sock
-
-        socketio.start_background_task(
-            target=_buffered_docker_reader,
-            container_id=container_id,
-            exec_sock=sock,
-            sid=sid,
-        )
-
-    except Exception as e:
-        logger.error(f"Terminal connect error: {e}")
-        emit('terminal_output', {
-            'output': f"\r\n\x1b[31mError connecting to container: {e}\x1b[0m\r\n"
-        })
+    terminal_manager.attach(sid, term, binary=binary)
 
 
 @socketio.on('terminal_input')
 def on_terminal_input(data):
-    sid = request.sid
-    if sid in terminal_sessions:
-        sock = terminal_sessions[sid]
+    owner = terminal_directory.relayed(request.sid)
+    if owner:
+        worker_bus.send(owner, 'terminal_input', {'sid': request.sid, 'input': data.get('input', '')})
+        return
+    term = terminal_manager.for_sid(request.sid)
+    if term:
         try:
-            raw_sock = sock._sock if hasattr(sock, '_sock') else sock
-            raw_sock.send(data['input'].encode())
+            term.write(data['input'].encode())
         except Exception as e:
             logger.error(f"Terminal write error: {e}")
 
 
-@socketio.on('disconnect')
-def on_disconnect_cleanup():
-    sid = request.sid
-    if sid in terminal_sessions:
+@socketio.on('terminal_ack')
+def on_terminal_ack(data):
+    """Client has rendered ``data['bytes']`` of output – return that much credit."""
+    owner = terminal_directory.relayed(request.sid)
+    if owner:
+        worker_bus.send(owner, 'terminal_ack', {'sid': request.sid, 'bytes': data.get('bytes', 0)})
+        return
+    term = terminal_manager.for_sid(request.sid)
+    if term:
         try:
-            sock = terminal_sessions[sid]
-            raw_sock = sock._sock if hasattr(sock, '_sock') else sock
-            raw_sock.close()
-        except Exception:
+            term.ack(int(data.get('bytes', 0)))
+        except (TypeError, ValueError):
             pass
-        del terminal_sessions[sid]
+
+
+# ── Relayed terminal events (this worker owns the session) ──
+
+def _relayed_attach(payload, sender):
+    sid = payload.get('sid')
+    term = terminal_manager.get(payload.get('user_id'), payload.get('container_id'))
+    if term is None:
+        socketio.emit('terminal_exit', {'container_id': payload.get('container_id')}, room=sid)
+        return
+    terminal_manager.attach(sid, term, binary=payload.get('binary', True))
+
+
+def _relayed_input(payload, sender):
+    term = terminal_manager.for_sid(payload.get('sid'))
+    if term:
+        term.write(str(payload.get('input', '')).encode())
+
+
+def _relayed_ack(payload, sender):
+    term = terminal_manager.for_sid(payload.get('sid'))
+    if term:
+        try:
+            term.ack(int(payload.get('bytes', 0)))
+        except (TypeError, ValueError):
+            pass
+
+
+worker_bus.on('terminal_attach', _relayed_attach)
+worker_bus.on('terminal_input', _relayed_input)
+worker_bus.on('terminal_ack', _relayed_ack)
+worker_bus.on('terminal_detach', lambda payload, sender: terminal_manager.detach_sid(payload.get('sid')))
+
+
+def start_worker_services():
+    """
+    Start this worker's background services: the system monitor, the worker
+    bus and the health probes. Called once per worker after it forks – from
+    gunicorn's post_worker_init hook (gunicorn.conf.py) or __main__ – so that
+    importing the module (tests, benchmarks, the gunicorn master) opens no
+    Docker or database connections. Safe to call more than once.
+    """
+    start_system_monitor()
+    worker_bus.start()
+    get_health_checker()
+
+
+@app.route('/api/metrics/activity', methods=['GET'])
+@login_required
+def api_activity_metrics():
+    """This worker's activity log writer: events queued, written, dropped (queue full) and failed."""
+    return jsonify({'success': True, 'activity': get_activity_writer().stats()})
+
+
+@app.route('/api/metrics/docker', methods=['GET'])
+@login_required
+def api_docker_metrics():
+    """Per-endpoint Docker API call counts, errors, retries and latency for this worker."""
+    return jsonify({'success': True, 'docker': docker_stats.snapshot()})
+
+
+@app.route('/api/terminals', methods=['GET'])
+@login_required
+def api_terminals():
+    """Worker-wide terminal counts and memory, plus the caller's own sessions."""
+    return jsonify({'success': True, 'terminals': terminal_manager.stats(current_user.id)})
 
 if __name__ == '__main__':
-    if SystemMonitor:
-        monitor = SystemMonitor(socketio)
-        monitor.daemon = True
-        monitor.start()
-        logger.info("Background SystemMonitor started")
+    # Under gunicorn the schema is migrated once by the master (gunicorn.conf.py).
+    from migrations import connect as migrations_connect, migrate
+    try:
+        with migrations_connect() as conn:
+            migrate(conn)
+    except Exception as e:
+        logger.error(f"Database migration error: {e}")
 
+    start_worker_services()
     socketio.run(
         app,
         host='0.0.0.0',
@@ -0,0 +1,571 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+
+import requests
+
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+AI_CACHE_SIZE     = int(os.getenv("AI_CACHE_SIZE",           500))    # entries per worker
+AI_CACHE_TTL      = int(os.getenv("AI_CACHE_TTL",            3600))   # seconds
+AI_CACHE_WAIT     = float(os.getenv("AI_CACHE_WAIT",         60.0))   # max wait on an identical call
+AI_MAX_CONCURRENT = int(os.getenv("AI_MAX_CONCURRENT",       8))      # upstream calls per worker
+AI_MAX_PER_USER   = int(os.getenv("AI_MAX_PER_USER",         2))
+AI_MAX_QUEUED     = int(os.getenv("AI_MAX_QUEUED_PER_USER",  4))      # waiting, per user
+AI_QUEUE_TIMEOUT  = float(os.getenv("AI_QUEUE_TIMEOUT",      30.0))   # seconds
+AI_TIMEOUT        = float(os.getenv("AI_REQUEST_TIMEOUT",    60.0))   # seconds per upstream call
+AI_RETRIES        = int(os.getenv("AI_RETRIES",              2))      # extra attempts on 429/5xx
+AI_RETRY_BACKOFF  = float(os.getenv("AI_RETRY_BACKOFF",      1.0))    # seconds, doubles per try
+AI_FAKE_LATENCY   = float(os.getenv("AI_FAKE_LATENCY",       0.5))    # seconds, FakeModel only
+AI_RETRY_AFTER    = 5                                                 # seconds, on 503
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# Model calls take seconds, not milliseconds.
+AI_LATENCY_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000)
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def response_text(response) -> str:
+    """Concatenate the text parts of the first candidate (a response or a stream chunk)."""
+    text = ""
+    if getattr(response, "candidates", None):
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, "text"):
+                text += part.text
+    return text
+
+
+def usage_of(response) -> dict:
+    meta = getattr(response, "usage_metadata", None)
+    if not meta:
+        return {}
+    return {
+        "prompt_tokens":     getattr(meta, "prompt_token_count",     None),
+        "candidates_tokens": getattr(meta, "candidates_token_count", None),
+    }
+
+
+def sse(event: str, data) -> str:
+    """One server-sent event frame; data is JSON so newlines survive."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def normalize_context(text: str) -> str:
+    """Line endings and trailing whitespace don't change the answer, so they don't change the key."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(model: str, system_prompt: str, context: str, query: str) -> str:
+    """Content address of a request: sha256 over its normalized parts."""
+    h = hashlib.sha256()
+    for part in (model, system_prompt, normalize_context(context), normalize_query(query)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Rate limits, server errors and timeouts; google.api_core errors carry the HTTP status as *code*."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return isinstance(exc, (TimeoutError, ConnectionError, requests.Timeout, requests.ConnectionError))
+
+
+def backoff_delay(attempt: int, backoff: float = AI_RETRY_BACKOFF) -> float:
+    """Exponential backoff with jitter, so retrying workers don't stampede together."""
+    return backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+# ── Metrics ────────────────────────────────────────────────────────────────────
+
+class AIMetrics:
+    """Request counters plus time-to-first-token and total-time histograms."""
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self.counters = {"requests": 0, "streamed": 0, "completed": 0, "cancelled": 0,
+                         "errors": 0, "retries": 0}
+        self.ttft     = LatencyHistogram(AI_LATENCY_BUCKETS)
+        self.total    = LatencyHistogram(AI_LATENCY_BUCKETS)
+
+    def count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, "ttft": self.ttft.snapshot(), "total": self.total.snapshot()}
+
+
+# ── Upstream calls ─────────────────────────────────────────────────────────────
+
+def complete(model, prompt: str, metrics: AIMetrics, retries: int = AI_RETRIES,
+             backoff: float = AI_RETRY_BACKOFF, timeout: float = AI_TIMEOUT, sleep=time.sleep):
+    """One non-streaming completion, retried on 429/5xx and timeouts."""
+    for attempt in range(retries + 1):
+        try:
+            return model.generate_content(prompt, request_options={"timeout": timeout})
+        except Exception as exc:
+            if attempt >= retries or not is_retryable(exc):
+                raise
+            metrics.count("retries")
+            logger.warning("AI upstream error (%s), retry %d/%d", exc, attempt + 1, retries)
+            sleep(backoff_delay(attempt, backoff))
+
+
+def stream_events(model, prompt: str, metrics: AIMetrics, on_finish=None,
+                  retries: int = AI_RETRIES, backoff: float = AI_RETRY_BACKOFF,
+                  timeout: float = AI_TIMEOUT, sleep=time.sleep):
+    """
+    Generate SSE frames for one streamed completion: ``token`` events as
+    text arrives, then ``done`` with usage and timings (or ``error``).
+
+    *on_finish* is called with the done payload and the full answer text.
+    Retryable errors are retried only until the first token has been sent.
+    If the client goes away the WSGI server closes this generator; the
+    GeneratorExit stops iteration of the upstream stream and the request
+    is counted as cancelled.
+    """
+    metrics.count("requests")
+    metrics.count("streamed")
+    start = time.perf_counter()
+    ttft_ms = None
+    chunks = 0
+    parts = []
+    try:
+        attempt = 0
+        while True:
+            try:
+                response = model.generate_content(prompt, stream=True,
+                                                  request_options={"timeout": timeout})
+                for chunk in response:
+                    text = response_text(chunk)
+                    if not text:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - start) * 1000
+                        metrics.ttft.observe(ttft_ms)
+                    chunks += 1
+                    parts.append(text)
+                    yield sse("token", {"text": text})
+                break
+            except Exception as exc:
+                if chunks or attempt >= retries or not is_retryable(exc):
+                    raise
+                metrics.count("retries")
+                logger.warning("AI stream upstream error (%s), retry %d/%d", exc, attempt + 1, retries)
+                sleep(backoff_delay(attempt, backoff))
+                attempt += 1
+
+        total_ms = (time.perf_counter() - start) * 1000
+        metrics.total.observe(total_ms)
+        metrics.count("completed")
+        result = {
+            "usage":    usage_of(response),
+            "ttft_ms":  round(ttft_ms if ttft_ms is not None else total_ms, 1),
+            "total_ms": round(total_ms, 1),
+            "chunks":   chunks,
+        }
+        if on_finish:
+            on_finish(result, "".join(parts))
+        yield sse("done", result)
+    except GeneratorExit:
+        metrics.count("cancelled")
+        logger.info("AI stream cancelled by client after %.0f ms", (time.perf_counter() - start) * 1000)
+        raise
+    except Exception as exc:
+        metrics.count("errors")
+        logger.error("AI stream – Gemini API error: %s", exc, exc_info=True)
+        yield sse("error", {"error": "The AI assistant encountered an error. Please try again.",
+                            "detail": str(exc)})
+
+
+def cached_events(value: dict, elapsed_ms: float = 0.0):
+    """Replay a cached answer in the same event shape as a live stream."""
+    yield sse("token", {"text": value["suggestion"]})
+    yield sse("done", {"usage": value.get("usage") or {}, "ttft_ms": round(elapsed_ms, 1),
+                       "total_ms": round(elapsed_ms, 1), "chunks": 1, "cached": True})
+
+
+# ── Response cache ─────────────────────────────────────────────────────────────
+
+class _Flight:
+    def __init__(self):
+        self.done  = threading.Event()
+        self.value = None
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of successful assistant answers.
+
+    An LRU of at most AI_CACHE_SIZE entries, each expiring after AI_CACHE_TTL,
+    optionally backed by a *shared* store (Redis) so workers and restarts
+    reuse answers. Identical requests that arrive while one is already
+    upstream wait for it instead of making their own call.
+
+    Usage::
+
+        hit, value = cache.claim(key)
+        if not hit:
+            try:     value = call_model(); cache.release(key, value)
+            except:  cache.release(key, None); raise
+    """
+
+    def __init__(self, max_entries: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL,
+                 shared=None, wait_timeout: float = AI_CACHE_WAIT):
+        self._max      = max_entries
+        self._ttl      = ttl
+        self._shared   = shared
+        self._wait     = wait_timeout
+        self._lock     = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()   # key → (expires, value)
+        self._flights: dict = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0,
+                          "saved_prompt_tokens": 0, "saved_response_tokens": 0}
+
+    def claim(self, key: str):
+        """
+        Return (True, value) on a hit – including one produced by an
+        identical in-flight request – or (False, None) when the caller must
+        compute the value and then release() it.
+        """
+        while True:
+            value = self._get(key)
+            if value is not None:
+                self._hit(value)
+                return True, value
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    self._flights[key] = _Flight()
+                    self._counters["misses"] += 1
+                    return False, None
+            if flight.done.wait(timeout=self._wait) and flight.value is not None:
+                with self._lock:
+                    self._counters["coalesced"] += 1
+                self._hit(flight.value)
+                return True, flight.value
+            # The leader failed, was cancelled or is too slow: try to lead ourselves.
+            with self._lock:
+                if self._flights.get(key) is flight and not flight.done.is_set():
+                    self._counters["misses"] += 1
+                    return False, None
+
+    def release(self, key: str, value):
+        """Publish the leader's result (None on failure) and wake the waiters."""
+        if value is not None:
+            self.put(key, value)
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight.value = value
+            flight.done.set()
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            self._counters["stores"] += 1
+            while len(self._entries) > self._max:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+        if self._shared is not None:
+            self._shared.set(f"ai:{key}", json.dumps(value), ttl=self._ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["entries"] = len(self._entries)
+            counters["in_flight"] = len(self._flights)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else None
+        counters["shared"] = self._shared is not None
+        return counters
+
+    def _get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._entries.move_to_end(key)
+                    return item[1]
+                del self._entries[key]
+        if self._shared is not None:
+            raw = self._shared.get(f"ai:{key}")
+            if raw:
+                value = json.loads(raw)
+                with self._lock:
+                    self._entries[key] = (now + self._ttl, value)
+                    self._entries.move_to_end(key)
+                return value
+        return None
+
+    def _hit(self, value: dict):
+        usage = value.get("usage") or {}
+        with self._lock:
+            self._counters["hits"] += 1
+            self._counters["saved_prompt_tokens"]   += usage.get("prompt_tokens") or 0
+            self._counters["saved_response_tokens"] += usage.get("candidates_tokens") or 0
+
+
+# ── Concurrency ────────────────────────────────────────────────────────────────
+
+class AIBusyError(Exception):
+    """No upstream slot for this request. *status* is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 503, retry_after: int = AI_RETRY_AFTER):
+        super().__init__(message)
+        self.status      = status
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_id", "held_off")
+
+    def __init__(self, user_id):
+        self.user_id  = user_id
+        self.held_off = 0.0         # monotonic; skipped until then (user full on other workers)
+
+
+class AISlot:
+    """
+    One granted upstream call; release() when the response is done (or failed).
+    A shared slot lapses after its pool's TTL, so a long stream goes through
+    hold(), which refreshes it at most every *refresh_every* seconds.
+    """
+
+    def __init__(self, limiter, user_id, shared=None, refresh_every: float = 0.0):
+        self.user_id   = user_id
+        self._limiter  = limiter
+        self._shared   = shared
+        self._released = False
+        self._refresh_every = refresh_every
+        self._refreshed     = time.monotonic()
+
+    def refresh(self):
+        if self._shared is None or self._released:
+            return
+        now = time.monotonic()
+        if now - self._refreshed >= self._refresh_every:
+            self._refreshed = now
+            self._shared.refresh()
+
+    def hold(self, events):
+        """Pass *events* through, refreshing the shared slot as they go."""
+        try:
+            for event in events:
+                self.refresh()
+                yield event
+        finally:
+            events.close()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release(self.user_id)
+            if self._shared is not None:
+                self._shared.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AIConcurrencyLimiter:
+    """
+    Caps concurrent upstream calls at *max_concurrent* per worker and
+    *per_user* per user.
+
+    Callers wait in arrival order, except that a waiter whose user is already
+    at their own limit is passed over – so one user's burst queues behind
+    itself instead of in front of everyone else. A user may have at most
+    *max_queued* requests waiting; waiting longer than *queue_timeout* fails.
+
+    With *slots* (a cluster.SlotPool of per_user) a granted call also takes
+    a slot in the shared store, so *per_user* holds across workers. A user
+    whose slots are all taken elsewhere is passed over for *poll_interval*
+    and then tried again – other workers' releases don't wake us.
+    """
+
+    def __init__(self, max_concurrent: int = AI_MAX_CONCURRENT, per_user: int = AI_MAX_PER_USER,
+                 max_queued: int = AI_MAX_QUEUED, queue_timeout: float = AI_QUEUE_TIMEOUT,
+                 slots=None, poll_interval: float = 0.25):
+        self._max_concurrent = max_concurrent
+        self._per_user       = per_user
+        self._max_queued     = max_queued
+        self._queue_timeout  = queue_timeout
+        self._slots          = slots
+        self._poll_interval  = poll_interval
+
+        self._cond      = threading.Condition()
+        self._queue     = deque()
+        self._active: dict = {}             # user id → calls in flight
+        self._total     = 0
+        self._max_depth = 0
+        self._counters  = {"granted": 0, "queued": 0, "timeouts": 0, "rejected": 0}
+        self.wait       = LatencyHistogram(AI_LATENCY_BUCKETS)
+
+    def acquire(self, user_id) -> AISlot:
+        """Block until a slot is free; raise AIBusyError if that takes too long."""
+        start = time.monotonic()
+        deadline = start + self._queue_timeout
+        with self._cond:
+            if self._max_queued and sum(1 for w in self._queue if w.user_id == user_id) >= self._max_queued:
+                self._counters["rejected"] += 1
+                raise AIBusyError("You have too many AI requests waiting. "
+                                  "Let one finish first.", status=429)
+            waiter = _Waiter(user_id)
+            self._queue.append(waiter)
+            self._max_depth = max(self._max_depth, len(self._queue))
+            try:
+                queued, shared = False, None
+                while True:
+                    if self._next() is waiter:
+                        if self._slots is None:
+                            break
+                        shared = self._slots.acquire(user_id)
+                        if shared is not None:
+                            break
+                        waiter.held_off = time.monotonic() + self._poll_interval
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise AIBusyError("The AI assistant is busy. Please try again shortly.")
+                    if not queued:
+                        queued = True
+                        self._counters["queued"] += 1
+                    if self._slots is not None and any(w.held_off for w in self._queue):
+                        remaining = min(remaining, self._poll_interval)
+                    self._cond.wait(remaining)
+                self._active[user_id] = self._active.get(user_id, 0) + 1
+                self._total += 1
+                self._counters["granted"] += 1
+            finally:
+                self._queue.remove(waiter)
+                self._cond.notify_all()
+        self.wait.observe((time.monotonic() - start) * 1000)
+        return AISlot(self, user_id, shared,
+                      refresh_every=self._slots.ttl / 3 if self._slots is not None else 0.0)
+
+    def stats(self) -> dict:
+        with self._cond:
+            counters = dict(self._counters)
+            counters["active"]          = self._total
+            counters["queue_depth"]     = len(self._queue)
+            counters["max_queue_depth"] = self._max_depth
+            counters["users_active"]    = len(self._active)
+        counters["wait"]   = self.wait.snapshot()
+        counters["limits"] = {"max_concurrent": self._max_concurrent, "per_user": self._per_user,
+                              "max_queued_per_user": self._max_queued,
+                              "queue_timeout": self._queue_timeout}
+        return counters
+
+    def _next(self):
+        """The waiter that would get the next free slot, if any slot is free."""
+        if self._total >= self._max_concurrent:
+            return None
+        now = time.monotonic()
+        for waiter in self._queue:
+            if waiter.held_off > now:
+                continue
+            if self._active.get(waiter.user_id, 0) < self._per_user:
+                return waiter
+        return None
+
+    def _release(self, user_id):
+        with self._cond:
+            self._total -= 1
+            if self._active.get(user_id, 0) <= 1:
+                self._active.pop(user_id, None)
+            else:
+                self._active[user_id] -= 1
+            self._cond.notify_all()
+
+
+# ── Fake model ─────────────────────────────────────────────────────────────────
+
+class FakeAPIError(Exception):
+    """Shaped like a google.api_core error: *code* is the HTTP status."""
+
+    def __init__(self, code: int, message: str = ""):
+        super().__init__(message or f"fake upstream error {code}")
+        self.code = code
+
+
+def _fake_chunk(text: str):
+    part = SimpleNamespace(text=text)
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class _FakeStream:
+    def __init__(self, pieces, usage, delay, sleep):
+        self.usage_metadata = usage
+        self._pieces = pieces
+        self._delay  = delay
+        self._sleep  = sleep
+
+    def __iter__(self):
+        for piece in self._pieces:
+            if self._delay:
+                self._sleep(self._delay)
+            yield _fake_chunk(piece)
+
+
+class FakeModel:
+    """
+    Offline stand-in for genai.GenerativeModel, for tests and local runs
+    with AI_FAKE_MODEL=1. Answers *reply* (or echoes the question) after
+    *latency* seconds, streamed in *chunk_size*-character pieces. *failures*
+    lists HTTP statuses to raise on the next calls, one per call.
+    """
+
+    def __init__(self, reply: str | None = None, latency: float = AI_FAKE_LATENCY,
+                 chunk_size: int = 24, failures=(), sleep=time.sleep):
+        self.reply      = reply
+        self.latency    = latency
+        self.chunk_size = chunk_size
+        self.failures   = list(failures)
+        self.calls      = 0
+        self._sleep     = sleep
+        self._lock      = threading.Lock()
+
+    def generate_content(self, prompt: str, stream: bool = False, request_options=None):
+        with self._lock:
+            self.calls += 1
+            failure = self.failures.pop(0) if self.failures else None
+        if failure:
+            raise FakeAPIError(failure)
+
+        text  = self.reply if self.reply is not None else f"(fake) {prompt.strip().splitlines()[-1]}"
+        usage = SimpleNamespace(prompt_token_count=len(prompt.split()),
+                                candidates_token_count=len(text.split()))
+        if not stream:
+            if self.latency:
+                self._sleep(self.latency)
+            return SimpleNamespace(candidates=_fake_chunk(text).candidates, usage_metadata=usage)
+        n = self.chunk_size
+        pieces = [text[i:i + n] for i in range(0, len(text), n)] or [""]
+        return _FakeStream(pieces, usage, self.latency / len(pieces), self._sleep)
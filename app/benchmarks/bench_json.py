@@ -0,0 +1,154 @@
+"""
+JSON serialisation and compression benchmark for the large API responses.
+
+Builds payloads shaped like the real endpoints (database rows with
+datetimes and Decimals, container lists with port maps) and compares:
+
+  * before – Flask's default JSON provider, the dashboard's hand-written
+             datetime loop, no compression
+  * after  – FastJSONProvider (orjson when installed) plus gzip / brotli
+             as compression.py would negotiate them
+
+For each payload it reports body bytes and the CPU time to serialise (and
+compress) one response, median over --reps runs:
+
+    python benchmarks/bench_json.py --rows 100 --reps 200
+
+No database or Docker needed; payloads are synthetic and seeded.
+"""
+import os
+import sys
+import time
+import random
+import decimal
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonprovider import FastJSONProvider
+from compression import compress, _BROTLI_AVAILABLE
+
+ACTIONS    = ("project_created", "deployment_created", "container_launched", "page_view", "login")
+SEVERITIES = ("info", "info", "info", "warning", "error")
+
+
+# ── Payloads ───────────────────────────────────────────────────────────────────
+
+def _activities(rng, n, now):
+    return [{
+        "id": 100000 - i, "user_id": 1, "action": rng.choice(ACTIONS),
+        "details": f"Project 'demo-{rng.randint(1, 50)}' (ID: {rng.randint(1, 500)})",
+        "ip_address": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        "user_agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36",
+        "severity": rng.choice(SEVERITIES), "created_at": now - timedelta(seconds=37 * i),
+    } for i in range(n)]
+
+
+def _deployments(rng, n, now):
+    return [{
+        "id": 5000 - i, "project_id": rng.randint(1, 40), "environment": rng.choice(("dev", "staging", "prod")),
+        "status": rng.choice(("active", "success", "failed", "pending")), "version": f"1.{i // 10}.{i % 10}",
+        "commit_hash": "%040x" % rng.getrandbits(160), "deployed_by": "alice", "duration_ms": rng.randint(800, 90000),
+        "deployed_at": now - timedelta(minutes=13 * i), "project_name": f"service-{rng.randint(1, 40)}",
+    } for i in range(n)]
+
+
+def _metrics(rng, n, now):
+    names = (("cpu_percent", "%"), ("memory_percent", "%"), ("disk_percent", "%"), ("net_rx", "KB/s"))
+    return [{
+        "metric_name": name, "metric_value": decimal.Decimal(f"{rng.uniform(0, 100):.2f}"), "unit": unit,
+        "recorded_at": now - timedelta(seconds=15 * (i // len(names))),
+    } for i, (name, unit) in ((i, names[i % len(names)]) for i in range(n))]
+
+
+def _containers(rng, n, now):
+    return {"success": True, "containers": [{
+        "id": "%012x" % rng.getrandbits(48), "name": f"cloudx-project-{rng.randint(1, 99)}-{i}",
+        "status": rng.choice(("running", "paused", "exited")), "image": "codercom/code-server:latest",
+        "created": (now - timedelta(hours=i)).isoformat() + "Z",
+        "ports": {"8080/tcp": [{"HostIp": "0.0.0.0", "HostPort": str(20000 + i)}]},
+    } for i in range(n)]}
+
+
+def _dashboard(rng, n, now):
+    return {"total_projects": 42, "active_deployments": 7, "total_activities": 18234,
+            "recent_activities": [{"action": a["action"], "details": a["details"], "created_at": a["created_at"]}
+                                  for a in _activities(rng, 15, now)],
+            "system_health": "healthy", "deployment_success_rate": 0}
+
+
+PAYLOADS = {
+    "/api/activities":  _activities,
+    "/api/deployments": _deployments,
+    "/api/metrics":     _metrics,
+    "/api/containers":  _containers,
+    "/api/dashboard":   _dashboard,
+}
+
+
+def _dashboard_by_hand(stats):
+    """What api_dashboard did before the provider knew about datetimes."""
+    stats = dict(stats)
+    stats["recent_activities"] = [
+        {k: v.isoformat() if hasattr(v, "isoformat") else v for k, v in row.items()}
+        for row in stats["recent_activities"]
+    ]
+    return stats
+
+
+# ── Timing ─────────────────────────────────────────────────────────────────────
+
+def _median_us(fn, reps):
+    samples = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100, help="rows per list payload (the API page size)")
+    parser.add_argument("--reps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    before_app, after_app = Flask("before"), Flask("after")
+    before_app.json = DefaultJSONProvider(before_app)
+    after_app.json = FastJSONProvider(after_app)
+
+    rng, now = random.Random(args.seed), datetime(2024, 6, 1, 12, 0, 0)
+    encodings = ["gzip"] + (["br"] if _BROTLI_AVAILABLE else [])
+    header = f"{'endpoint':<18} {'before B':>9} {'µs':>7} {'after B':>9} {'µs':>7}"
+    for enc in encodings:
+        header += f" {enc + ' B':>9} {'+µs':>7}"
+    print(header)
+
+    for name, build in PAYLOADS.items():
+        payload = build(rng, args.rows, now)
+        prepare = _dashboard_by_hand if name == "/api/dashboard" else (lambda p: p)
+
+        with before_app.app_context():
+            before_us, before = _median_us(lambda: before_app.json.response(prepare(payload)).get_data(),
+                                           args.reps)
+        with after_app.app_context():
+            after_us, after = _median_us(lambda: after_app.json.response(payload).get_data(), args.reps)
+
+        line = f"{name:<18} {len(before):>9} {before_us:>7.0f} {len(after):>9} {after_us:>7.0f}"
+        for enc in encodings:
+            enc_us, body = _median_us(lambda: compress(after, enc), args.reps)
+            line += f" {len(body):>9} {enc_us:>7.0f}"
+        print(line)
+
+    if not _BROTLI_AVAILABLE:
+        print("\n(brotli not installed – br column skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Seeded pagination benchmark for activity_logs.
+
+Seeds a scratch schema (a copy of the live tables, indexes included) with up
+to --rows activity rows for a handful of users, and times the queries behind
+/api/activities at several table sizes:
+
+  * first page, with and without a severity filter
+  * OFFSET pagination at deep page numbers
+  * keyset (cursor) pagination at the same depth
+
+Run against a database where the app has already created its schema:
+
+    python benchmarks/bench_pagination.py --rows 1000000
+
+Use --no-indexes to copy the tables without their secondary indexes and
+compare. The scratch schema is dropped at the end unless --keep is given.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import psycopg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitor import DB_CONFIG
+
+SCHEMA     = "cloudx_bench"
+PAGE_SIZE  = 50
+DEEP_PAGES = (1, 100, 1000, 10000)
+
+LATEST_SQL = """
+    SELECT * FROM activity_logs
+    WHERE user_id = %s
+    ORDER BY created_at DESC, id DESC LIMIT %s
+"""
+SEVERITY_SQL = """
+    SELECT * FROM activity_logs
+    WHERE user_id = %s AND severity = %s
+    ORDER BY created_at DESC, id DESC LIMIT %s
+"""
+OFFSET_SQL = """
+    SELECT * FROM activity_logs
+    WHERE user_id = %s
+    ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s
+"""
+KEYSET_SQL = """
+    SELECT * FROM activity_logs
+    WHERE user_id = %s AND (created_at, id) < (%s, %s)
+    ORDER BY created_at DESC, id DESC LIMIT %s
+"""
+
+
+def _setup(conn, with_indexes: bool, users: int):
+    like = "INCLUDING ALL" if with_indexes else "INCLUDING DEFAULTS"
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"CREATE TABLE {SCHEMA}.users (LIKE public.users {like})")
+        cur.execute(f"CREATE TABLE {SCHEMA}.activity_logs (LIKE public.activity_logs {like})")
+        cur.execute(f"SET search_path TO {SCHEMA}")
+        cur.execute(
+            """INSERT INTO users (id, username, email, password_hash)
+               SELECT g, 'bench' || g, 'bench' || g || '@example.com', 'x'
+               FROM generate_series(1, %s) g""",
+            (users,)
+        )
+    conn.commit()
+
+
+def _seed(conn, start: int, stop: int, users: int):
+    """Insert rows [start, stop) spread over *users*, one second apart."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """INSERT INTO activity_logs
+                   (id, user_id, action, details, severity, created_at)
+               SELECT g,
+                      (g %% %s) + 1,
+                      'file_write',
+                      'seeded row ' || g,
+                      (ARRAY['info','info','info','warning','error'])[(g %% 5) + 1],
+                      TIMESTAMP '2024-01-01' + (g || ' seconds')::interval
+               FROM generate_series(%s, %s - 1) g""",
+            (users, start, stop)
+        )
+        cur.execute("ANALYZE activity_logs")
+    conn.commit()
+
+
+def _time(conn, sql: str, params: tuple, repeat: int) -> tuple[float, list]:
+    samples = []
+    rows = []
+    with conn.cursor() as cur:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), rows
+
+
+def _cursor_at_page(conn, user_id: int, page: int):
+    """(created_at, id) of the last row before *page*, as a client would hold it."""
+    if page <= 1:
+        return None
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT created_at, id FROM activity_logs
+               WHERE user_id = %s
+               ORDER BY created_at DESC, id DESC
+               LIMIT 1 OFFSET %s""",
+            (user_id, (page - 1) * PAGE_SIZE - 1)
+        )
+        return cur.fetchone()
+
+
+def _measure(conn, total_rows: int, repeat: int) -> list[tuple]:
+    results = []
+    user_id = 1
+
+    ms, _ = _time(conn, LATEST_SQL, (user_id, PAGE_SIZE), repeat)
+    results.append((total_rows, "latest page", ms))
+
+    ms, _ = _time(conn, SEVERITY_SQL, (user_id, "error", PAGE_SIZE), repeat)
+    results.append((total_rows, "latest page, severity=error", ms))
+
+    for page in DEEP_PAGES:
+        cursor = _cursor_at_page(conn, user_id, page)
+        if page > 1 and cursor is None:
+            continue
+
+        ms, _ = _time(conn, OFFSET_SQL, (user_id, PAGE_SIZE, (page - 1) * PAGE_SIZE), repeat)
+        results.append((total_rows, f"offset  page {page}", ms))
+
+        if cursor:
+            ms, _ = _time(conn, KEYSET_SQL, (user_id, cursor[0], cursor[1], PAGE_SIZE), repeat)
+        else:
+            ms, _ = _time(conn, LATEST_SQL, (user_id, PAGE_SIZE), repeat)
+        results.append((total_rows, f"keyset  page {page}", ms))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="final activity_logs row count")
+    parser.add_argument("--users", type=int, default=20, help="users the rows are spread across")
+    parser.add_argument("--steps", type=int, default=3, help="measure at rows/10**(steps-1) … rows")
+    parser.add_argument("--repeat", type=int, default=9, help="samples per query (median reported)")
+    parser.add_argument("--no-indexes", action="store_true", help="copy tables without secondary indexes")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    checkpoints = sorted({max(1, args.rows // 10 ** i) for i in range(args.steps)})
+
+    with psycopg.connect(**DB_CONFIG) as conn:
+        _setup(conn, not args.no_indexes, args.users)
+        seeded = 0
+        results = []
+        try:
+            for target in checkpoints:
+                t0 = time.perf_counter()
+                _seed(conn, seeded + 1, target + 1, args.users)
+                seeded = target
+                print(f"seeded {seeded:>10,} rows in {time.perf_counter() - t0:6.1f}s", file=sys.stderr)
+                results.extend(_measure(conn, seeded, args.repeat))
+        finally:
+            if not args.keep:
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+                conn.commit()
+
+    print(f"{'rows':>10}  {'query':<30} {'median ms':>10}")
+    for rows, name, ms in results:
+        print(f"{rows:>10,}  {name:<30} {ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
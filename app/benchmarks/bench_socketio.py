@@ -0,0 +1,194 @@
+"""
+Socket.IO scaling benchmark: connections and messages per second against the
+number of gunicorn workers.
+
+For each worker count, starts gunicorn (eventlet workers, as in the
+Dockerfile) serving a minimal app wired through the same message-queue
+setup as the real one, connects --clients WebSocket clients and measures:
+
+  * connect rate – clients connected per second, all at once
+  * echo         – each client sends --messages events and waits for the
+                   server to emit each one back (round-trip p50/p95)
+  * fan-out      – one client triggers --broadcasts room emits that every
+                   client receives, wherever its worker is
+
+More than one worker needs a message queue, normally the compose Redis:
+
+    python benchmarks/bench_socketio.py --workers 1,2,4 \\
+        --message-queue redis://localhost:6379/0
+
+Needs websocket-client (requirements.txt). Events that never arrive within
+--timeout are reported as a delivered fraction below 100%.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import socketio
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+ROOM = "bench"
+
+
+# ── Server side (run by gunicorn) ──────────────────────────────────────────────
+
+def create_app():
+    from flask import Flask, request
+    from flask_socketio import SocketIO, emit, join_room
+    from cluster import socketio_options
+
+    app = Flask(__name__)
+    sio = SocketIO(app, **socketio_options())
+
+    @sio.on("connect")
+    def on_connect():
+        join_room(ROOM)
+
+    @sio.on("echo")
+    def on_echo(data):
+        emit("echo", data, to=request.sid)
+
+    @sio.on("broadcast")
+    def on_broadcast(data):
+        sio.emit("fanout", data, to=ROOM)
+
+    return app
+
+
+# ── Driver ─────────────────────────────────────────────────────────────────────
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(workers: int, port: int, message_queue: str):
+    env = dict(os.environ, PYTHONPATH=APP_DIR, SOCKETIO_MESSAGE_QUEUE=message_queue)
+    log = tempfile.TemporaryFile()       # eventlet logs every client disconnect
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--worker-class", "eventlet", "-w", str(workers),
+         "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "bench_socketio:create_app()"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),     # not app/: skip its gunicorn.conf.py
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/socket.io/?EIO=4&transport=polling", timeout=1)
+            time.sleep(0.5 * workers)           # let the other workers finish booting
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.terminate()
+    log.seek(0)
+    raise RuntimeError("gunicorn did not start:\n" + log.read().decode(errors="replace")[-2000:])
+
+
+class _BenchClient:
+    def __init__(self):
+        self.sio = socketio.Client(reconnection=False)
+        self.rtts: list = []
+        self.echoed = 0
+        self.fanout = 0
+        self.done = threading.Event()
+        self.expect_echo = 0
+        self.sio.on("echo", self._on_echo)
+        self.sio.on("fanout", self._on_fanout)
+
+    def _on_echo(self, data):
+        self.rtts.append((time.perf_counter() - data["t"]) * 1000)
+        self.echoed += 1
+        if self.echoed >= self.expect_echo:
+            self.done.set()
+
+    def _on_fanout(self, data):
+        self.fanout += 1
+
+
+def _run(url: str, clients: int, messages: int, broadcasts: int, timeout: float) -> dict:
+    pool = ThreadPoolExecutor(max_workers=min(64, clients))
+    bench = [_BenchClient() for _ in range(clients)]
+
+    start = time.perf_counter()
+    list(pool.map(lambda c: c.sio.connect(url, transports=["websocket"], wait_timeout=timeout), bench))
+    connect_s = time.perf_counter() - start
+
+    def echo(c):
+        c.expect_echo = messages
+        for _ in range(messages):
+            c.sio.emit("echo", {"t": time.perf_counter()})
+        c.done.wait(timeout)
+
+    start = time.perf_counter()
+    list(pool.map(echo, bench))
+    echo_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(broadcasts):
+        bench[0].sio.emit("broadcast", {"i": i})
+    expected = clients * broadcasts
+    deadline = time.monotonic() + timeout
+    while sum(c.fanout for c in bench) < expected and time.monotonic() < deadline:
+        time.sleep(0.005)
+    fanout_s = time.perf_counter() - start
+
+    rtts = sorted(r for c in bench for r in c.rtts)
+    echoed = sum(c.echoed for c in bench)
+    fanned = sum(c.fanout for c in bench)
+    for c in bench:
+        c.sio.disconnect()
+    pool.shutdown()
+    return {
+        "connect_per_s": clients / connect_s,
+        "echo_per_s":    echoed / echo_s,
+        "echo_p50_ms":   statistics.median(rtts) if rtts else None,
+        "echo_p95_ms":   rtts[int(len(rtts) * 0.95) - 1] if rtts else None,
+        "echo_ok":       echoed / (clients * messages),
+        "fanout_per_s":  fanned / fanout_s,
+        "fanout_ok":     fanned / expected if expected else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated gunicorn worker counts")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50, help="echo events per client")
+    parser.add_argument("--broadcasts", type=int, default=20, help="room emits, each to every client")
+    parser.add_argument("--message-queue", default=os.getenv("SOCKETIO_MESSAGE_QUEUE", ""),
+                        help="redis:// URL; required for more than one worker")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7}  {'conn/s':>8}  {'echo/s':>8}  {'p50 ms':>7}  {'p95 ms':>7}  "
+          f"{'fanout/s':>9}  {'delivered':>9}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        if workers > 1 and args.message_queue in ("", "local"):
+            print(f"{workers:>7}  skipped – more than one worker needs a redis --message-queue")
+            continue
+        proc, url = _start_server(workers, _free_port(), args.message_queue)
+        try:
+            r = _run(url, args.clients, args.messages, args.broadcasts, args.timeout)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        delivered = min(r["echo_ok"], r["fanout_ok"])
+        print(f"{workers:>7}  {r['connect_per_s']:>8.0f}  {r['echo_per_s']:>8.0f}  "
+              f"{r['echo_p50_ms'] or 0:>7.1f}  {r['echo_p95_ms'] or 0:>7.1f}  "
+              f"{r['fanout_per_s']:>9.0f}  {delivered:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to import the app.
+
+Each run is a new process (`python -X importtime -c "import app"`), so
+nothing is cached between runs but the OS page cache. Reports the median
+and p95 wall time with the bare interpreter start subtracted, and the
+slowest imports of the last run (the module and what it imports directly):
+
+    python benchmarks/bench_startup.py --runs 10
+
+With --max-ms the exit status is 1 when the median exceeds it, for CI.
+Importing the app must not touch the database: run it with POSTGRES_HOST
+pointing nowhere and the numbers should not change.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _time(code: str, importtime: bool = False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=APP_DIR, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr[-2000:]}")
+    return elapsed, proc.stderr
+
+
+def _top_imports(stderr: str, top: int, depth: int = 1) -> list:
+    """(cumulative ms, module) for imports up to *depth* levels down, slowest first."""
+    result = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2     # two spaces per level
+        if level <= depth:
+            result.append((int(cumulative) / 1000, "  " * level + name.strip()))
+    return sorted(result, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=12, help="slowest imports to list")
+    parser.add_argument("--depth", type=int, default=1, help="nesting levels to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail above this median")
+    args = parser.parse_args()
+
+    baseline = statistics.median(_time("pass")[0] for _ in range(args.runs))
+    samples, stderr = [], ""
+    for _ in range(args.runs):
+        ms, stderr = _time(f"import {args.module}", importtime=True)
+        samples.append(ms - baseline)
+    samples.sort()
+
+    median = statistics.median(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"import {args.module}: median {median:.0f} ms, p95 {p95:.0f} ms "
+          f"({args.runs} runs, interpreter start {baseline:.0f} ms subtracted)\n")
+    print(f"{'cumulative ms':>13}  module")
+    for ms, name in _top_imports(stderr, args.top, args.depth):
+        print(f"{ms:>13.1f}  {name}")
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"\nFAIL: median {median:.0f} ms > --max-ms {args.max_ms:.0f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,545 @@
+"""
+Offline load test of the whole app: real routes, fake Docker, scratch Postgres.
+
+Starts gunicorn (one eventlet worker, as in the Dockerfile) serving app.py
+with benchmarks/fakedocker.py in place of the Docker daemon, against a
+freshly migrated and seeded database (--db, dropped and recreated each
+run), then drives these scenarios for --duration seconds each:
+
+  * dashboard – --users logged-in users polling the dashboard, activity,
+                project, deployment, metrics and container APIs
+  * files     – the same users saving and re-reading workspace files
+  * launch    – workspace launches, each deleted again right after
+  * terminals – --terminals Socket.IO clients with a terminal open, the
+                fake shell streaming --output-rate bytes/s to each while
+                the client types and times keystroke-to-echo
+  * monitor   – in-process: one SystemMonitor container sweep and metrics
+                insert over --monitor-containers fake containers
+
+and prints throughput and p50/p95/p99 latency per endpoint and event:
+
+    python benchmarks/bench_suite.py --users 20 --terminals 20 --duration 10
+
+Postgres comes from the usual POSTGRES_* variables and needs a role that
+may create databases (the compose one does). --save NAME writes the results
+to benchmarks/baselines/NAME.json; --baseline NAME compares against one and
+exits 1 when a p95 grew, or a throughput shrank, by more than --tolerance.
+Baselines are per machine: record one before a change, compare after.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg
+import requests
+import socketio
+
+BENCH_DIR    = os.path.dirname(os.path.abspath(__file__))
+APP_DIR      = os.path.dirname(BENCH_DIR)
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fakedocker import FakeDockerClient
+
+PASSWORD  = "bench-password"
+SCENARIOS = ("dashboard", "files", "launch", "terminals", "monitor")
+POLLED    = ("/api/dashboard", "/api/activities?limit=50", "/api/projects", "/api/deployments",
+             "/api/metrics", "/api/containers")
+
+# The server is tuned so that nothing but the code under test limits it:
+# no launch settle sleep, no quotas or host-load admission checks.
+SERVER_ENV = {
+    "LAUNCH_SETTLE_SECONDS":    "0",
+    "WORKSPACE_QUOTA_PER_USER": "100000",
+    "WORKSPACE_MEM_MB":         "64",
+    "WORKSPACE_MIN_MEM_MB":     "64",
+    "ADMISSION_MEM_RESERVE_MB": "0",
+    "ADMISSION_CPU_HIGH":       "101",
+    "ADMISSION_CPU_MAX":        "101",
+    "TERMINAL_MAX_PER_USER":    "1000",
+    "TERMINAL_MAX_TOTAL":       "10000",
+    "SOCKETIO_MESSAGE_QUEUE":   "",
+    "REDIS_URL":                "",
+}
+
+
+# ── Server side (run by gunicorn) ──────────────────────────────────────────────
+
+def create_app():
+    """app.py with a FakeDockerClient holding one running workspace per seeded project."""
+    import dockerclient
+    from monitor import DB_CONFIG
+
+    fake = FakeDockerClient(latency=float(os.getenv("BENCH_DOCKER_LATENCY", 0)),
+                            run_latency=float(os.getenv("BENCH_RUN_LATENCY", 0)),
+                            output_rate=int(os.getenv("BENCH_OUTPUT_RATE", 0)))
+    dockerclient._client = fake                 # get_docker() hands this out from now on
+
+    import app as cloudx
+    with psycopg.connect(**DB_CONFIG) as conn:
+        projects = conn.execute("SELECT id, owner_id FROM projects ORDER BY id").fetchall()
+    for project_id, owner_id in projects:
+        fake.add(f"cloudx-project-{project_id}-seed",
+                 labels={cloudx.LABEL_OWNER: str(owner_id), cloudx.LABEL_PROJECT: str(project_id),
+                         cloudx.LABEL_LAUNCH: "seed"},
+                 environment={"PASSWORD": "bench"}, volume=f"cloudx_data_u{owner_id}_p{project_id}")
+    cloudx.start_worker_services()              # what app/gunicorn.conf.py's post_worker_init does
+    return cloudx.app
+
+
+# ── Database ───────────────────────────────────────────────────────────────────
+
+def prepare_database(dbname: str, users: int, projects: int, activities: int) -> dict:
+    """Drop and recreate *dbname*, migrate it and seed it. Returns {username: [project ids]}."""
+    from monitor import DB_CONFIG
+    from migrations import migrate
+    from werkzeug.security import generate_password_hash
+
+    if "bench" not in dbname:
+        raise SystemExit(f"refusing to drop {dbname!r}: the benchmark database name must contain 'bench'")
+    with psycopg.connect(**{**DB_CONFIG, "dbname": "postgres"}, autocommit=True) as admin:
+        admin.execute(f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+        admin.execute(f'CREATE DATABASE "{dbname}"')
+
+    with psycopg.connect(**{**DB_CONFIG, "dbname": dbname}, autocommit=True) as conn:
+        migrate(conn)
+        with conn.transaction():
+            conn.execute(
+                """INSERT INTO users (username, email, password_hash)
+                   SELECT 'bench' || g, 'bench' || g || '@example.com', %s
+                   FROM generate_series(1, %s) g""",
+                (generate_password_hash(PASSWORD), users))
+            conn.execute(
+                """INSERT INTO projects (name, description, repository_url, owner_id)
+                   SELECT 'service-' || u.id || '-' || g, 'Seeded project',
+                          'https://example.com/demo.git', u.id
+                   FROM users u, generate_series(1, %s) g""",
+                (projects,))
+            conn.execute(
+                """INSERT INTO deployments (project_id, environment, status, version,
+                                            commit_hash, deployed_by, duration_ms, deployed_at)
+                   SELECT p.id, (ARRAY['dev','staging','prod'])[1 + g % 3],
+                          (ARRAY['active','success','failed'])[1 + g % 3], '1.0.' || g,
+                          md5(p.id || '-' || g), 'bench', 1000 + g * 37,
+                          NOW() - g * INTERVAL '1 hour'
+                   FROM projects p, generate_series(1, 5) g""")
+            conn.execute(
+                """INSERT INTO activity_logs (user_id, action, details, ip_address, severity, created_at)
+                   SELECT u.id, (ARRAY['login','project_created','file_write','page_view'])[1 + g %% 4],
+                          'Seeded event ' || g, '10.0.0.' || (g %% 250),
+                          CASE WHEN g %% 20 = 0 THEN 'warning' ELSE 'info' END,
+                          NOW() - g * INTERVAL '37 seconds'
+                   FROM users u, generate_series(1, %s) g""",
+                (activities,))
+            conn.execute(
+                """INSERT INTO system_metrics (metric_name, metric_value, unit, recorded_at)
+                   SELECT 'host.cpu.percent', random() * 100, 'percent', NOW() - g * INTERVAL '15 seconds'
+                   FROM generate_series(1, 240) g""")
+        rows = conn.execute(
+            "SELECT u.username, p.id FROM users u JOIN projects p ON p.owner_id = u.id ORDER BY p.id"
+        ).fetchall()
+    seeded: dict = {}
+    for username, project_id in rows:
+        seeded.setdefault(username, []).append(project_id)
+    return seeded
+
+
+# ── Measurement ────────────────────────────────────────────────────────────────
+
+def _percentile(samples: list, p: float) -> float:
+    """Nearest-rank percentile of sorted *samples*."""
+    return samples[max(0, min(len(samples) - 1, int(round(p / 100 * len(samples))) - 1))]
+
+
+class Recorder:
+    """Latency samples (ms) and error counts per operation, for one scenario."""
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._samples: dict = {}
+        self._errors: dict  = {}
+        self.started  = time.perf_counter()
+        self.elapsed  = None
+        self.extra: dict    = {}
+
+    def record(self, name: str, ms: float, ok: bool = True):
+        with self._lock:
+            self._samples.setdefault(name, []).append(ms)
+            if not ok:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def timed(self, name: str, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            self.record(name, (time.perf_counter() - start) * 1000, ok=False)
+            return None
+        ok = not isinstance(result, requests.Response) or result.status_code < 400
+        self.record(name, (time.perf_counter() - start) * 1000, ok=ok)
+        return result
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def results(self) -> dict:
+        elapsed = self.elapsed or (time.perf_counter() - self.started)
+        out = {}
+        with self._lock:
+            for name, samples in self._samples.items():
+                samples = sorted(samples)
+                out[name] = {
+                    "count":  len(samples),
+                    "errors": self._errors.get(name, 0),
+                    "rps":    round(len(samples) / elapsed, 1),
+                    "p50":    round(_percentile(samples, 50), 2),
+                    "p95":    round(_percentile(samples, 95), 2),
+                    "p99":    round(_percentile(samples, 99), 2),
+                }
+        out.update(self.extra)
+        return out
+
+
+# ── Clients ────────────────────────────────────────────────────────────────────
+
+class User:
+    def __init__(self, base_url: str, username: str, project_ids: list):
+        self.base_url    = base_url
+        self.username    = username
+        self.project_ids = project_ids
+        self.http        = requests.Session()
+        self.containers: list = []
+
+    def login(self):
+        r = self.http.post(f"{self.base_url}/api/login",
+                           json={"username": self.username, "password": PASSWORD}, timeout=30)
+        r.raise_for_status()
+        listing = self.http.get(f"{self.base_url}/api/containers", timeout=30).json()
+        self.containers = [c["id"] for c in listing.get("containers", [])]
+
+    def get(self, path):
+        return self.http.get(self.base_url + path, timeout=30)
+
+    def post(self, path, payload):
+        return self.http.post(self.base_url + path, json=payload, timeout=60)
+
+    def cookie_header(self) -> str:
+        return "; ".join(f"{k}={v}" for k, v in self.http.cookies.items())
+
+
+def _closed_loop(users: list, duration: float, step):
+    """Run step(user, rng) back to back on one thread per user for *duration* seconds."""
+    deadline = time.monotonic() + duration
+
+    def run(i_user):
+        i, user = i_user
+        rng = random.Random(i)
+        while time.monotonic() < deadline:
+            step(user, rng)
+
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        list(pool.map(run, enumerate(users)))
+
+
+# ── Scenarios ──────────────────────────────────────────────────────────────────
+
+def scenario_dashboard(users, args) -> dict:
+    rec = Recorder()
+
+    def step(user, rng):
+        path = rng.choice(POLLED)
+        rec.timed("GET " + path.split("?")[0], lambda: user.get(path))
+
+    _closed_loop(users, args.duration, step)
+    rec.finish()
+    return rec.results()
+
+
+def scenario_files(users, args) -> dict:
+    rec = Recorder()
+    body = ("def handler(event):\n    return {'ok': True}\n" * 64)[:2048]
+
+    def step(user, rng):
+        project_id = rng.choice(user.project_ids)
+        path = f"src/module_{rng.randint(0, 9)}.py"
+        rec.timed("POST /api/workspace/files",
+                  lambda: user.post(f"/api/workspace/{project_id}/files", {"path": path, "content": body}))
+        rec.timed("GET /api/workspace/files",
+                  lambda: user.get(f"/api/workspace/{project_id}/files?path={path}"))
+
+    _closed_loop(users, args.duration, step)
+    rec.finish()
+    return rec.results()
+
+
+def scenario_launch(users, args) -> dict:
+    rec = Recorder()
+
+    def step(user, rng):
+        project_id = rng.choice(user.project_ids)
+        r = rec.timed("POST /api/projects/launch", lambda: user.post(f"/api/projects/{project_id}/launch", {}))
+        if r is None or r.status_code >= 400:
+            time.sleep(0.1)
+            return
+        listing = user.get("/api/containers").json().get("containers", [])
+        for c in listing:
+            if c["id"] not in user.containers:
+                rec.timed("POST /api/containers/action",
+                          lambda: user.post(f"/api/containers/{c['id']}/action", {"action": "delete"}))
+
+    _closed_loop(users, args.duration, step)
+    rec.finish()
+    return rec.results()
+
+
+def scenario_terminals(users, args) -> dict:
+    """
+    Each client opens a terminal and types a marker every --type-interval
+    seconds; the time until the marker comes back in terminal_output is the
+    keystroke-to-echo latency, measured while the shell also streams output.
+    """
+    rec = Recorder()
+    received = [0]
+    lock = threading.Lock()
+
+    class Client:
+        def __init__(self, user, container_id):
+            self.user, self.container_id = user, container_id
+            self.sio = socketio.Client(reconnection=False)
+            self.pending: dict = {}             # marker → send time
+            self.joined = threading.Event()
+            self.sio.on("terminal_output", self.on_output)
+
+        def on_output(self, data):
+            self.joined.set()
+            text, nbytes = data.get("output", ""), data.get("bytes", 0)
+            if nbytes:
+                self.sio.emit("terminal_ack", {"bytes": nbytes})
+            with lock:
+                received[0] += nbytes
+            now = time.perf_counter()
+            for marker in [m for m in self.pending if m in text]:
+                rec.record("socket terminal_input → echo", (now - self.pending.pop(marker)) * 1000)
+
+    clients = []
+    for i in range(args.terminals):
+        user = users[i % len(users)]
+        if user.containers:
+            clients.append(Client(user, user.containers[(i // len(users)) % len(user.containers)]))
+
+    def connect(c):
+        rec.timed("socket connect", lambda: c.sio.connect(
+            users[0].base_url, transports=["websocket"], headers={"Cookie": c.user.cookie_header()},
+            wait_timeout=30))
+        start = time.perf_counter()
+        c.sio.emit("terminal_join", {"container_id": c.container_id, "encoding": "text"})
+        ok = c.joined.wait(10)
+        rec.record("socket terminal_join → output", (time.perf_counter() - start) * 1000, ok=ok)
+
+    with ThreadPoolExecutor(max_workers=min(64, len(clients) or 1)) as pool:
+        list(pool.map(connect, clients))
+
+    with lock:
+        received[0] = 0
+    start, deadline = time.perf_counter(), time.monotonic() + args.duration
+
+    def type_loop(c):
+        while time.monotonic() < deadline:
+            marker = uuid.uuid4().hex[:10]
+            c.pending[marker] = time.perf_counter()
+            c.sio.emit("terminal_input", {"input": f"echo {marker}\r"})
+            time.sleep(args.type_interval)
+        time.sleep(1.0)                                 # grace for the last echoes
+        now = time.perf_counter()
+        for marker, sent in list(c.pending.items()):
+            rec.record("socket terminal_input → echo", (now - sent) * 1000, ok=False)
+
+    with ThreadPoolExecutor(max_workers=len(clients) or 1) as pool:
+        list(pool.map(type_loop, clients))
+    elapsed = time.perf_counter() - start
+    for c in clients:
+        c.sio.disconnect()
+    rec.finish()
+    results = rec.results()
+    results["terminal output"] = {"clients": len(clients),
+                                  "kb_per_s": round(received[0] / 1024 / elapsed, 1)}
+    return results
+
+
+def scenario_monitor(args) -> dict:
+    """
+    SystemMonitor's container sweep (one stats call per container) and the
+    metrics insert, in this process against its own fake daemon. Host
+    metrics are left out: psutil spends a fixed second sampling CPU.
+    """
+    import dockerclient
+    import monitor
+
+    fake = FakeDockerClient(stats_latency=args.stats_latency)
+    for i in range(args.monitor_containers):
+        fake.add(f"cloudx-project-{i // 3 + 1}-{i:04x}")
+    dockerclient._client = fake
+
+    rec = Recorder()
+    for _ in range(args.monitor_ticks):
+        rows = rec.timed("monitor container sweep", monitor._collect_container_metrics) or []
+        rec.timed("monitor summarise", lambda: monitor._summarise(rows))
+        rec.timed("monitor metrics insert", lambda: monitor._bulk_insert(rows))
+    rec.finish()
+    results = rec.results()
+    results["monitor tick"] = {"containers": args.monitor_containers, "metrics": len(rows),
+                               "stats_latency_ms": args.stats_latency * 1000}
+    return results
+
+
+# ── Driver ─────────────────────────────────────────────────────────────────────
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int, args):
+    env = dict(os.environ, PYTHONPATH=APP_DIR, **SERVER_ENV,
+               BENCH_DOCKER_LATENCY=str(args.docker_latency),
+               BENCH_RUN_LATENCY=str(args.run_latency),
+               BENCH_OUTPUT_RATE=str(args.output_rate))
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--worker-class", "eventlet", "-w", "1",
+         "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "bench_suite:create_app()"],
+        cwd=BENCH_DIR,                                  # not app/: skip its gunicorn.conf.py
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and proc.poll() is None:
+        try:
+            requests.get(f"{url}/health", timeout=5)
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.terminate()
+    log.seek(0)
+    raise RuntimeError("gunicorn did not start:\n" + log.read().decode(errors="replace")[-3000:])
+
+
+def compare(results: dict, baseline: dict, tolerance: float, floor_ms: float = 1.0) -> list:
+    """Operations whose p95 grew, or whose throughput fell, by more than *tolerance*."""
+    regressions = []
+    for scenario, ops in results.items():
+        for name, now in ops.items():
+            before = baseline.get(scenario, {}).get(name)
+            if not before or "p95" not in now or "p95" not in before:
+                continue
+            if now["p95"] > before["p95"] * (1 + tolerance) and now["p95"] - before["p95"] > floor_ms:
+                regressions.append(f"{scenario}: {name} p95 {before['p95']} → {now['p95']} ms")
+            if scenario != "monitor" and now["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(f"{scenario}: {name} throughput {before['rps']} → {now['rps']}/s")
+            if now["errors"] > before["errors"]:
+                regressions.append(f"{scenario}: {name} errors {before['errors']} → {now['errors']}")
+    return regressions
+
+
+def _print(scenario: str, results: dict, baseline: dict):
+    print(f"\n{scenario}")
+    print(f"  {'operation':<34} {'count':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'p95 vs base':>11}")
+    for name, r in results.items():
+        if "p95" not in r:
+            print(f"  {name:<34} " + ", ".join(f"{k}={v}" for k, v in r.items()))
+            continue
+        before = baseline.get(scenario, {}).get(name, {}).get("p95")
+        delta = f"{(r['p95'] / before - 1) * 100:+.0f}%" if before else ""
+        print(f"  {name:<34} {r['count']:>6} {r['errors']:>4} {r['rps']:>8.1f} {r['p50']:>8.1f} "
+              f"{r['p95']:>8.1f} {r['p99']:>8.1f} {delta:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--db", default="cloudx_bench", help="scratch database, dropped and recreated")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--projects", type=int, default=3, help="projects (and workspaces) per user")
+    parser.add_argument("--activities", type=int, default=2000, help="activity rows per user")
+    parser.add_argument("--terminals", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--output-rate", type=int, default=16384, help="terminal output, bytes/s each")
+    parser.add_argument("--type-interval", type=float, default=0.2, help="seconds between keystrokes")
+    parser.add_argument("--docker-latency", type=float, default=0.002, help="seconds per Docker API call")
+    parser.add_argument("--run-latency", type=float, default=0.05, help="seconds per containers.run()")
+    parser.add_argument("--monitor-containers", type=int, default=300)
+    parser.add_argument("--monitor-ticks", type=int, default=3)
+    parser.add_argument("--stats-latency", type=float, default=0.01,
+                        help="seconds per stats(stream=False); a real daemon takes ~1")
+    parser.add_argument("--save", metavar="NAME", help="store the results as a baseline")
+    parser.add_argument("--baseline", metavar="NAME", help="compare against a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    baseline = {}
+    if args.baseline:
+        with open(os.path.join(BASELINE_DIR, f"{args.baseline}.json")) as f:
+            baseline = json.load(f)["results"]
+
+    os.environ["POSTGRES_DB"] = args.db          # before monitor.DB_CONFIG is read, here and in gunicorn
+    seeded = prepare_database(args.db, args.users, args.projects, args.activities)
+    print(f"seeded {args.db}: {args.users} users × {args.projects} projects, "
+          f"{args.activities} activities each")
+
+    results = {}
+    server_scenarios = [s for s in scenarios if s != "monitor"]
+    if server_scenarios:
+        proc, url = _start_server(_free_port(), args)
+        try:
+            users = [User(url, name, pids) for name, pids in seeded.items()]
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                list(pool.map(User.login, users))
+            for scenario in server_scenarios:
+                results[scenario] = globals()[f"scenario_{scenario}"](users, args)
+                _print(scenario, results[scenario], baseline)
+        finally:
+            proc.send_signal(signal.SIGINT)             # quick shutdown: don't drain open terminals
+            proc.wait(timeout=30)
+    if "monitor" in scenarios:
+        results["monitor"] = scenario_monitor(args)
+        _print("monitor", results["monitor"], baseline)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        settings = {k: v for k, v in vars(args).items() if k not in ("save", "baseline", "tolerance")}
+        with open(path, "w") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nbaseline written to {os.path.relpath(path)}")
+
+    if args.baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"\n{len(regressions)} regression(s) against {args.baseline} "
+              f"(tolerance {args.tolerance:.0%})")
+        for line in regressions:
+            print("  " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+In-process stand-in for the Docker SDK client, for benchmarks.
+
+Covers the surface the app uses: containers.list/get/run, container
+lifecycle calls, stats(stream=False), logs(), exec_run() against an
+in-memory /workspace, put_archive/get_archive, and the low-level
+api.exec_create/exec_start(socket=True)/exec_inspect pair that terminals
+and file saves go through. Exec sockets are real socketpairs, so the
+terminal reader's select()/recv() path runs unchanged.
+
+Each call can be given a simulated daemon latency (``latency`` for API
+calls, ``stats_latency`` for stats(stream=False), which takes about a
+second on a real daemon).
+"""
+import io
+import time
+import socket
+import random
+import tarfile
+import secrets
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from docker.errors import NotFound
+
+ExecResult = namedtuple("ExecResult", "exit_code,output")     # as in docker.models.containers
+
+WORKSPACE = "/workspace"
+SAMPLE_FILES = {
+    "main.py":          "import app\n\n\ndef main():\n    app.run()\n\n\nif __name__ == '__main__':\n    main()\n",
+    "app/__init__.py":  "from .server import run\n",
+    "app/server.py":    "def run(port=8000):\n    print('listening on', port)\n" * 20,
+    "README.md":        "# Demo project\n\nA seeded workspace for benchmarks.\n",
+}
+
+
+class _Image:
+    def __init__(self, tag):
+        self.tags = [tag]
+
+
+class _Stats:
+    """Docker stats snapshots with CPU / memory doing a seeded random walk."""
+
+    def __init__(self, seed):
+        self._rng   = random.Random(seed)
+        self._cpu   = 0
+        self._sys   = 0
+        self._mem   = self._rng.randint(64, 256) * 1024 ** 2
+        self._net   = 0
+
+    def snapshot(self, mem_limit):
+        pre_cpu, pre_sys = self._cpu, self._sys
+        self._sys += 4_000_000_000
+        self._cpu += int(self._rng.uniform(0.0, 0.6) * 4_000_000_000 / 4)
+        self._mem = max(32 * 1024 ** 2, min(mem_limit, self._mem + self._rng.randint(-8, 8) * 1024 ** 2))
+        self._net += self._rng.randint(0, 200_000)
+        return {
+            "cpu_stats":    {"cpu_usage": {"total_usage": self._cpu, "percpu_usage": [0] * 4},
+                             "system_cpu_usage": self._sys},
+            "precpu_stats": {"cpu_usage": {"total_usage": pre_cpu}, "system_cpu_usage": pre_sys},
+            "memory_stats": {"usage": self._mem, "limit": mem_limit, "stats": {"cache": self._mem // 10}},
+            "blkio_stats":  {"io_service_bytes_recursive": [{"op": "Read", "value": 4096},
+                                                            {"op": "Write", "value": 8192}]},
+            "networks":     {"eth0": {"rx_bytes": self._net, "tx_bytes": self._net // 3}},
+        }
+
+
+class FakeContainer:
+    def __init__(self, client, name, labels=None, image="cloudx-workspace:latest",
+                 environment=None, volume=None, mem_limit=512 * 1024 ** 2, status="running"):
+        self.client   = client
+        self.id       = secrets.token_hex(32)
+        self.short_id = self.id[:12]
+        self.name     = name
+        self.labels   = dict(labels or {})
+        self.image    = _Image(image)
+        self.status   = status
+        self.ports    = {"8080/tcp": [{"HostIp": "0.0.0.0", "HostPort": str(20000 + len(client._containers))}]}
+        self.attrs    = {
+            "Created": datetime.now(timezone.utc).isoformat(),
+            "Config":  {"Env": [f"{k}={v}" for k, v in (environment or {}).items()]},
+        }
+        self.files    = client._volume(volume) if volume else {}
+        self._mem_limit = mem_limit
+        self._stats   = _Stats(self.id)
+        self._log     = []                  # (ns, line)
+
+    # ── Lifecycle ──────────────────────────────────────────────────────────────
+
+    def reload(self):
+        self.client._call()
+
+    def start(self):
+        self.client._call()
+        self.status = "running"
+
+    def stop(self, timeout=None):
+        self.client._call()
+        self.status = "exited"
+
+    def restart(self, timeout=None):
+        self.client._call()
+        self.status = "running"
+
+    def pause(self):
+        self.client._call()
+        self.status = "paused"
+
+    def unpause(self):
+        self.client._call()
+        self.status = "running"
+
+    def remove(self, force=False):
+        self.client._call()
+        self.client._remove(self)
+
+    # ── Stats and logs ─────────────────────────────────────────────────────────
+
+    def stats(self, stream=True, decode=None):
+        self.client._call(self.client.stats_latency)
+        return self._stats.snapshot(self._mem_limit)
+
+    def log(self, line: str):
+        self._log.append((time.time_ns(), line))
+
+    def logs(self, stream=False, follow=False, timestamps=False, tail="all", since=None, until=None):
+        self.client._call()
+
+        def render(entries):
+            out = []
+            for ns, line in entries:
+                stamp = datetime.fromtimestamp(ns / 1e9, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f000Z")
+                out.append(f"{stamp} {line}\n" if timestamps else f"{line}\n")
+            return "".join(out).encode()
+
+        entries = [(ns, l) for ns, l in self._log
+                   if (since is None or ns > since * 1e9) and (until is None or ns <= until * 1e9)]
+        if tail != "all":
+            entries = entries[-int(tail):] if int(tail) else []
+        if not stream:
+            return render(entries)
+
+        def generate():
+            seen = len(self._log)
+            yield render(entries)
+            while follow and self.status != "removed":
+                time.sleep(0.1)
+                if len(self._log) > seen:
+                    yield render(self._log[seen:])
+                    seen = len(self._log)
+        return generate()
+
+    # ── Exec and archives ──────────────────────────────────────────────────────
+
+    def exec_run(self, cmd, stdin=False, socket=False, demux=False, workdir=None, **kwargs):
+        self.client._call()
+        return self._shell(cmd)
+
+    def put_archive(self, path, data):
+        self.client._call()
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            for member in archive:
+                if member.isfile():
+                    rel = _relative(f"{path.rstrip('/')}/{member.name}")
+                    self.files[rel] = archive.extractfile(member).read().decode("utf-8", "replace")
+        return True
+
+    def get_archive(self, path):
+        self.client._call()
+        rel = _relative(path)
+        paths = [p for p in self.files if p == rel or not rel or p.startswith(rel + "/")]
+        if not paths:
+            raise NotFound(f"Could not find the file {path} in container {self.name}")
+        data = _tar(self.files, paths)
+        return iter([data]), {"name": rel.rsplit("/", 1)[-1] or "workspace", "size": len(data)}
+
+    def _shell(self, cmd) -> ExecResult:
+        """Just enough of the commands the app runs in workspaces."""
+        argv = cmd.split() if isinstance(cmd, str) else list(cmd)
+        script, args = "", []
+        if argv[:2] == ["sh", "-c"]:
+            script, args = argv[2], argv[4:]            # argv[3] is $0
+        elif argv and argv[0] == "sh":
+            script = " ".join(argv[1:])
+
+        if argv and argv[0] == "cat":
+            rel = _relative(argv[1])
+            if rel in self.files:
+                return ExecResult(0, self.files[rel].encode())
+            return ExecResult(1, f"cat: {argv[1]}: No such file or directory\n".encode())
+        if script.startswith("git clone"):
+            self.files.update(SAMPLE_FILES)
+            return ExecResult(0, b"Cloning into '/workspace'...\n")
+        if "ls -A /workspace" in script:
+            return ExecResult(0 if not self.files else 1, b"")
+        if "find ." in script:
+            now = time.time()
+            listing = "".join(f"{p}\t{len(t)}\t{now:.1f}\n" for p, t in self.files.items())
+            return ExecResult(0, listing.encode())
+        if "tar -cf" in script:
+            return ExecResult(0, _tar(self.files, [p for p in args if p in self.files]))
+        return ExecResult(0, b"")
+
+
+def _relative(path: str) -> str:
+    if path.startswith(WORKSPACE):
+        path = path[len(WORKSPACE):]
+    return path.strip("/")
+
+
+def _tar(files: dict, paths) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as archive:
+        for path in paths:
+            data = files[path].encode()
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+# ── Exec sessions ──────────────────────────────────────────────────────────────
+
+class _Exec:
+    def __init__(self, container, cmd, tty):
+        self.container = container
+        self.cmd       = cmd if isinstance(cmd, list) else cmd.split()
+        self.tty       = tty
+        self.exit_code = None
+        self.done      = threading.Event()
+
+
+class _ExecAPI:
+    """The low-level client.api calls used for interactive and streaming execs."""
+
+    def __init__(self, client):
+        self._client = client
+        self._execs: dict = {}
+
+    def exec_create(self, container, cmd, stdin=False, tty=False, stdout=True, stderr=True, **kwargs):
+        self._client._call()
+        exec_id = secrets.token_hex(16)
+        self._execs[exec_id] = _Exec(self._client.containers.get(container), cmd, tty)
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id, detach=False, tty=False, socket=False, **kwargs):
+        self._client._call()
+        ours, theirs = _socketpair()
+        ex = self._execs[exec_id]
+        target = self._tee if ex.cmd and ex.cmd[0] == "tee" else self._terminal
+        threading.Thread(target=target, args=(ex, ours), daemon=True).start()
+        return theirs
+
+    def exec_inspect(self, exec_id):
+        self._client._call()
+        ex = self._execs[exec_id]
+        ex.done.wait(5.0)
+        return {"ID": exec_id, "Running": not ex.done.is_set(), "ExitCode": ex.exit_code}
+
+    def ping(self):
+        self._client._call()
+        return True
+
+    def _tee(self, ex, sock):
+        chunks = []
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            ex.container.files[_relative(ex.cmd[1])] = b"".join(chunks).decode("utf-8", "replace")
+            ex.exit_code = 0
+        except OSError:
+            ex.exit_code = 1
+        finally:
+            sock.close()
+            ex.done.set()
+
+    def _terminal(self, ex, sock):
+        """
+        A bash stand-in: echoes input like a tty and, with output_rate set,
+        streams log-like lines (a build or `tail -f`) at that many bytes/s.
+        """
+        rate, line = self._client.output_rate, b"[build] compiling module %06d ... ok\r\n"
+        sock.settimeout(0.05)
+        sent, start, n = 0, time.monotonic(), 0
+        try:
+            sock.sendall(b"root@workspace:/workspace# ")
+            while ex.container.status != "removed":
+                try:
+                    data = sock.recv(4096)
+                    if not data:
+                        break
+                    sock.sendall(data.replace(b"\r", b"\r\n"))
+                except socket.timeout:
+                    pass
+                if rate:
+                    due = int((time.monotonic() - start) * rate)
+                    while sent < due:
+                        chunk = line % (n % 1_000_000)
+                        sock.sendall(chunk)
+                        sent, n = sent + len(chunk), n + 1
+        except OSError:
+            pass
+        finally:
+            ex.exit_code = 0
+            sock.close()
+            ex.done.set()
+
+
+def _socketpair():
+    try:
+        return socket.socketpair()
+    except OSError:                                     # no AF_UNIX (Windows)
+        return socket.socketpair(socket.AF_INET)
+
+
+# ── Client ─────────────────────────────────────────────────────────────────────
+
+class _Containers:
+    def __init__(self, client):
+        self._client = client
+
+    def list(self, all=False, filters=None):
+        self._client._call()
+        found = []
+        for c in list(self._client._containers.values()):
+            if not all and c.status != "running" and not (filters or {}).get("status"):
+                continue
+            if _matches(c, filters or {}):
+                found.append(c)
+        return found
+
+    def get(self, container_id):
+        self._client._call()
+        for c in self._client._containers.values():
+            if container_id in (c.id, c.short_id, c.name) or (
+                    len(container_id) >= 12 and c.id.startswith(container_id)):
+                return c
+        raise NotFound(f"No such container: {container_id}")
+
+    def run(self, image, detach=True, environment=None, name=None, volumes=None, labels=None,
+            mem_limit=None, **kwargs):
+        self._client._call(self._client.run_latency)
+        volume = next(iter(volumes), None) if volumes else None
+        mem = int(mem_limit.rstrip("m")) * 1024 ** 2 if isinstance(mem_limit, str) else 512 * 1024 ** 2
+        return self._client.add(name or f"container-{secrets.token_hex(4)}", labels=labels,
+                                image=image, environment=environment, volume=volume, mem_limit=mem)
+
+
+def _matches(container, filters) -> bool:
+    for key, wanted in filters.items():
+        values = wanted if isinstance(wanted, (list, tuple)) else [wanted]
+        if key == "label":
+            if not all(_label_matches(container.labels, v) for v in values):
+                return False
+        elif key == "name":
+            if not any(v in container.name for v in values):
+                return False
+        elif key == "status":
+            if container.status not in values:
+                return False
+    return True
+
+
+def _label_matches(labels, spec) -> bool:
+    key, eq, value = spec.partition("=")
+    return key in labels and (not eq or labels[key] == value)
+
+
+class FakeDockerClient:
+    """
+    Drop-in for docker.DockerClient. ``latency`` is added to every API call,
+    ``stats_latency`` to stats(stream=False), ``run_latency`` to
+    containers.run(); ``output_rate`` is how many bytes/s each terminal
+    streams on its own besides echoing input.
+    """
+
+    def __init__(self, latency: float = 0.0, stats_latency: float = 0.0,
+                 run_latency: float = 0.0, output_rate: int = 0):
+        self.latency       = latency
+        self.stats_latency = stats_latency
+        self.run_latency   = run_latency
+        self.output_rate   = output_rate
+        self._containers: dict = {}
+        self._volumes: dict    = {}
+        self._lock       = threading.Lock()
+        self.calls       = 0
+        self.containers  = _Containers(self)
+        self.api         = _ExecAPI(self)
+
+    def ping(self):
+        return self.api.ping()
+
+    def add(self, name, status="running", **kwargs) -> FakeContainer:
+        container = FakeContainer(self, name, status=status, **kwargs)
+        with self._lock:
+            self._containers[container.id] = container
+        return container
+
+    def _volume(self, name) -> dict:
+        with self._lock:
+            return self._volumes.setdefault(name, dict(SAMPLE_FILES))
+
+    def _remove(self, container):
+        with self._lock:
+            self._containers.pop(container.id, None)
+        container.status = "removed"
+
+    def _call(self, delay: float | None = None):
+        with self._lock:
+            self.calls += 1
+        delay = self.latency if delay is None else delay
+        if delay:
+            time.sleep(delay)
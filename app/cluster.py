@@ -0,0 +1,426 @@
+import os
+import json
+import time
+import queue
+import pickle
+import socket
+import secrets
+import logging
+import threading
+
+import socketio
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+MESSAGE_QUEUE      = os.getenv("SOCKETIO_MESSAGE_QUEUE",     "")    # redis://… | local | "" (one worker)
+SOCKETIO_CHANNEL   = os.getenv("SOCKETIO_CHANNEL",           "cloudx-socketio")
+HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", 10))   # seconds; 3 missed → dead
+
+try:
+    import redis as _redis
+    _REDIS_AVAILABLE = True
+except ImportError:
+    _redis = None
+    _REDIS_AVAILABLE = False
+
+
+def worker_id() -> str:
+    """host:pid – computed per call so a worker forked after import gets its own."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ── Pub/sub channels ───────────────────────────────────────────────────────────
+
+class LocalChannels:
+    """
+    In-process pub/sub with the same shape as Redis: every subscriber to a
+    channel gets every message published on it, including the publisher.
+    The stand-in for the message queue in tests and single-process runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict = {}        # channel → [queue.Queue]
+
+    def publish(self, channel: str, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for q in subscribers:
+            q.put(message)
+
+    def subscribe(self, channel: str) -> queue.Queue:
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(q)
+        return q
+
+    def unsubscribe(self, channel: str, q: queue.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, [])
+            if q in subscribers:
+                subscribers.remove(q)
+
+    def listen(self, channel: str, stopped):
+        q = self.subscribe(channel)
+        try:
+            while not stopped():
+                try:
+                    yield q.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+        finally:
+            self.unsubscribe(channel, q)
+
+
+class RedisChannels:
+    """Redis pub/sub behind the LocalChannels interface."""
+
+    def __init__(self, url: str):
+        self._client = _redis.Redis.from_url(url, socket_connect_timeout=2, decode_responses=True)
+
+    def publish(self, channel: str, message):
+        self._client.publish(channel, message)
+
+    def listen(self, channel: str, stopped):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        try:
+            while not stopped():
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    yield message["data"]
+        finally:
+            pubsub.close()
+
+
+local_channels = LocalChannels()
+
+
+def channels_for(url: str):
+    """LocalChannels for "local", RedisChannels for a redis:// URL, None when unset."""
+    if not url:
+        return None
+    if url == "local":
+        return local_channels
+    if not _REDIS_AVAILABLE:
+        raise RuntimeError("redis is not installed – cannot use message queue %s" % url)
+    return RedisChannels(url)
+
+
+# ── Socket.IO message queue ────────────────────────────────────────────────────
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    Socket.IO client manager over LocalChannels: servers in one process
+    share rooms and emits exactly as they would over Redis. Used for tests
+    and for SOCKETIO_MESSAGE_QUEUE=local.
+    """
+    name = "local"
+
+    def __init__(self, channel: str = SOCKETIO_CHANNEL, write_only: bool = False,
+                 logger=None, channels: LocalChannels = local_channels):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._channels = channels
+        self._queue = None if write_only else channels.subscribe(channel)
+
+    def _publish(self, data):
+        self._channels.publish(self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+
+def socketio_options(url: str = MESSAGE_QUEUE, channel: str = SOCKETIO_CHANNEL) -> dict:
+    """
+    Extra SocketIO() arguments so emits and rooms span every worker: a Redis
+    message queue, the in-process stand-in, or nothing for a single worker.
+    """
+    if not url:
+        return {}
+    if url == "local":
+        return {"client_manager": LocalPubSubManager(channel=channel)}
+    return {"message_queue": url, "channel": channel}
+
+
+# ── Worker bus ─────────────────────────────────────────────────────────────────
+
+class WorkerBus:
+    """
+    Directed messages between workers, for handing work to the worker that
+    owns a resource nobody else can reach (a terminal's exec socket).
+
+    Each worker listens on its own channel of the message queue and keeps a
+    ``worker:<id>`` heartbeat in the shared store, so senders can tell a
+    live owner from one that went away. Handlers registered with on() run
+    on the listener task as ``handler(payload, sender)``. Without a message
+    queue the bus is disabled and everything stays local.
+    """
+
+    def __init__(self, url: str = MESSAGE_QUEUE, store=None, spawn=None, sleep=time.sleep,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL, channel: str = SOCKETIO_CHANNEL,
+                 worker: str | None = None):
+        self.enabled   = bool(url)
+        self._worker   = worker
+        self._url      = url
+        self._store    = store
+        self._spawn    = spawn or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self._sleep    = sleep
+        self._interval = heartbeat_interval
+        self.ttl       = heartbeat_interval * 3
+        self._prefix   = f"{channel}:worker:"
+        self._channels = None
+        self._handlers: dict = {}
+        self._hooks: list    = []
+        self._lock     = threading.Lock()
+        self._started  = False
+        self._stopping = False
+        self._counters = {"sent": 0, "received": 0, "errors": 0, "heartbeats": 0}
+        self._last_beat = None
+
+    @property
+    def worker(self) -> str:
+        return self._worker or worker_id()
+
+    def on(self, kind: str, handler):
+        self._handlers[kind] = handler
+
+    def on_heartbeat(self, hook):
+        """Run *hook* every heartbeat – for refreshing this worker's claims in the store."""
+        self._hooks.append(hook)
+
+    def start(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._channels = channels_for(self._url)
+        self._beat()
+        self._spawn(self._listen_loop)
+        self._spawn(self._heartbeat_loop)
+        logger.info("cluster: worker %s on %s", self.worker, self._url.split("@")[-1])
+
+    def stop(self):
+        self._stopping = True
+        if self.enabled and self._store is not None:
+            self._store.delete(f"worker:{self.worker}")
+
+    def send(self, worker: str, kind: str, payload: dict) -> bool:
+        if self._channels is None:
+            return False
+        message = json.dumps({"kind": kind, "from": self.worker, "payload": payload})
+        try:
+            self._channels.publish(self._prefix + worker, message)
+        except Exception as exc:
+            self._count("errors")
+            logger.warning("cluster: send %s to %s failed – %s", kind, worker, exc)
+            return False
+        self._count("sent")
+        return True
+
+    def alive(self, worker: str) -> bool:
+        if worker == self.worker:
+            return True
+        return self._store is not None and self._store.get(f"worker:{worker}") is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            last_beat = self._last_beat
+        counters["heartbeat_ago_s"] = round(time.monotonic() - last_beat, 1) if last_beat else None
+        return {"worker": self.worker, "enabled": self.enabled, **counters}
+
+    # ── Internal ───────────────────────────────────────────────────────────────
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _beat(self):
+        if self._store is not None:
+            self._store.set(f"worker:{self.worker}", str(time.time()), ttl=self.ttl)
+        with self._lock:
+            self._counters["heartbeats"] += 1
+            self._last_beat = time.monotonic()
+        for hook in self._hooks:
+            try:
+                hook()
+            except Exception as exc:
+                logger.error("cluster: heartbeat hook error: %s", exc, exc_info=True)
+
+    def _heartbeat_loop(self):
+        while not self._stopping:
+            self._sleep(self._interval)
+            self._beat()
+
+    def _listen_loop(self):
+        channel = self._prefix + self.worker
+        while not self._stopping:
+            try:
+                for raw in self._channels.listen(channel, lambda: self._stopping):
+                    self._dispatch(raw)
+            except Exception as exc:
+                self._count("errors")
+                logger.error("cluster: listener error, reconnecting – %s", exc)
+                self._sleep(1.0)
+
+    def _dispatch(self, raw):
+        try:
+            message = json.loads(raw)
+            handler = self._handlers.get(message["kind"])
+        except (TypeError, ValueError, KeyError):
+            self._count("errors")
+            return
+        self._count("received")
+        if handler is None:
+            logger.warning("cluster: no handler for %s", message["kind"])
+            return
+        try:
+            handler(message.get("payload") or {}, message.get("from"))
+        except Exception as exc:
+            self._count("errors")
+            logger.error("cluster: %s handler error: %s", message["kind"], exc, exc_info=True)
+
+
+# ── Shared coordination ────────────────────────────────────────────────────────
+
+class Lease:
+    """
+    A named, expiring lock in the shared store, held by at most one worker.
+    The holder renews it by calling acquire() again within *ttl*; if it dies
+    the lease lapses and another worker picks it up.
+    """
+
+    def __init__(self, store, name: str, ttl: float, holder: str | None = None):
+        self._store  = store
+        self._key    = f"lease:{name}"
+        self._ttl    = ttl
+        self._holder = holder
+        self.held    = False
+
+    def acquire(self) -> bool:
+        me = self._holder or worker_id()
+        if self._store.add(self._key, me, ttl=self._ttl):
+            self.held = True
+        elif self._store.get(self._key) == me:
+            self._store.set(self._key, me, ttl=self._ttl)
+            self.held = True
+        else:
+            self.held = False
+        return self.held
+
+    def release(self):
+        if self._store.get(self._key) == (self._holder or worker_id()):
+            self._store.delete(self._key)
+        self.held = False
+
+
+class SharedSlot:
+    """One slot taken from a SlotPool; refresh() it within the TTL while held, release() when done."""
+
+    __slots__ = ("_store", "_key", "_value", "_ttl")
+
+    def __init__(self, store, key: str, value: str, ttl: float):
+        self._store = store
+        self._key   = key
+        self._value = value
+        self._ttl   = ttl
+
+    def refresh(self):
+        if self._store.get(self._key) == self._value:
+            self._store.set(self._key, self._value, ttl=self._ttl)
+
+    def release(self):
+        if self._store.get(self._key) == self._value:
+            self._store.delete(self._key)
+
+
+class SlotPool:
+    """
+    At most *limit* concurrent holders per key (e.g. one user's terminals),
+    counted across every worker. Each slot is a ``slots:<name>:<key>:<i>``
+    entry taken with add(), like a Lease, so it lapses after *ttl* unless
+    refreshed and a worker that dies gives its slots back.
+    """
+
+    def __init__(self, store, name: str, limit: int, ttl: float):
+        self._store = store
+        self._name  = name
+        self.limit  = limit
+        self.ttl    = ttl
+
+    def _key(self, key, i: int) -> str:
+        return f"slots:{self._name}:{key}:{i}"
+
+    def acquire(self, key) -> SharedSlot | None:
+        """Take a free slot, or None when all *limit* are held."""
+        value = f"{worker_id()}:{secrets.token_hex(4)}"
+        for i in range(self.limit):
+            if self._store.add(self._key(key, i), value, ttl=self.ttl):
+                return SharedSlot(self._store, self._key(key, i), value, self.ttl)
+        return None
+
+    def count(self, key) -> int:
+        return sum(1 for i in range(self.limit) if self._store.get(self._key(key, i)) is not None)
+
+
+class TerminalDirectory:
+    """
+    Which worker holds each (user, container) terminal session. An exec
+    socket can't move between processes, so a terminal_join that lands on
+    another worker is relayed to the owner over the WorkerBus; relayed()
+    remembers, per local sid, where that client's input has to go.
+    """
+
+    def __init__(self, store, bus: WorkerBus):
+        self._store  = store
+        self._bus    = bus
+        self._lock   = threading.Lock()
+        self._relays: dict = {}             # local sid → owning worker
+
+    @staticmethod
+    def _key(user_id, container_id) -> str:
+        return f"terminal:{user_id}:{container_id}"
+
+    def claim(self, user_id, container_id):
+        if self._bus.enabled:
+            self._store.set(self._key(user_id, container_id), self._bus.worker,
+                            ttl=self._bus.ttl)
+
+    def refresh(self, keys):
+        for user_id, container_id in keys:
+            self.claim(user_id, container_id)
+
+    def release(self, user_id, container_id):
+        key = self._key(user_id, container_id)
+        if self._bus.enabled and self._store.get(key) == self._bus.worker:
+            self._store.delete(key)
+
+    def owner(self, user_id, container_id):
+        """The live worker holding this session, when it isn't us; otherwise None."""
+        if not self._bus.enabled:
+            return None
+        worker = self._store.get(self._key(user_id, container_id))
+        if worker and worker != self._bus.worker and self._bus.alive(worker):
+            return worker
+        return None
+
+    def relay(self, sid: str, worker: str):
+        with self._lock:
+            self._relays[sid] = worker
+
+    def relayed(self, sid: str):
+        with self._lock:
+            return self._relays.get(sid)
+
+    def unrelay(self, sid: str):
+        with self._lock:
+            return self._relays.pop(sid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"relayed": len(self._relays)}
@@ -0,0 +1,106 @@
+import os
+import gzip
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+COMPRESS_MIN_BYTES  = int(os.getenv("COMPRESS_MIN_BYTES",   1024))   # smaller bodies go out as-is
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL",  6))
+COMPRESS_BR_QUALITY = int(os.getenv("COMPRESS_BR_QUALITY",  4))      # 4–5: fast enough per request
+COMPRESS_PATHS      = tuple(p for p in os.getenv("COMPRESS_PATHS", "/api/").split(",") if p)
+
+COMPRESSIBLE_TYPES = frozenset({
+    "application/json", "application/x-ndjson", "application/javascript",
+    "text/html", "text/plain", "text/css", "text/csv", "image/svg+xml",
+})
+
+try:
+    import brotli
+    _BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    _BROTLI_AVAILABLE = False
+
+
+# ── Negotiation ────────────────────────────────────────────────────────────────
+
+def choose_encoding(accept_encoding: str, brotli_ok: bool = _BROTLI_AVAILABLE):
+    """
+    Pick "br" or "gzip" from an Accept-Encoding header, or None. Brotli wins
+    when both are acceptable; q=0 rules a coding out, and "*" stands for
+    anything not listed.
+    """
+    q = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        q[coding.strip()] = weight
+
+    def accepted(coding):
+        return q.get(coding, q.get("*", 0.0)) > 0
+
+    if brotli_ok and accepted("br"):
+        return "br"
+    if accepted("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BR_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encoding: str, min_bytes: int = COMPRESS_MIN_BYTES):
+    """
+    Compress a buffered response body in place when the client accepts it
+    and it is worth it: big enough, a text-like type, not already encoded.
+    Streamed responses (SSE, NDJSON tails) and file passthroughs are left
+    alone, they are flushed piece by piece.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)       # same entity, different bytes
+    return response
+
+
+def enable_compression(app, paths=COMPRESS_PATHS):
+    """Compress responses under *paths* (URL prefixes) for clients that accept it."""
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if request.path.startswith(paths):
+            compress_response(response, request.headers.get("Accept-Encoding", ""))
+        return response
+
+    logger.info("compression: %s above %d bytes on %s",
+                "br/gzip" if _BROTLI_AVAILABLE else "gzip", COMPRESS_MIN_BYTES, ",".join(paths))
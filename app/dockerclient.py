@@ -0,0 +1,140 @@
+import os
+import re
+import time
+import logging
+import threading
+
+import requests
+
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+DOCKER_TIMEOUT       = int(os.getenv("DOCKER_TIMEOUT",         30))    # seconds per API call
+DOCKER_POOL_SIZE     = int(os.getenv("DOCKER_POOL_SIZE",       32))    # connections to the socket
+DOCKER_RETRIES       = int(os.getenv("DOCKER_RETRIES",         2))     # extra attempts, reads only
+DOCKER_RETRY_BACKOFF = float(os.getenv("DOCKER_RETRY_BACKOFF", 0.2))   # seconds, doubles per try
+
+RETRY_METHODS  = frozenset({"GET", "HEAD"})
+_ID_PARENTS    = frozenset({"containers", "exec", "images", "volumes", "networks"})
+_COLLECTION_OPS = frozenset({"json", "create", "prune", "load", "search"})
+_VERSION_RE    = re.compile(r"^/v\d+\.\d+")
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def endpoint_name(method: str, url: str, base_url: str = "") -> str:
+    """
+    Collapse a Docker API URL into a low-cardinality name, e.g.
+    ``GET http+docker://localhost/v1.43/containers/ab12/json`` →
+    ``GET /containers/{id}/json``.
+    """
+    path = url[len(base_url):] if base_url and url.startswith(base_url) else url
+    path = path.split("?", 1)[0]
+    path = _VERSION_RE.sub("", path)
+    parts = path.strip("/").split("/")
+    for i in range(1, len(parts)):
+        if parts[i - 1] in _ID_PARENTS and parts[i] not in _COLLECTION_OPS:
+            parts[i] = "{id}"
+    return f"{method.upper()} /{'/'.join(parts)}"
+
+
+class DockerCallStats:
+    """Per-endpoint call counts, errors, retries and latency histograms."""
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._calls: dict = {}
+
+    def record(self, endpoint: str, ms: float, error: bool = False, retries: int = 0):
+        with self._lock:
+            entry = self._calls.get(endpoint)
+            if entry is None:
+                entry = self._calls[endpoint] = {
+                    "calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0,
+                    "latency": LatencyHistogram(),
+                }
+            entry["calls"]    += 1
+            entry["errors"]   += int(error)
+            entry["retries"]  += retries
+            entry["total_ms"] += ms
+        entry["latency"].observe(ms)
+
+    def snapshot(self) -> dict:
+        """Endpoints sorted by total time spent, the biggest first."""
+        with self._lock:
+            items = [(name, dict(entry)) for name, entry in self._calls.items()]
+        result = {}
+        for name, entry in sorted(items, key=lambda kv: kv[1]["total_ms"], reverse=True):
+            latency = entry.pop("latency").snapshot()
+            entry["total_ms"] = round(entry["total_ms"], 2)
+            entry.update({k: latency[k] for k in ("mean_ms", "p50_ms", "p95_ms", "p99_ms")})
+            result[name] = entry
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+
+
+def instrument(api, stats: DockerCallStats, retries: int = DOCKER_RETRIES,
+               backoff: float = DOCKER_RETRY_BACKOFF, sleep=time.sleep):
+    """
+    Wrap *api* (a docker APIClient, which is a requests.Session) so every
+    request is timed into *stats*. Reads are retried on connection errors
+    and timeouts; writes are never retried.
+    """
+    send = api.request
+    base_url = getattr(api, "base_url", "")
+
+    def request(method, url, *args, **kwargs):
+        name     = endpoint_name(method, url, base_url)
+        attempts = 1 + (retries if method.upper() in RETRY_METHODS else 0)
+        start    = time.perf_counter()
+        for attempt in range(attempts):
+            try:
+                response = send(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt + 1 >= attempts:
+                    stats.record(name, (time.perf_counter() - start) * 1000, True, attempt)
+                    raise
+                sleep(backoff * (2 ** attempt))
+                continue
+            except Exception:
+                stats.record(name, (time.perf_counter() - start) * 1000, True, attempt)
+                raise
+            stats.record(name, (time.perf_counter() - start) * 1000,
+                         response.status_code >= 500, attempt)
+            return response
+
+    api.request = request
+    return api
+
+
+# ── Shared client ──────────────────────────────────────────────────────────────
+
+docker_stats = DockerCallStats()
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_docker():
+    """
+    Return the process-wide Docker client, built on first use with a pooled
+    connection to the daemon socket. Raises like docker.from_env() if the
+    daemon is unreachable; the next call tries again.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import docker   # lazy – the SDK is only needed once a route touches Docker
+                client = docker.from_env(timeout=DOCKER_TIMEOUT, max_pool_size=DOCKER_POOL_SIZE)
+                instrument(client.api, docker_stats)
+                _client = client
+                logger.info("docker: shared client ready (pool=%d, timeout=%ds)",
+                            DOCKER_POOL_SIZE, DOCKER_TIMEOUT)
+    return _client
@@ -1,7 +1,6 @@
-from app import app, init_db
+from migrations import connect, migrate
 
 print("Starting database repair...")
-with app.app_context():
-    init_db()
-    print("SUCCESS: Database tables created successfully!")
-    
\ No newline at end of file
+with connect() as conn:
+    applied = migrate(conn)
+print(f"SUCCESS: schema up to date ({len(applied)} migration(s) applied)")
@@ -0,0 +1,25 @@
+# Read by gunicorn from its working directory (/app in the image); command-line
+# flags in the Dockerfile still set the worker class, count and bind address.
+import os
+
+MIGRATE_ON_START = os.getenv("MIGRATE_ON_START", "1") == "1"
+
+
+def on_starting(server):
+    """Bring the schema up to date once, in the master, before any worker boots."""
+    if not MIGRATE_ON_START:
+        return
+    from migrations import connect, migrate
+    try:
+        with connect() as conn:
+            applied = migrate(conn)
+        server.log.info("migrations: %s", f"applied {applied}" if applied else "up to date")
+    except Exception as exc:
+        # Workers still start; /health reports the database as degraded.
+        server.log.error("migrations failed – %s", exc)
+
+
+def post_worker_init(worker):
+    """Start the per-worker background services once the worker has forked and loaded the app."""
+    from app import start_worker_services
+    start_worker_services()
@@ -0,0 +1,200 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL",    10))     # seconds between probe rounds
+HEALTH_TIMEOUT  = float(os.getenv("HEALTH_TIMEOUT",     3))      # seconds; slower counts as down
+HEALTH_SLOW_MS  = float(os.getenv("HEALTH_SLOW_MS",     500))    # slower probes report "degraded"
+
+HEALTHY, DEGRADED, UNHEALTHY, PENDING = "healthy", "degraded", "unhealthy", "pending"
+_RANK = {HEALTHY: 0, DEGRADED: 1, UNHEALTHY: 2}
+
+
+# ── Checker ────────────────────────────────────────────────────────────────────
+
+class HealthChecker:
+    """
+    Runs component probes in the background and keeps their last results,
+    so /health answers from memory however often it is polled.
+
+    A probe is a callable returning a dict of details; it may set "status"
+    itself (e.g. "disabled", "not_started"), otherwise it is healthy when it
+    returns and unhealthy when it raises. Each result records the probe's
+    measured latency and when it ran. A probe still running HEALTH_TIMEOUT
+    after it started is reported unhealthy until it comes back. Probes
+    registered with critical=False (optional services) can only make the
+    overall status "degraded". Until the first round finishes the overall
+    status is "pending" (or "unhealthy", if a critical probe is hung).
+    """
+
+    def __init__(self, spawn=None, sleep=time.sleep, interval: float = HEALTH_INTERVAL,
+                 timeout: float = HEALTH_TIMEOUT, slow_ms: float = HEALTH_SLOW_MS):
+        self._spawn    = spawn or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self._sleep    = sleep
+        self._interval = interval
+        self._timeout  = timeout
+        self._slow_ms  = slow_ms
+        self._probes: list  = []            # (name, probe, critical)
+        self._results: dict = {}            # name → last result
+        self._running: dict = {}            # name → monotonic start of an unfinished probe
+        self._lock     = threading.Lock()
+        self._started  = False
+        self._stopping = False
+        self._rounds   = 0
+        self._last_round = None             # monotonic end of the last full round
+
+    def register(self, name: str, probe, critical: bool = True):
+        self._probes.append((name, probe, critical))
+
+    def start(self):
+        """Start probing in the background; the first round runs at once but nobody waits for it."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._spawn(self._loop)
+        logger.info("health: probing %s every %.0fs",
+                    ", ".join(name for name, _, _ in self._probes), self._interval)
+
+    def stop(self):
+        self._stopping = True
+
+    def run_once(self):
+        for name, probe, _ in self._probes:
+            self._results_for(name, self._probe(name, probe))
+        with self._lock:
+            self._rounds += 1
+            self._last_round = time.monotonic()
+
+    def snapshot(self) -> dict:
+        """Overall status plus the latest result of every probe; never blocks on a probe."""
+        now = time.monotonic()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+            running = dict(self._running)
+            rounds, last_round = self._rounds, self._last_round
+
+        overall = HEALTHY
+        for name, _, critical in self._probes:
+            result = results.setdefault(name, {"status": PENDING})
+            started = running.get(name)
+            if started is not None and now - started > self._timeout:
+                result.update(status=UNHEALTHY,
+                              error=f"no answer after {now - started:.1f}s")
+            status = result.get("status")
+            if status in (DEGRADED, UNHEALTHY):
+                status = status if critical else DEGRADED
+                if _RANK[status] > _RANK[overall]:
+                    overall = status
+
+        # A wedged loop stops refreshing everything: say so instead of serving old news.
+        age = now - last_round if last_round is not None else None
+        if age is not None and age > 3 * self._interval + self._timeout and overall == HEALTHY:
+            overall = DEGRADED
+        if not rounds and overall == HEALTHY:
+            overall = PENDING
+        return {
+            "status": overall,
+            "checked_ago_s": round(age, 1) if age is not None else None,
+            "rounds": rounds,
+            "components": results,
+        }
+
+    # ── Internal ───────────────────────────────────────────────────────────────
+
+    def _results_for(self, name: str, result: dict):
+        with self._lock:
+            self._results[name] = result
+
+    def _probe(self, name: str, probe) -> dict:
+        with self._lock:
+            self._running[name] = start = time.monotonic()
+        try:
+            details = dict(probe() or {})
+            error = None
+        except Exception as exc:
+            details, error = {}, str(exc) or type(exc).__name__
+        finally:
+            with self._lock:
+                self._running.pop(name, None)
+        latency_ms = (time.monotonic() - start) * 1000
+
+        if error is not None:
+            status = UNHEALTHY
+            details["error"] = error
+            logger.warning("health: %s probe failed – %s", name, error)
+        elif latency_ms > self._timeout * 1000:
+            status = UNHEALTHY
+            details["error"] = f"took {latency_ms / 1000:.1f}s"
+        else:
+            status = details.pop("status", None) or (DEGRADED if latency_ms > self._slow_ms else HEALTHY)
+        return {"status": status, "latency_ms": round(latency_ms, 1),
+                "checked_at": time.time(), **details}
+
+    def _loop(self):
+        while not self._stopping:
+            try:
+                self.run_once()
+            except Exception as exc:
+                logger.error("health: probe round error: %s", exc, exc_info=True)
+            self._sleep(self._interval)
+
+
+# ── Probes ─────────────────────────────────────────────────────────────────────
+
+class DatabaseProbe:
+    """
+    SELECT 1 over one long-lived connection, reopened after a failure, so
+    probing doesn't cost a new Postgres backend every round.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._conn    = None
+
+    def __call__(self) -> dict:
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = self._connect()
+            with self._conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+        except Exception:
+            self._close()
+            raise
+        return {}
+
+    def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def monitor_probe(get_monitor, slack: float = 2.0):
+    """
+    Liveness of the SystemMonitor thread: it must be alive and have finished
+    a tick within *slack* poll intervals (plus the time a tick takes).
+    """
+    def probe() -> dict:
+        monitor = get_monitor()
+        if monitor is None:
+            return {"status": "not_started"}
+        stats = monitor.stats()
+        if not stats["alive"]:
+            raise RuntimeError("monitor thread is not running")
+        if stats["last_tick_ago_s"] is None:
+            return {"status": "starting", **stats}
+        lag = stats["last_tick_ago_s"] - stats["interval_s"]
+        stats["lag_s"] = round(max(0.0, lag), 1)
+        if stats["last_tick_ago_s"] > slack * stats["interval_s"] + stats["last_tick_s"]:
+            return {"status": DEGRADED, **stats}
+        return stats
+    return probe
@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+IDLE_MINUTES   = int(os.getenv("HIBERNATE_IDLE_MINUTES",     30))
+MODE           = os.getenv("HIBERNATE_MODE",                 "pause")   # pause | stop
+CPU_THRESHOLD  = float(os.getenv("HIBERNATE_CPU_PERCENT",    5.0))     # above → busy
+CHECK_INTERVAL = int(os.getenv("HIBERNATE_CHECK_INTERVAL",   60))      # seconds
+STOP_TIMEOUT   = int(os.getenv("HIBERNATE_STOP_TIMEOUT",     10))      # seconds
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def _key(container_id: str) -> str:
+    """Activity is tracked by short id, which is what the UI and terminals use."""
+    return container_id[:12]
+
+
+def _snapshot_cpu(container):
+    """One-shot CPU % via docker stats, for when the monitor isn't running."""
+    try:
+        from monitor import _calc_container_cpu   # lazy – monitor pulls in psutil
+        return _calc_container_cpu(container.stats(stream=False))
+    except Exception as exc:
+        logger.debug("hibernate: stats failed for %s – %s", container.name, exc)
+        return None
+
+
+# ── WorkspaceHibernator thread ─────────────────────────────────────────────────
+
+class WorkspaceHibernator(threading.Thread):
+    """
+    Pauses (or stops) workspace containers nobody is using.
+
+    A container counts as active while it has an open terminal session, for
+    IDLE_MINUTES after the last touch() (launch, file API, terminal join), or
+    while its CPU is above CPU_THRESHOLD. Otherwise it is hibernated and
+    recorded in the shared store, so wake() on any worker can bring it back –
+    unpausing, or restarting it on the same persistent volume.
+
+    With several workers, touches are also written to the store as
+    ``active:<short id>`` and every worker keeps its own terminals' containers
+    fresh there each round; only the holder of *lease* (a cluster.Lease)
+    actually hibernates, so containers are judged once, on everyone's activity.
+    """
+
+    def __init__(self, client_factory, store, label: str,
+                 busy_containers=lambda: (), cpu_lookup=None,
+                 idle_minutes: float = IDLE_MINUTES, mode: str = MODE,
+                 cpu_threshold: float = CPU_THRESHOLD, check_interval: float = CHECK_INTERVAL,
+                 lease=None):
+        super().__init__(name="WorkspaceHibernator", daemon=True)
+        self._client_factory  = client_factory
+        self._store           = store
+        self._label           = label
+        self._busy_containers = busy_containers
+        self._cpu_lookup      = cpu_lookup
+        self._idle_after      = idle_minutes * 60
+        self._mode            = mode if mode in ("pause", "stop") else "pause"
+        self._cpu_threshold   = cpu_threshold
+        self._check_interval  = check_interval
+        self._lease           = lease
+        self._stop_event      = threading.Event()
+
+        self._lock        = threading.Lock()
+        self._last_active: dict = {}        # short id → wall time (shared with other workers)
+        self._counters    = {"checks": 0, "hibernated": 0, "resumed": 0, "errors": 0, "skipped": 0}
+
+    # ── Public API ─────────────────────────────────────────────────────────────
+
+    def touch(self, container_id: str):
+        """Record activity on a container, for this worker and the leader."""
+        key, now = _key(container_id), time.time()
+        with self._lock:
+            self._last_active[key] = now
+        self._store.set(f"active:{key}", repr(now), ttl=self._idle_after + 2 * self._check_interval)
+
+    def wake(self, container) -> bool:
+        """
+        Make sure *container* is running again if it was hibernated. Returns
+        True if it had to be resumed. Paused containers are always unpaused;
+        stopped ones only if we stopped them.
+        """
+        self.touch(container.id)
+        marker = f"hibernated:{container.id}"
+        try:
+            if container.status == "paused":
+                container.unpause()
+            elif container.status in ("exited", "created") and self._store.get(marker):
+                container.start()
+            else:
+                return False
+            container.reload()
+        except Exception as exc:
+            self._count("errors")
+            logger.error("hibernate: could not resume %s – %s", container.name, exc)
+            raise
+        self._store.delete(marker)
+        self._count("resumed")
+        logger.info("hibernate: resumed %s", container.name)
+        return True
+
+    def is_hibernated(self, container) -> bool:
+        return container.status == "paused" or (
+            container.status in ("exited", "created")
+            and bool(self._store.get(f"hibernated:{container.id}"))
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["tracked"] = len(self._last_active)
+        counters["mode"] = self._mode
+        counters["idle_minutes"] = self._idle_after / 60
+        counters["leader"] = self._lease.held if self._lease is not None else True
+        return counters
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        logger.info("WorkspaceHibernator started (mode=%s, idle=%.0f min)",
+                    self._mode, self._idle_after / 60)
+        while not self._stop_event.wait(timeout=self._check_interval):
+            try:
+                self.check()
+            except Exception as exc:
+                self._count("errors")
+                logger.error("WorkspaceHibernator check error: %s", exc, exc_info=True)
+        logger.info("WorkspaceHibernator stopped")
+
+    def check(self):
+        """One pass over running workspaces; hibernates those idle too long."""
+        self._count("checks")
+        busy = {_key(cid) for cid in self._busy_containers()}
+        for key in busy:
+            self.touch(key)
+        if self._lease is not None and not self._lease.acquire():
+            self._count("skipped")
+            return
+
+        client  = self._client_factory()
+        running = client.containers.list(filters={"label": self._label, "status": "running"})
+        shared  = {_key(c.id): self._shared_activity(_key(c.id)) for c in running}
+        now     = time.time()
+
+        with self._lock:
+            # Forget containers that are gone; first sighting starts the clock.
+            self._last_active = {k: v for k, v in self._last_active.items() if k in shared}
+            for key, seen_at in shared.items():
+                if key in busy:
+                    self._last_active[key] = now
+                self._last_active[key] = max(self._last_active.get(key, now), seen_at)
+            idle = [c for c in running
+                    if _key(c.id) not in busy and now - self._last_active[_key(c.id)] >= self._idle_after]
+
+        for container in idle:
+            cpu = self._cpu(container)
+            if cpu is not None and cpu >= self._cpu_threshold:
+                self.touch(container.id)
+                continue
+            self._hibernate(container)
+
+    # ── Internal ───────────────────────────────────────────────────────────────
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _shared_activity(self, key: str) -> float:
+        """Latest touch from any worker, or 0 if none is on record."""
+        try:
+            return float(self._store.get(f"active:{key}") or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def _cpu(self, container):
+        if self._cpu_lookup is not None:
+            cpu = self._cpu_lookup(container)
+            if cpu is not None:
+                return cpu
+        return _snapshot_cpu(container)
+
+    def _hibernate(self, container):
+        try:
+            if self._mode == "stop":
+                self._store.set(f"hibernated:{container.id}", "stop")
+                container.stop(timeout=STOP_TIMEOUT)
+            else:
+                container.pause()
+        except Exception as exc:
+            self._store.delete(f"hibernated:{container.id}")
+            self._count("errors")
+            logger.error("hibernate: could not %s %s – %s", self._mode, container.name, exc)
+            return
+        with self._lock:
+            self._last_active.pop(_key(container.id), None)
+        self._store.delete(f"active:{_key(container.id)}")
+        self._count("hibernated")
+        logger.info("hibernate: %s %s after %.0f min idle",
+                    "stopped" if self._mode == "stop" else "paused",
+                    container.name, self._idle_after / 60)
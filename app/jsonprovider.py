@@ -0,0 +1,83 @@
+import json
+import uuid
+import decimal
+import logging
+from datetime import date, datetime, time, timezone
+
+from flask.json.provider import JSONProvider
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    _ORJSON_AVAILABLE = False
+
+# Naive datetimes are UTC (TIMESTAMP columns filled by CURRENT_TIMESTAMP on a
+# UTC server) and go out with an explicit offset, so browsers don't read them
+# as local time. Non-string keys (ints) are stringified like the stdlib does.
+_ORJSON_OPTIONS = (orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS) if _ORJSON_AVAILABLE else 0
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def _default(o):
+    """Types neither encoder handles natively."""
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _stdlib_default(o):
+    """The stdlib fallback also has to do what orjson does natively."""
+    if isinstance(o, datetime):
+        return (o if o.tzinfo else o.replace(tzinfo=timezone.utc)).isoformat()
+    if isinstance(o, (date, time)):
+        return o.isoformat()
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    return _default(o)
+
+
+def dumps_bytes(obj) -> bytes:
+    """Compact UTF-8 JSON for *obj*, with orjson when it is installed."""
+    if _ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_stdlib_default, separators=(",", ":"),
+                      ensure_ascii=False).encode("utf-8")
+
+
+# ── Provider ───────────────────────────────────────────────────────────────────
+
+class FastJSONProvider(JSONProvider):
+    """
+    Flask JSON provider behind jsonify() and request.get_json(). Output is
+    compact and unsorted; datetimes are ISO 8601 (naive ones as UTC),
+    Decimals plain numbers, UUIDs and sets handled too, so routes can return
+    database rows as they come. Uses orjson when installed and the stdlib
+    json module otherwise, with the same output. Explicit formatting
+    arguments (indent=…, sort_keys=…) always go to the stdlib encoder.
+    """
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            kwargs.setdefault("default", _stdlib_default)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if _ORJSON_AVAILABLE and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
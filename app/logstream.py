@@ -0,0 +1,299 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+LOG_TAIL_LINES    = int(os.getenv("LOG_TAIL_LINES",          1000))   # cached per container
+LOG_CLIENT_BUFFER = int(os.getenv("LOG_CLIENT_BUFFER_LINES", 2000))   # per-viewer cap
+LOG_TAIL_LINGER   = int(os.getenv("LOG_TAIL_LINGER",         60))     # s kept open without viewers
+LOG_REAP_INTERVAL = int(os.getenv("LOG_REAP_INTERVAL",       15))     # seconds
+
+
+# ── Timestamps ─────────────────────────────────────────────────────────────────
+
+def ts_to_ns(ts: str) -> int:
+    """
+    Docker's RFC3339Nano timestamp (``2024-05-01T10:00:00.123456789Z``) as
+    integer nanoseconds. Docker trims trailing zeros, so strings don't sort.
+    """
+    base, _, frac = ts.rstrip("Z").partition(".")
+    dt = datetime.fromisoformat(base).replace(tzinfo=timezone.utc)
+    return int(dt.timestamp()) * 1_000_000_000 + int((frac + "000000000")[:9])
+
+
+def parse_time(value):
+    """
+    Parse a since/until/cursor query value – unix seconds or an ISO-8601 /
+    Docker timestamp – into integer nanoseconds. Raises ValueError.
+    """
+    value = str(value).strip()
+    try:
+        return int(float(value) * 1_000_000_000)
+    except ValueError:
+        pass
+    if "." in value or value.endswith("Z"):
+        return ts_to_ns(value)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1_000_000_000)
+
+
+def split_lines(carry: bytes, chunk: bytes):
+    """Split *chunk* into complete lines; returns (lines, new carry)."""
+    data = carry + chunk
+    *lines, rest = data.split(b"\n")
+    return lines, rest
+
+
+def parse_line(raw: bytes):
+    """``b'<ts> <text>'`` → (ts, ts_ns, text). Lines without a timestamp get ts_ns 0."""
+    text = raw.decode("utf-8", errors="replace").rstrip("\r")
+    ts, _, rest = text.partition(" ")
+    try:
+        return ts, ts_to_ns(ts), rest
+    except ValueError:
+        return "", 0, text
+
+
+# ── Subscribers ────────────────────────────────────────────────────────────────
+
+class LogSubscriber:
+    """
+    One viewer's bounded queue of (ts, ts_ns, text) lines. When the viewer
+    falls more than LOG_CLIENT_BUFFER lines behind, the oldest are dropped
+    and counted so the stream can report the gap.
+    """
+
+    def __init__(self, capacity: int = LOG_CLIENT_BUFFER):
+        self._lines   = deque(maxlen=capacity)
+        self._cond    = threading.Condition()
+        self.dropped  = 0
+        self.closed   = False
+
+    def push(self, line):
+        with self._cond:
+            if len(self._lines) == self._lines.maxlen:
+                self.dropped += 1
+            self._lines.append(line)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def drain(self, timeout: float):
+        """Return (lines, dropped_since_last_call); waits up to *timeout* for data."""
+        with self._cond:
+            if not self._lines and not self.closed:
+                self._cond.wait(timeout=timeout)
+            lines = list(self._lines)
+            self._lines.clear()
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
+
+
+# ── Shared per-container tail ──────────────────────────────────────────────────
+
+class LogTail:
+    """
+    One Docker log stream per container, shared by every viewer.
+
+    Keeps the last LOG_TAIL_LINES lines in memory (so one-off reads and new
+    viewers are served without another Docker call) and fans new lines out
+    to subscribers. The backlog is read first, in one call, and the follow
+    stream picks up after its last line; until then ``loaded`` is False and
+    the cache covers nothing.
+    """
+
+    def __init__(self, container, socketio, tail_lines: int = LOG_TAIL_LINES):
+        self.container_id = container.id
+        self.lines        = deque(maxlen=tail_lines)
+        self.started_at   = time.monotonic()
+        self.idle_since   = time.monotonic()
+        self.running      = False
+        self.loaded       = False         # backlog read; the cache now holds the latest lines
+
+        self._container   = container
+        self._socketio    = socketio
+        self._tail_lines  = tail_lines
+        self._subscribers = set()
+        self._lock        = threading.Lock()
+        self._stream      = None
+
+    def start(self):
+        self.running = True
+        self._socketio.start_background_task(self._read_loop)
+
+    def stop(self):
+        self.running = False
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for sub in subscribers:
+            sub.close()
+
+    def covers(self, after_ns: int) -> bool:
+        """True if every line newer than *after_ns* is still in the cache."""
+        with self._lock:
+            if not self.loaded:
+                return False
+            if len(self.lines) < self.lines.maxlen:
+                return True
+            return bool(self.lines) and self.lines[0][1] <= after_ns
+
+    def snapshot(self, tail: int | None = None, after_ns: int = 0, until_ns: int | None = None):
+        with self._lock:
+            lines = [l for l in self.lines
+                     if l[1] > after_ns and (until_ns is None or l[1] <= until_ns)]
+        return lines[-tail:] if tail else lines
+
+    def subscribe(self, after_ns: int = 0, tail: int | None = None,
+                  capacity: int = LOG_CLIENT_BUFFER) -> LogSubscriber:
+        """
+        Register a viewer, pre-filled with the last *tail* cached lines newer
+        than *after_ns*. Done under the lock so no line is missed in between.
+        """
+        sub = LogSubscriber(capacity)
+        with self._lock:
+            backlog = [l for l in self.lines if l[1] > after_ns]
+            for line in backlog[-tail:] if tail else backlog:
+                sub.push(line)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: LogSubscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+            if not self._subscribers:
+                self.idle_since = time.monotonic()
+        sub.close()
+
+    @property
+    def viewers(self) -> int:
+        return len(self._subscribers)
+
+    def _publish(self, lines):
+        with self._lock:
+            self.lines.extend(lines)
+            self.loaded = True
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            for line in lines:
+                sub.push(line)
+
+    def _read_loop(self):
+        carry = b""
+        try:
+            opened = time.time()
+            raw_lines, rest = split_lines(b"", self._container.logs(
+                stream=False, timestamps=True, tail=self._tail_lines))
+            backlog = [parse_line(raw) for raw in raw_lines + ([rest] if rest else [])]
+            self._publish(backlog)
+            if not self.running:
+                return
+
+            # Follow from the last backlog line (or from just before the backlog
+            # read, if there was none), dropping the overlap Docker sends again.
+            last_ns = max((l[1] for l in backlog), default=0)
+            self._stream = self._container.logs(
+                stream=True, follow=True, timestamps=True,
+                since=last_ns / 1e9 if last_ns else opened,
+            )
+            for chunk in self._stream:
+                if not self.running:
+                    break
+                raw_lines, carry = split_lines(carry, chunk)
+                lines = [line for line in map(parse_line, raw_lines)
+                         if not 0 < line[1] <= last_ns]
+                if lines:
+                    self._publish(lines)
+        except Exception as exc:
+            if self.running:
+                logger.warning("Log tail for %s ended: %s", self.container_id[:12], exc)
+        finally:
+            self.running = False
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for sub in subscribers:
+                sub.close()
+
+
+class LogTailRegistry:
+    """
+    Per-worker registry of LogTails. Tails with no viewers are closed after
+    LOG_TAIL_LINGER seconds by a background reaper.
+    """
+
+    def __init__(self, socketio, linger: float = LOG_TAIL_LINGER,
+                 reap_interval: float = LOG_REAP_INTERVAL):
+        self._socketio      = socketio
+        self._linger        = linger
+        self._reap_interval = reap_interval
+        self._tails: dict   = {}
+        self._lock          = threading.Lock()
+        self._reaper_started = False
+
+    def get(self, container_id: str):
+        with self._lock:
+            tail = self._tails.get(container_id)
+        return tail if tail and tail.running else None
+
+    def get_or_start(self, container) -> LogTail:
+        with self._lock:
+            tail = self._tails.get(container.id)
+            if tail is None or not tail.running:
+                tail = LogTail(container, self._socketio)
+                self._tails[container.id] = tail
+                tail.start()
+            start_reaper = not self._reaper_started
+            self._reaper_started = True
+        if start_reaper:
+            self._socketio.start_background_task(self._reap_loop)
+        return tail
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            idle = [cid for cid, t in self._tails.items()
+                    if not t.running or (t.viewers == 0 and now - t.idle_since >= self._linger)]
+            tails = [self._tails.pop(cid) for cid in idle]
+        for tail in tails:
+            tail.stop()
+
+    def shutdown(self):
+        with self._lock:
+            tails = list(self._tails.values())
+            self._tails.clear()
+        for tail in tails:
+            tail.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            tails = list(self._tails.values())
+        return {
+            "streams":      sum(1 for t in tails if t.running),
+            "viewers":      sum(t.viewers for t in tails),
+            "cached_lines": sum(len(t.lines) for t in tails),
+        }
+
+    def _reap_loop(self):
+        while True:
+            self._socketio.sleep(self._reap_interval)
+            try:
+                self.reap()
+            except Exception as exc:
+                logger.error("LogTailRegistry reap error: %s", exc, exc_info=True)
@@ -0,0 +1,57 @@
+import threading
+
+# ── Latency histogram ──────────────────────────────────────────────────────────
+# Shared by the terminal, Docker client, AI assistant and retrieval metrics.
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (ms); percentiles report the bucket bound."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts  = [0] * (len(self.buckets) + 1)     # last slot: overflow
+        self.count   = 0
+        self.sum_ms  = 0.0
+        self._lock   = threading.Lock()
+
+    def observe(self, ms: float):
+        i = 0
+        while i < len(self.buckets) and ms > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.count     += 1
+            self.sum_ms    += ms
+
+    def percentile(self, p: float):
+        with self._lock:
+            if not self.count:
+                return None
+            target = p / 100 * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= target:
+                    return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum_ms
+        labels = [f"le_{b}" for b in self.buckets] + ["le_inf"]
+
+        def bound(p):
+            # JSON has no Infinity: report overflow as "> last bucket"
+            value = self.percentile(p)
+            return f">{self.buckets[-1]}" if value == float("inf") else value
+
+        return {
+            "count":   count,
+            "mean_ms": round(total / count, 2) if count else None,
+            "p50_ms":  bound(50),
+            "p95_ms":  bound(95),
+            "p99_ms":  bound(99),
+            "buckets": dict(zip(labels, counts)),
+        }
@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import logging
+import argparse
+from dataclasses import dataclass
+
+import psycopg
+
+from monitor import DB_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+MIGRATE_RETRIES     = int(os.getenv("MIGRATE_RETRIES",         5))      # connect attempts
+MIGRATE_RETRY_DELAY = float(os.getenv("MIGRATE_RETRY_DELAY",   2.0))    # seconds between them
+LOCK_ID             = 7_460_112_001                                    # pg advisory lock key
+
+
+# ── Schema ─────────────────────────────────────────────────────────────────────
+
+TABLE_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS users (
+           id            SERIAL PRIMARY KEY,
+           username      VARCHAR(80)  NOT NULL UNIQUE,
+           email         VARCHAR(255) NOT NULL UNIQUE,
+           password_hash VARCHAR(255) NOT NULL,
+           created_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+       )""",
+    """CREATE TABLE IF NOT EXISTS projects (
+           id             SERIAL PRIMARY KEY,
+           name           VARCHAR(255) NOT NULL,
+           description    TEXT,
+           repository_url VARCHAR(500),
+           status         VARCHAR(50)  DEFAULT 'active',
+           owner_id       INTEGER REFERENCES users(id) ON DELETE CASCADE,
+           tags           TEXT,
+           env_vars       JSONB        DEFAULT '{}'::jsonb,
+           created_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           updated_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+       )""",
+    """ALTER TABLE projects
+           ADD COLUMN IF NOT EXISTS env_vars JSONB DEFAULT '{}'::jsonb""",
+    """CREATE TABLE IF NOT EXISTS activity_logs (
+           id         SERIAL PRIMARY KEY,
+           user_id    INTEGER REFERENCES users(id) ON DELETE SET NULL,
+           action     VARCHAR(255) NOT NULL,
+           details    TEXT,
+           ip_address VARCHAR(45),
+           user_agent TEXT,
+           severity   VARCHAR(20) DEFAULT 'info',
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+       )""",
+    """CREATE TABLE IF NOT EXISTS deployments (
+           id          SERIAL PRIMARY KEY,
+           project_id  INTEGER REFERENCES projects(id) ON DELETE CASCADE,
+           environment VARCHAR(50),
+           status      VARCHAR(50),
+           version     VARCHAR(50),
+           commit_hash VARCHAR(100),
+           deployed_by VARCHAR(255),
+           duration_ms INTEGER,
+           deployed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+       )""",
+    """CREATE TABLE IF NOT EXISTS system_metrics (
+           id           SERIAL PRIMARY KEY,
+           metric_name  VARCHAR(100),
+           metric_value FLOAT,
+           unit         VARCHAR(50),
+           recorded_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+       )""",
+    """CREATE TABLE IF NOT EXISTS user_sessions (
+           id            SERIAL PRIMARY KEY,
+           session_id    VARCHAR(255) UNIQUE,
+           user_agent    TEXT,
+           ip_address    VARCHAR(45),
+           connected_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+       )""",
+]
+
+# Secondary indexes matching the hot read paths: every listing is
+# "rows for one owner, newest first", with id as the tiebreaker
+# used by keyset pagination.
+INDEX_STATEMENTS = [
+    """CREATE INDEX IF NOT EXISTS idx_projects_owner_created
+           ON projects (owner_id, created_at DESC, id DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_projects_owner_updated
+           ON projects (owner_id, updated_at DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_deployments_project_deployed
+           ON deployments (project_id, deployed_at DESC, id DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_activity_user_created
+           ON activity_logs (user_id, created_at DESC, id DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_activity_user_severity_created
+           ON activity_logs (user_id, severity, created_at DESC, id DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_system_metrics_recorded
+           ON system_metrics (recorded_at DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_deployments_active
+           ON deployments (project_id) WHERE status = 'active'""",
+]
+
+# Per-user counters for the dashboard, maintained by statement-level triggers
+# so batched activity writes cost one upsert per user rather than per row.
+# Deletes only UPDATE existing rows: a cascading user delete must not re-insert.
+COUNTER_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS user_stats (
+           user_id        INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+           project_count  BIGINT NOT NULL DEFAULT 0,
+           activity_count BIGINT NOT NULL DEFAULT 0
+       )""",
+    """CREATE OR REPLACE FUNCTION user_stats_projects_ins() RETURNS trigger AS $$
+       BEGIN
+           INSERT INTO user_stats (user_id, project_count)
+           SELECT owner_id, COUNT(*) FROM new_rows
+           WHERE owner_id IS NOT NULL GROUP BY owner_id
+           ON CONFLICT (user_id) DO UPDATE
+               SET project_count = user_stats.project_count + EXCLUDED.project_count;
+           RETURN NULL;
+       END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION user_stats_projects_del() RETURNS trigger AS $$
+       BEGIN
+           UPDATE user_stats s SET project_count = s.project_count - d.n
+           FROM (SELECT owner_id, COUNT(*) AS n FROM old_rows GROUP BY owner_id) d
+           WHERE s.user_id = d.owner_id;
+           RETURN NULL;
+       END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION user_stats_activity_ins() RETURNS trigger AS $$
+       BEGIN
+           INSERT INTO user_stats (user_id, activity_count)
+           SELECT user_id, COUNT(*) FROM new_rows
+           WHERE user_id IS NOT NULL GROUP BY user_id
+           ON CONFLICT (user_id) DO UPDATE
+               SET activity_count = user_stats.activity_count + EXCLUDED.activity_count;
+           RETURN NULL;
+       END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION user_stats_activity_del() RETURNS trigger AS $$
+       BEGIN
+           UPDATE user_stats s SET activity_count = s.activity_count - d.n
+           FROM (SELECT user_id, COUNT(*) AS n FROM old_rows GROUP BY user_id) d
+           WHERE s.user_id = d.user_id;
+           RETURN NULL;
+       END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE TRIGGER trg_user_stats_projects_ins
+           AFTER INSERT ON projects REFERENCING NEW TABLE AS new_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION user_stats_projects_ins()""",
+    """CREATE OR REPLACE TRIGGER trg_user_stats_projects_del
+           AFTER DELETE ON projects REFERENCING OLD TABLE AS old_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION user_stats_projects_del()""",
+    """CREATE OR REPLACE TRIGGER trg_user_stats_activity_ins
+           AFTER INSERT ON activity_logs REFERENCING NEW TABLE AS new_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION user_stats_activity_ins()""",
+    """CREATE OR REPLACE TRIGGER trg_user_stats_activity_del
+           AFTER DELETE ON activity_logs REFERENCING OLD TABLE AS old_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION user_stats_activity_del()""",
+]
+
+COUNTER_BACKFILL = """
+    INSERT INTO user_stats (user_id, project_count, activity_count)
+    SELECT u.id,
+           (SELECT COUNT(*) FROM projects p WHERE p.owner_id = u.id),
+           (SELECT COUNT(*) FROM activity_logs a WHERE a.user_id = u.id)
+    FROM users u
+    ON CONFLICT (user_id) DO UPDATE
+        SET project_count  = EXCLUDED.project_count,
+            activity_count = EXCLUDED.activity_count
+"""
+
+# Keyset pagination orders and compares on (timestamp, id); a NULL there can't
+# be encoded in a cursor and drops out of the row comparison, so backfill the
+# few rows inserted with an explicit NULL and forbid it from now on.
+SORT_KEY_STATEMENTS = [
+    "UPDATE projects SET created_at = COALESCE(updated_at, 'epoch') WHERE created_at IS NULL",
+    "ALTER TABLE projects ALTER COLUMN created_at SET NOT NULL",
+    "UPDATE deployments SET deployed_at = 'epoch' WHERE deployed_at IS NULL",
+    "ALTER TABLE deployments ALTER COLUMN deployed_at SET NOT NULL",
+    "UPDATE activity_logs SET created_at = 'epoch' WHERE created_at IS NULL",
+    "ALTER TABLE activity_logs ALTER COLUMN created_at SET NOT NULL",
+]
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    statements: list
+
+
+# Append only: a released migration is never edited, the next one fixes it.
+# The first three are written to be no-ops on databases created before
+# versioning, when the same DDL ran on every worker start.
+MIGRATIONS = [
+    Migration(1, "base tables",        TABLE_STATEMENTS),
+    Migration(2, "listing indexes",    INDEX_STATEMENTS),
+    Migration(3, "dashboard counters", COUNTER_STATEMENTS + [COUNTER_BACKFILL]),
+    Migration(4, "non-null sort keys", SORT_KEY_STATEMENTS),
+]
+
+_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version    INTEGER PRIMARY KEY,
+        name       VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+# ── Runner ─────────────────────────────────────────────────────────────────────
+
+def connect(retries: int = MIGRATE_RETRIES, delay: float = MIGRATE_RETRY_DELAY, sleep=time.sleep):
+    """Autocommit connection (each migration opens its own transaction), retried while the DB boots."""
+    for attempt in range(max(1, retries)):
+        try:
+            return psycopg.connect(**DB_CONFIG, autocommit=True)
+        except psycopg.OperationalError as exc:
+            if attempt + 1 >= max(1, retries):
+                raise
+            logger.warning("migrate: database not ready (%s), retrying in %.0fs", exc, delay)
+            sleep(delay)
+
+
+def applied_versions(conn) -> set:
+    conn.execute(_VERSION_TABLE)
+    return {row[0] for row in conn.execute("SELECT version FROM schema_migrations").fetchall()}
+
+
+def pending(conn, migrations=MIGRATIONS) -> list:
+    done = applied_versions(conn)
+    return [m for m in migrations if m.version not in done]
+
+
+def migrate(conn, migrations=MIGRATIONS) -> list:
+    """
+    Apply every migration not yet recorded in schema_migrations, in version
+    order, each in its own transaction. A session advisory lock serialises
+    concurrent runners (several hosts starting at once); whoever waits finds
+    nothing left to do. Returns the versions applied.
+    """
+    conn.execute("SELECT pg_advisory_lock(%s)", (LOCK_ID,))
+    try:
+        applied = []
+        for migration in sorted(pending(conn, migrations), key=lambda m: m.version):
+            start = time.perf_counter()
+            with conn.transaction():
+                for statement in migration.statements:
+                    conn.execute(statement)
+                conn.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                             (migration.version, migration.name))
+            logger.info("migrate: applied %d %s in %.0f ms", migration.version, migration.name,
+                        (time.perf_counter() - start) * 1000)
+            applied.append(migration.version)
+        return applied
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bring the CloudX database schema up to date.")
+    parser.add_argument("--status", action="store_true", help="list pending migrations and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    with connect() as conn:
+        if args.status:
+            todo = pending(conn)
+            for migration in todo:
+                print(f"pending  {migration.version:>3}  {migration.name}")
+            print(f"{len(MIGRATIONS) - len(todo)} applied, {len(todo)} pending")
+            return 0
+        applied = migrate(conn)
+    print(f"applied {len(applied)} migration(s)" if applied else "schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
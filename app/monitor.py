@@ -1,7 +1,9 @@
 import os
+import json
 import time
 import logging
 import threading
+from collections import deque
 from datetime import datetime
 
 import psutil
@@ -13,6 +15,8 @@ logger = logging.getLogger(__name__)
 
 POLL_INTERVAL = int(os.getenv("MONITOR_POLL_INTERVAL", 15))   # seconds
 CONTAINER_PREFIX = "cloudx"                                     # filter containers
+HISTORY_MINUTES = int(os.getenv("MONITOR_HISTORY_MINUTES", 30))  # in-memory backfill window
+SUMMARY_KEY = "monitor:summary"                                 # leader → other workers
 
 DB_CONFIG = {
     "host":             os.getenv("POSTGRES_HOST",     "db"),
@@ -143,8 +147,8 @@ def _collect_container_metrics() -> list[tuple]:
     rows: list[tuple] = []
 
     try:
-        import docker  # lazy import – keeps monitor usable without Docker in dev
-        client = docker.from_env()
+        from dockerclient import get_docker  # lazy – keeps monitor usable without Docker in dev
+        client = get_docker()
     except Exception as exc:
         logger.warning("monitor: Docker unavailable – %s", exc)
         return rows
@@ -214,28 +218,55 @@ def _collect_container_metrics() -> list[tuple]:
 
 # ── SocketIO broadcasting ──────────────────────────────────────────────────────
 
-def _broadcast(socketio, metrics: list[tuple]):
+def _summarise(metrics: list[tuple]) -> dict:
     """
-    Emit a compact summary of the latest snapshot to all connected SocketIO clients.
+    Reduce a full tick of metrics to the compact summary clients consume
+    (host CPU/RAM + per-container CPU/RAM), keyed by the sanitised container name.
+    """
+    summary: dict = {"timestamp": datetime.utcnow().isoformat(), "host": {}, "containers": {}}
+
+    for name, value, unit in metrics:
+        if name == "host.cpu.percent":
+            summary["host"]["cpu_percent"] = value
+        elif name == "host.mem.percent":
+            summary["host"]["mem_percent"] = value
+        elif name == "host.mem.used_mb":
+            summary["host"]["mem_used_mb"] = value
+        elif name == "host.mem.available_mb":
+            summary["host"]["mem_available_mb"] = value
+        elif ".cpu.percent" in name and name.startswith("container."):
+            cname = name.split(".")[1]
+            summary["containers"].setdefault(cname, {})["cpu_percent"] = value
+        elif ".mem.percent" in name and name.startswith("container."):
+            cname = name.split(".")[1]
+            summary["containers"].setdefault(cname, {})["mem_percent"] = value
+
+    return summary
+
+
+def scope_summary(summary: dict, project_ids) -> dict:
+    """
+    Return a copy of *summary* that only contains the containers belonging to
+    *project_ids* (a set of project id strings). Host metrics are kept as-is.
+    """
+    if not summary:
+        return {}
+
+    prefixes = tuple(f"cloudx_project_{pid}_" for pid in project_ids)
+    containers = {
+        cname: values
+        for cname, values in summary.get("containers", {}).items()
+        if prefixes and cname.startswith(prefixes)
+    }
+    return {**summary, "containers": containers}
+
+
+def _broadcast(socketio, summary: dict):
+    """
+    Emit the latest summary to all connected SocketIO clients.
     Only emits a lightweight payload (host CPU/RAM + container summary) to avoid noise.
     """
     try:
-        summary: dict = {"timestamp": datetime.utcnow().isoformat(), "host": {}, "containers": {}}
-
-        for name, value, unit in metrics:
-            if name == "host.cpu.percent":
-                summary["host"]["cpu_percent"] = value
-            elif name == "host.mem.percent":
-                summary["host"]["mem_percent"] = value
-            elif name == "host.mem.used_mb":
-                summary["host"]["mem_used_mb"] = value
-            elif ".cpu.percent" in name and name.startswith("container."):
-                cname = name.split(".")[1]
-                summary["containers"].setdefault(cname, {})["cpu_percent"] = value
-            elif ".mem.percent" in name and name.startswith("container."):
-                cname = name.split(".")[1]
-                summary["containers"].setdefault(cname, {})["mem_percent"] = value
-
         socketio.emit("metrics_update", summary)
     except Exception as exc:
         logger.debug("monitor: broadcast failed – %s", exc)
@@ -249,38 +280,94 @@ class SystemMonitor(threading.Thread):
     interval, persists them to PostgreSQL, and optionally broadcasts a summary
     over SocketIO.
 
+    The latest full tick and a rolling window of summaries (HISTORY_MINUTES)
+    are kept in memory so request handlers can answer without touching the DB.
+
+    With several workers, pass a shared *store* and a cluster.Lease: only
+    the lease holder polls Docker, writes system_metrics and broadcasts; it
+    publishes each summary to the store as ``monitor:summary`` and the other
+    workers pick it up from there into their own history.
+
     Usage (in app.py):
         from monitor import SystemMonitor
-        monitor = SystemMonitor(socketio)
-        monitor.daemon = True
+        monitor = SystemMonitor(socketio, store=store, lease=lease)
         monitor.start()
     """
 
-    def __init__(self, socketio=None, poll_interval: int = POLL_INTERVAL):
+    def __init__(self, socketio=None, poll_interval: int = POLL_INTERVAL, store=None, lease=None):
         super().__init__(name="SystemMonitor", daemon=True)
         self._socketio      = socketio
         self._poll_interval = poll_interval
+        self._store         = store
+        self._lease         = lease
         self._stop_event    = threading.Event()
 
+        self._lock          = threading.Lock()
+        self._latest: list[tuple] = []
+        self._history: deque = deque(
+            maxlen=max(1, (HISTORY_MINUTES * 60) // max(1, poll_interval))
+        )
+        self._ticks         = 0
+        self._errors        = 0
+        self._last_tick     = None      # monotonic end of the last completed tick
+        self._last_tick_s   = 0.0
+
     # ── Public API ─────────────────────────────────────────────────────────────
 
     def stop(self):
         """Signal the monitor loop to exit cleanly."""
         self._stop_event.set()
 
+    def latest_metrics(self) -> list[tuple]:
+        """Return the raw (metric_name, metric_value, unit) tuples of the last tick."""
+        with self._lock:
+            return list(self._latest)
+
+    def latest_summary(self) -> dict:
+        """Return the summary of the last tick, or an empty dict before the first one."""
+        with self._lock:
+            return self._history[-1] if self._history else {}
+
+    def history(self, minutes: int = HISTORY_MINUTES) -> list[dict]:
+        """Return the summaries recorded in the last *minutes*, oldest first."""
+        keep = max(0, (minutes * 60) // max(1, self._poll_interval))
+        with self._lock:
+            items = list(self._history)
+        return items[-keep:] if keep else []
+
+    def stats(self) -> dict:
+        """Liveness for /health: is the loop running, and how long since it last completed a tick."""
+        with self._lock:
+            last_tick = self._last_tick
+            stats = {"ticks": self._ticks, "errors": self._errors,
+                     "last_tick_s": round(self._last_tick_s, 2)}
+        stats["alive"] = self.is_alive() and not self._stop_event.is_set()
+        stats["leader"] = self._lease.held if self._lease is not None else True
+        stats["interval_s"] = self._poll_interval
+        stats["last_tick_ago_s"] = round(time.monotonic() - last_tick, 1) if last_tick else None
+        return stats
+
     def run(self):
         logger.info("SystemMonitor started (interval=%ds)", self._poll_interval)
         while not self._stop_event.is_set():
             try:
-                self._tick()
+                self._step()
             except Exception as exc:
                 # Never let an unhandled exception kill the monitor thread.
                 logger.error("SystemMonitor tick error: %s", exc, exc_info=True)
+                with self._lock:
+                    self._errors += 1
             self._stop_event.wait(timeout=self._poll_interval)
         logger.info("SystemMonitor stopped")
 
     # ── Internal ───────────────────────────────────────────────────────────────
 
+    def _step(self):
+        if self._lease is None or self._lease.acquire():
+            self._tick()
+        else:
+            self._follow()
+
     def _tick(self):
         t0 = time.monotonic()
 
@@ -288,13 +375,37 @@ class SystemMonitor(threading.Thread):
         container_metrics = _collect_container_metrics()
         all_metrics       = host_metrics + container_metrics
 
+        summary = _summarise(all_metrics)
+        with self._lock:
+            self._latest = all_metrics
+            self._history.append(summary)
+
         _bulk_insert(all_metrics)
 
+        if self._store is not None:
+            self._store.set(SUMMARY_KEY, json.dumps(summary), ttl=3 * self._poll_interval)
         if self._socketio:
-            _broadcast(self._socketio, all_metrics)
+            _broadcast(self._socketio, summary)
 
         elapsed = time.monotonic() - t0
+        with self._lock:
+            self._ticks      += 1
+            self._last_tick   = time.monotonic()
+            self._last_tick_s = elapsed
         logger.debug(
             "SystemMonitor tick: %d metrics collected in %.2fs",
             len(all_metrics), elapsed
-        )
\ No newline at end of file
+        )
+
+    def _follow(self):
+        """Not the leader: take the leader's latest summary into our history, once."""
+        raw = self._store.get(SUMMARY_KEY) if self._store is not None else None
+        if not raw:
+            return
+        summary = json.loads(raw)
+        with self._lock:
+            if self._history and self._history[-1].get("timestamp") == summary.get("timestamp"):
+                return
+            self._history.append(summary)
+            self._ticks     += 1
+            self._last_tick  = time.monotonic()
\ No newline at end of file
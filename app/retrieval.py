@@ -0,0 +1,398 @@
+import io
+import os
+import re
+import math
+import time
+import heapq
+import tarfile
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from aicontext import FileChunks, estimate_tokens
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+RETRIEVAL_K         = int(os.getenv("AI_RETRIEVAL_K",              5))       # snippets per prompt
+RETRIEVAL_TOKENS    = int(os.getenv("AI_RETRIEVAL_TOKENS",         2000))    # budget for snippets
+INDEX_MAX_PROJECTS  = int(os.getenv("AI_INDEX_MAX_PROJECTS",       32))      # per worker, LRU
+INDEX_MAX_FILES     = int(os.getenv("AI_INDEX_MAX_FILES",          2000))
+INDEX_MAX_FILE_KB   = int(os.getenv("AI_INDEX_MAX_FILE_KB",        256))
+INDEX_MAX_MB        = float(os.getenv("AI_INDEX_MAX_MB",           8))       # text kept per project
+INDEX_REFRESH       = int(os.getenv("AI_INDEX_REFRESH",            300))     # seconds between rescans
+CHUNK_LINES         = 40                                                     # for code outside definitions
+FETCH_BATCH         = 200                                                    # paths per tar call
+
+WORKSPACE = "/workspace"
+SKIP_DIRS = (".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build",
+             ".next", ".cache", "target", ".mypy_cache", ".pytest_cache")
+TEXT_EXTENSIONS = frozenset((
+    "py", "js", "jsx", "ts", "tsx", "mjs", "go", "rs", "java", "kt", "scala", "swift", "c", "h",
+    "cc", "cpp", "hpp", "cs", "rb", "php", "sh", "sql", "html", "css", "scss", "vue", "svelte",
+    "md", "txt", "rst", "json", "yaml", "yml", "toml", "ini", "cfg",
+))
+
+BM25_K1 = 1.2
+BM25_B  = 0.75
+
+_WORD_RE  = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_PART_RE  = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_STOPWORDS = frozenset((
+    "the", "an", "and", "or", "of", "to", "in", "is", "it", "for", "on", "be", "as", "at", "by",
+    "not", "with", "this", "that", "what", "how", "why", "does", "do", "can", "me", "my",
+    "self", "def", "return", "if", "else", "elif", "import", "from", "const", "let", "var",
+    "function", "class", "none", "true", "false", "null", "new",
+))
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def terms(text: str) -> list:
+    """Lower-cased identifiers plus their camelCase / snake_case parts, minus stopwords."""
+    out = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        if len(lower) > 1 and lower not in _STOPWORDS:
+            out.append(lower)
+        parts = _PART_RE.findall(word)
+        if len(parts) > 1:
+            out.extend(p for p in (p.lower() for p in parts) if len(p) > 1 and p not in _STOPWORDS)
+    return out
+
+
+def indexable(path: str) -> bool:
+    return path.rsplit(".", 1)[-1].lower() in TEXT_EXTENSIONS if "." in path else False
+
+
+def chunk_ranges(text: str) -> tuple:
+    """
+    (lines, [(first, last), ...]) – one chunk per top-level definition
+    (split if long) and CHUNK_LINES windows over everything between them.
+    """
+    chunks = FileChunks(text)
+    lines = chunks.lines
+    ranges, pos = [], 0
+    for d in sorted((d for d in chunks.definitions if d.indent == 0), key=lambda d: d.start):
+        if d.start < pos:
+            continue
+        ranges.extend((a, min(a + CHUNK_LINES, d.start) - 1) for a in range(pos, d.start, CHUNK_LINES))
+        ranges.extend((a, min(a + 2 * CHUNK_LINES, d.end + 1) - 1)
+                      for a in range(d.start, d.end + 1, 2 * CHUNK_LINES))
+        pos = d.end + 1
+    ranges.extend((a, min(a + CHUNK_LINES, len(lines)) - 1) for a in range(pos, len(lines), CHUNK_LINES))
+    return lines, [(a, b) for a, b in ranges if any(lines[i].strip() for i in range(a, b + 1))]
+
+
+@dataclass
+class Snippet:
+    path: str
+    start: int        # 1-based, inclusive
+    end: int
+    text: str
+    score: float
+
+
+# ── Index ──────────────────────────────────────────────────────────────────────
+
+class WorkspaceIndex:
+    """
+    BM25 over the chunks of one project's /workspace files. Files are added,
+    replaced and removed one at a time, so the index can be kept current
+    from file writes and from incremental rescans.
+    """
+
+    def __init__(self, max_bytes: float = INDEX_MAX_MB * 1024 * 1024):
+        self._lock      = threading.Lock()
+        self._max_bytes = max_bytes
+        self._files: dict = {}          # path → {sha, signature, lines, docs, bytes}
+        self._docs: dict  = {}          # doc id → (path, first, last, length, unique terms)
+        self._postings: dict = {}       # term → {doc id: tf}
+        self._next_id   = 0
+        self._total_len = 0
+        self._text_bytes = 0
+        self._skipped: dict = {}        # path → signature, files left out because of the size cap
+        self.build_ms   = None
+        self.scanned_at = None          # monotonic, last full listing
+        self.last_attempt = None        # monotonic, last scan started (even if the container was down)
+
+    # ── Updates ────────────────────────────────────────────────────────────────
+
+    def signature(self, path: str):
+        """Signature of the version last seen – indexed, or skipped for the size cap."""
+        with self._lock:
+            entry = self._files.get(path)
+            return entry["signature"] if entry else self._skipped.get(path)
+
+    def paths(self) -> set:
+        with self._lock:
+            return set(self._files) | set(self._skipped)
+
+    def update_file(self, path: str, text: str, signature=None) -> bool:
+        """(Re)index *path*; returns False if its content is unchanged or it doesn't fit."""
+        sha = hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            entry = self._files.get(path)
+            if entry and entry["sha"] == sha:
+                entry["signature"] = signature
+                return False
+        lines, ranges = chunk_ranges(text)
+        docs = [(first, last, terms("\n".join(lines[first:last + 1])) + terms(path))
+                for first, last in ranges]
+
+        with self._lock:
+            self._remove(path)
+            size = len(text)
+            if self._text_bytes + size > self._max_bytes:
+                self._skipped[path] = signature     # not re-fetched until it changes
+                return False
+            self._skipped.pop(path, None)
+            ids = []
+            for first, last, doc_terms in docs:
+                doc_id = self._next_id
+                self._next_id += 1
+                ids.append(doc_id)
+                counts: dict = {}
+                for term in doc_terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+                self._docs[doc_id] = (path, first, last, len(doc_terms), tuple(counts))
+                self._total_len += len(doc_terms)
+            self._files[path] = {"sha": sha, "signature": signature, "lines": lines,
+                                 "docs": ids, "bytes": size}
+            self._text_bytes += size
+        return True
+
+    def remove_file(self, path: str):
+        with self._lock:
+            if path in self._files:
+                self._skipped.clear()       # room freed: give skipped files another try
+            self._skipped.pop(path, None)
+            self._remove(path)
+
+    def _remove(self, path: str):
+        entry = self._files.pop(path, None)
+        if not entry:
+            return
+        self._text_bytes -= entry["bytes"]
+        for doc_id in entry["docs"]:
+            _, _, _, length, doc_terms = self._docs.pop(doc_id)
+            self._total_len -= length
+            for term in doc_terms:
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+
+    # ── Queries ────────────────────────────────────────────────────────────────
+
+    def search(self, query: str, k: int = RETRIEVAL_K, budget: int = RETRIEVAL_TOKENS,
+               exclude=()) -> list:
+        """Top *k* chunks by BM25 whose combined text fits in *budget* tokens."""
+        query_terms = set(terms(query))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not query_terms:
+                return []
+            avg_len = self._total_len / n or 1
+            scores: dict = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self._docs[doc_id][3]
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+
+            snippets, used = [], 0
+            for doc_id, score in heapq.nlargest(k * 4, scores.items(), key=lambda kv: kv[1]):
+                path, first, last = self._docs[doc_id][:3]
+                if path in exclude:
+                    continue
+                text = "\n".join(self._files[path]["lines"][first:last + 1]).strip("\n")
+                cost = estimate_tokens(text) + 16
+                if used + cost > budget:
+                    continue
+                used += cost
+                snippets.append(Snippet(path, first + 1, last + 1, text, round(score, 3)))
+                if len(snippets) >= k:
+                    break
+        return snippets
+
+    def stats(self) -> dict:
+        with self._lock:
+            postings = sum(len(p) for p in self._postings.values())
+            # Rough CPython footprint: text, plus dict entries for postings and docs.
+            approx = self._text_bytes + postings * 110 + len(self._postings) * 120 + len(self._docs) * 200
+            return {
+                "files":     len(self._files),
+                "chunks":    len(self._docs),
+                "terms":     len(self._postings),
+                "skipped":   len(self._skipped),
+                "text_kb":   round(self._text_bytes / 1024, 1),
+                "approx_mb": round(approx / 1024**2, 2),
+                "build_ms":  self.build_ms,
+                "age_s":     round(time.monotonic() - self.scanned_at) if self.scanned_at else None,
+            }
+
+
+# ── Workspace scan ─────────────────────────────────────────────────────────────
+
+def _list_files(container) -> dict:
+    """path → (size, mtime) for indexable files under /workspace."""
+    prune = " -o ".join(f"-name {d}" for d in SKIP_DIRS)
+    cmd = (f"cd {WORKSPACE} && find . \\( {prune} \\) -prune -o -type f "
+           f"-size -{INDEX_MAX_FILE_KB}k -printf '%P\\t%s\\t%T@\\n' 2>/dev/null")
+    result = container.exec_run(cmd=["sh", "-c", cmd], demux=False)
+    listing = {}
+    for line in result.output.decode("utf-8", errors="replace").splitlines():
+        parts = line.split("\t")
+        if len(parts) == 3 and indexable(parts[0]):
+            listing[parts[0]] = (parts[1], parts[2])
+            if len(listing) >= INDEX_MAX_FILES:
+                break
+    return listing
+
+
+def _fetch_files(container, paths: list):
+    """Yield (path, text) for *paths*, read with one tar call per batch."""
+    for i in range(0, len(paths), FETCH_BATCH):
+        batch = paths[i:i + FETCH_BATCH]
+        result = container.exec_run(
+            cmd=["sh", "-c", f'tar -cf - -C {WORKSPACE} -- "$@" 2>/dev/null', "sh", *batch],
+            demux=False,
+        )
+        try:
+            archive = tarfile.open(fileobj=io.BytesIO(result.output))
+            for member in archive:
+                if not member.isfile():
+                    continue
+                data = archive.extractfile(member).read()
+                if b"\0" in data[:1024]:
+                    continue                                    # binary
+                yield member.name, data.decode("utf-8", errors="replace")
+        except tarfile.TarError as exc:
+            logger.warning("retrieval: could not read batch from %s – %s", container.name, exc)
+
+
+def scan_workspace(container, index: WorkspaceIndex) -> dict:
+    """
+    Bring *index* up to date with the container's /workspace: list files
+    with size and mtime, fetch only new or changed ones, drop deleted ones.
+    """
+    start = time.perf_counter()
+    listing = _list_files(container)
+    removed = index.paths() - set(listing)
+    for path in removed:
+        index.remove_file(path)
+    changed = [p for p, sig in listing.items() if index.signature(p) != sig]
+    updated = 0
+    for path, text in _fetch_files(container, changed):
+        updated += index.update_file(path, text, signature=listing.get(path))
+    index.scanned_at = time.monotonic()
+    index.build_ms = round((time.perf_counter() - start) * 1000, 1)
+    return {"listed": len(listing), "fetched": len(changed), "updated": updated, "removed": len(removed)}
+
+
+# ── Registry ───────────────────────────────────────────────────────────────────
+
+class RetrievalRegistry:
+    """
+    One WorkspaceIndex per project, least recently used dropped beyond
+    *max_projects*. ensure() starts a background scan when an index is
+    missing or older than *refresh* seconds; queries never wait for it.
+    """
+
+    def __init__(self, spawn, max_projects: int = INDEX_MAX_PROJECTS, refresh: float = INDEX_REFRESH):
+        self._spawn    = spawn              # e.g. socketio.start_background_task
+        self._max      = max_projects
+        self._refresh  = refresh
+        self._lock     = threading.Lock()
+        self._indexes: OrderedDict = OrderedDict()
+        self._scanning: set = set()
+        self.query_latency = LatencyHistogram()
+        self._counters = {"scans": 0, "scan_errors": 0, "queries": 0, "file_updates": 0}
+
+    def get(self, project_id):
+        with self._lock:
+            index = self._indexes.get(project_id)
+            if index is not None:
+                self._indexes.move_to_end(project_id)
+            return index
+
+    def ensure(self, project_id, container_factory) -> WorkspaceIndex:
+        """Return the project's index, scanning in the background if it is missing or stale."""
+        with self._lock:
+            index = self._indexes.get(project_id)
+            if index is None:
+                index = self._indexes[project_id] = WorkspaceIndex()
+                while len(self._indexes) > self._max:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(project_id)
+            last = index.last_attempt
+            stale = last is None or time.monotonic() - last >= self._refresh
+            if not stale or project_id in self._scanning:
+                return index
+            self._scanning.add(project_id)
+        self._spawn(self._scan, project_id, index, container_factory)
+        return index
+
+    def file_changed(self, project_id, path: str, text: str):
+        """Keep an existing index current with content seen through the file API."""
+        index = self.get(project_id)
+        if index is not None and indexable(path) and len(text) <= INDEX_MAX_FILE_KB * 1024:
+            if index.update_file(path, text):
+                self._count("file_updates")
+
+    def drop(self, project_id):
+        with self._lock:
+            self._indexes.pop(project_id, None)
+
+    def search(self, project_id, query: str, **kwargs) -> list:
+        index = self.get(project_id)
+        if index is None:
+            return []
+        start = time.perf_counter()
+        snippets = index.search(query, **kwargs)
+        self.query_latency.observe((time.perf_counter() - start) * 1000)
+        self._count("queries")
+        return snippets
+
+    def stats(self, projects=None) -> dict:
+        """Registry counters; per-index stats only for *projects* (ids as strings) when given."""
+        with self._lock:
+            counters = dict(self._counters)
+            indexes = list(self._indexes.items())
+            counters["scanning"] = len(self._scanning)
+        counters["projects"] = {str(pid): index.stats() for pid, index in indexes
+                                if projects is None or str(pid) in projects}
+        counters["query_latency"] = self.query_latency.snapshot()
+        return counters
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _scan(self, project_id, index: WorkspaceIndex, container_factory):
+        index.last_attempt = time.monotonic()
+        try:
+            container = container_factory()
+            if container is None or container.status != "running":
+                return
+            result = scan_workspace(container, index)
+            self._count("scans")
+            logger.info("retrieval: project %s indexed in %.0f ms (%s)",
+                        project_id, index.build_ms, result)
+        except Exception as exc:
+            self._count("scan_errors")
+            logger.warning("retrieval: scan of project %s failed – %s", project_id, exc)
+        finally:
+            with self._lock:
+                self._scanning.discard(project_id)
@@ -3,6 +3,7 @@
 
   let _isOpen = false;
   let _isSending = false;
+  let _controller = null;
   let _messageCount = 0;
   let _sessionStart = Date.now();
 
@@ -28,6 +29,20 @@
     return '';
   }
 
+  // Cursor and selection in code_context's numbering (the language header is line 1).
+  function _collectFocus() {
+    const editor = window._monacoEditor;
+    if (!editor) return {};
+    const focus = {};
+    const pos = editor.getPosition?.();
+    if (pos) focus.cursor_line = pos.lineNumber + 1;
+    const sel = editor.getSelection?.();
+    if (sel && !sel.isEmpty()) {
+      focus.selection = { start_line: sel.startLineNumber + 1, end_line: sel.endLineNumber + 1 };
+    }
+    return focus;
+  }
+
   function toggle() {
     _isOpen = !_isOpen;
     const sidebar = $('aiSidebar');
@@ -40,6 +55,8 @@
     if (overlay) overlay.classList.toggle('visible', _isOpen);
     if (fab) fab.setAttribute('aria-expanded', _isOpen);
 
+    if (!_isOpen) cancel();
+
     if (_isOpen) {
       setTimeout(() => {
         const ta = $('aiQuery');
@@ -127,6 +144,34 @@
     requestAnimationFrame(() => { el.scrollTop = el.scrollHeight; });
   }
 
+  function cancel() {
+    if (_controller) _controller.abort();
+  }
+
+  // Parse a text/event-stream body, calling onEvent(name, data) per frame.
+  async function _readEvents(resp, onEvent) {
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = 'message';
+        let data = '';
+        frame.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        if (data) onEvent(event, JSON.parse(data));
+      }
+    }
+  }
+
   async function sendQuery(options = {}) {
     const {
       query,
@@ -147,51 +192,80 @@
 
     appendMessage(messagesId, 'user', query.trim());
 
-    const typingId = appendTypingIndicator(messagesId);
+    let typingId = appendTypingIndicator(messagesId);
 
     const codeContext = useContext ? _collectContext() : '';
+    const focus = useContext ? _collectFocus() : {};
+    const controller = new AbortController();
+    _controller = controller;
+
+    let text = '';
+    let replyId = null;
+    let renderPending = false;
+
+    const render = () => {
+      renderPending = false;
+      const bubble = replyId && $(replyId)?.querySelector('.ai-msg-bubble');
+      if (bubble) bubble.innerHTML = _renderContent(text, true);
+      const container = $(messagesId);
+      if (container) _scrollToBottom(container);
+    };
 
     try {
-      const resp = await fetch('/api/ai/assist', {
+      const resp = await fetch('/api/ai/assist/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           user_query: query.trim(),
           code_context: codeContext,
+          ...focus,
         }),
+        signal: controller.signal,
       });
 
-      removeTypingIndicator(typingId);
-
       if (!resp.ok) {
-        const errText = `HTTP ${resp.status}: ${resp.statusText}`;
+        removeTypingIndicator(typingId);
+        const data = await resp.json().catch(() => ({}));
+        const errText = data.error || `HTTP ${resp.status}: ${resp.statusText}`;
         appendMessage(messagesId, 'assistant', `⚠️ **Request failed:** ${errText}`, true);
         onError?.(errText);
         return;
       }
 
-      const data = await resp.json();
-
-      if (data.success) {
-        appendMessage(messagesId, 'assistant', data.suggestion, true);
-
-        if (modelBadgeId && data.model) {
-          const badge = $(modelBadgeId);
-          if (badge) badge.textContent = data.model;
-        }
-
-        if (data.usage?.prompt_tokens) {
-          _appendUsageHint(messagesId, data.usage);
+      await _readEvents(resp, (event, data) => {
+        if (event === 'meta') {
+          const badge = modelBadgeId && $(modelBadgeId);
+          if (badge && data.model) badge.textContent = data.model;
+        } else if (event === 'token') {
+          text += data.text;
+          if (!replyId) {
+            removeTypingIndicator(typingId);
+            typingId = null;
+            replyId = appendMessage(messagesId, 'assistant', text, true);
+          } else if (!renderPending) {
+            renderPending = true;
+            requestAnimationFrame(render);
+          }
+        } else if (event === 'done') {
+          render();
+          if (data.usage?.prompt_tokens) _appendUsageHint(messagesId, data.usage, data);
+          onSuccess?.({ success: true, suggestion: text, ...data });
+        } else if (event === 'error') {
+          removeTypingIndicator(typingId);
+          const errMsg = data.error || 'Unknown error occurred.';
+          appendMessage(messagesId, 'assistant', `⚠️ **Error:** ${errMsg}`, true);
+          onError?.(errMsg);
         }
-
-        onSuccess?.(data);
-      } else {
-        const errMsg = data.error || 'Unknown error occurred.';
-        appendMessage(messagesId, 'assistant', `⚠️ **Error:** ${errMsg}`, true);
-        onError?.(errMsg);
-      }
+      });
     } catch (err) {
       removeTypingIndicator(typingId);
+      if (err.name === 'AbortError') {
+        if (replyId) {
+          text += '\n\n_⏹ Stopped._';
+          render();
+        }
+        return;
+      }
       appendMessage(
         messagesId,
         'assistant',
@@ -200,12 +274,13 @@
       );
       onError?.(err.message);
     } finally {
+      if (_controller === controller) _controller = null;
       _isSending = false;
       if (sendBtn) sendBtn.disabled = false;
     }
   }
 
-  function _appendUsageHint(containerId, usage) {
+  function _appendUsageHint(containerId, usage, timing = {}) {
     const container = $(containerId);
     if (!container) return;
     const hint = document.createElement('div');
@@ -216,7 +291,11 @@
       text-align: right;
       padding: 0 0.25rem 0.25rem;
     `;
-    hint.textContent = `${usage.prompt_tokens ?? '?'} prompt · ${usage.candidates_tokens ?? '?'} response tokens`;
+    const timings = timing.ttft_ms != null
+      ? ` · first token ${Math.round(timing.ttft_ms)} ms · ${(timing.total_ms / 1000).toFixed(1)} s`
+      : '';
+    const source = timing.cached ? ' · cached' : '';
+    hint.textContent = `${usage.prompt_tokens ?? '?'} prompt · ${usage.candidates_tokens ?? '?'} response tokens${timings}${source}`;
     container.appendChild(hint);
   }
 
@@ -364,6 +443,7 @@
     open,
     close,
     sendQuery,
+    cancel,
     appendMessage,
     registerContextProvider,
     _injectPrompt,  
@@ -4,6 +4,7 @@
   const CIRC = 2 * Math.PI * 45;
   const MAX_SPARK = 30;
   const POLL_MS = 5000;
+  const HISTORY_MINUTES = 10;
   const SPARK_COLORS = {
     cpu: '#00ccff',
     mem: '#9d6fff',
@@ -112,8 +113,9 @@
 
   function applyMetrics(m) {
     /* ── Host-level metrics ── */
-    const cpu = +m.cpu_usage || +m.cpu || 0;
-    const mem = +m.memory_usage || +m.memory || 0;
+    const host = m.host || {};
+    const cpu = +m.cpu_usage || +m.cpu || +host.cpu_percent || 0;
+    const mem = +m.memory_usage || +m.memory || +host.mem_percent || 0;
     const disk = +m.disk_usage || +m.disk || 0;
     const netRaw = +m.network_kbps || +m.net || 0;
     const netPct = Math.min((netRaw / 500) * 100, 100); // 500 KB/s → 100 %
@@ -206,6 +208,19 @@
       }
     });
 
+    /* Backfill from the server's in-memory history, oldest point first */
+    sock.on('metrics_history', (data) => {
+      const points = (data && data.points) || [];
+      if (!points.length) return;
+      _usingRealData = true;
+      points.slice(-MAX_SPARK).forEach(applyMetrics);
+    });
+
+    /* Ask for the latest snapshot + recent history as soon as we're connected */
+    const requestBackfill = () => sock.emit('request_metrics', { minutes: HISTORY_MINUTES });
+    if (sock.connected) requestBackfill();
+    sock.on('connect', requestBackfill);
+
     /* Request an immediate metrics push from the server */
     setInterval(() => {
       if (sock.connected) sock.emit('request_metrics');
@@ -2,7 +2,8 @@
 
 let term = null;
 let fitAddon = null;
-let _logViewerState = { containerId: null, containerName: null };
+let _terminalRejoin = null;
+let _logViewerState = { containerId: null, containerName: null, cursor: null, controller: null };
 
 document.addEventListener('DOMContentLoaded', () => {
   loadContainers();
@@ -244,8 +245,84 @@ async function _executeContainerAction(containerId, action, containerName, butto
   }
 }
 
+function bulkContainerAction(action) {
+  const verb = action.charAt(0).toUpperCase() + action.slice(1);
+  dynamicConfirm(
+    `${verb} All Containers`,
+    `${verb} <strong>all</strong> of your workspace containers?`,
+    () => _executeBulkAction(action)
+  );
+}
+
+async function _executeBulkAction(action) {
+  const button = document.getElementById('stopAllBtn');
+  const originalHTML = button ? button.innerHTML : '';
+  if (button) {
+    button.disabled = true;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin"></i><span>Working…</span>';
+  }
+
+  try {
+    const response = await fetch('/api/containers/bulk-action', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ action, container_ids: 'all' }),
+    });
+    if (!response.ok) {
+      const data = await response.json().catch(() => ({}));
+      throw new Error(data.error || `HTTP ${response.status}`);
+    }
+
+    // One NDJSON record per container as it finishes, then a summary.
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let pending = '';
+    let summary = null;
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      pending += decoder.decode(value, { stream: true });
+      const records = pending.split('\n');
+      pending = records.pop();
+      for (const record of records) {
+        if (!record) continue;
+        const msg = JSON.parse(record);
+        if (msg.done) {
+          summary = msg;
+        } else if (!msg.success) {
+          showToast(`${msg.name || msg.id}: ${msg.error}`, 'error');
+        }
+      }
+    }
+
+    if (summary) {
+      const actionLabels = { stop: 'stopped', restart: 'restarted', delete: 'deleted' };
+      const n = summary.succeeded;
+      showToast(`${n} container${n !== 1 ? 's' : ''} ${actionLabels[action] || action}` +
+                (summary.failed ? `, ${summary.failed} failed.` : '.'),
+                summary.failed ? 'error' : 'success');
+    }
+    loadContainers();
+  } catch (error) {
+    console.error(`Error performing bulk ${action}:`, error);
+    showToast(`Bulk ${action} failed: ${error.message}`, 'error');
+  } finally {
+    if (button) {
+      button.disabled = false;
+      button.innerHTML = originalHTML;
+    }
+  }
+}
+
+const LOG_VIEWER_MAX_LINES = 5000;
+
 async function viewLogs(containerId, containerName) {
-  _logViewerState = { containerId, containerName };
+  // Resume from the last line we showed when retrying the same container.
+  const resume = _logViewerState.containerId === containerId ? _logViewerState.cursor : null;
+  if (_logViewerState.controller) _logViewerState.controller.abort();
+  const controller = new AbortController();
+  _logViewerState = { containerId, containerName, cursor: resume, controller };
 
   const overlay = document.getElementById('logViewerOverlay');
   const subtitleEl = document.getElementById('logViewerSubtitle');
@@ -258,6 +335,7 @@ async function viewLogs(containerId, containerName) {
   loadingState.style.display = 'flex';
   errorState.style.display = 'none';
   outputEl.style.display = 'none';
+  if (!resume) outputEl.textContent = '';
   metaEl.textContent = '—';
 
   // Force display override to bypass CSS class issues
@@ -265,23 +343,69 @@ async function viewLogs(containerId, containerName) {
   overlay.classList.add('active', 'visible');
   document.body.style.overflow = 'hidden';
 
-  try {
-    const response = await fetch(`/api/containers/${containerId}/logs`);
-    const data = await response.json();
+  const params = new URLSearchParams({ follow: '1', tail: '500' });
+  if (resume) params.set('cursor', resume);
 
-    if (!data.success) throw new Error(data.error || 'Failed to fetch logs');
+  let lineCount = outputEl.textContent ? outputEl.textContent.split('\n').length - 1 : 0;
+  let dropped = 0;
 
-    const rawLogs = data.logs || '(no output)';
+  const updateMeta = (live) => {
+    const gap = dropped ? ` · ${dropped.toLocaleString()} skipped` : '';
+    metaEl.textContent =
+      `${lineCount.toLocaleString()} line${lineCount !== 1 ? 's' : ''}${gap}${live ? ' · live' : ''}`;
+  };
+
+  const append = (text) => {
+    const atBottom = outputEl.scrollTop + outputEl.clientHeight >= outputEl.scrollHeight - 4;
+    outputEl.textContent += text;
+    if (lineCount > LOG_VIEWER_MAX_LINES) {
+      const lines = outputEl.textContent.split('\n');
+      outputEl.textContent = lines.slice(-LOG_VIEWER_MAX_LINES - 1).join('\n');
+      lineCount = LOG_VIEWER_MAX_LINES;
+    }
+    if (atBottom) outputEl.scrollTop = outputEl.scrollHeight;
+  };
+
+  try {
+    const response = await fetch(`/api/containers/${containerId}/logs?${params}`,
+                                 { signal: controller.signal });
+    if (!response.ok) {
+      const data = await response.json().catch(() => ({}));
+      throw new Error(data.error || `HTTP ${response.status}`);
+    }
 
     loadingState.style.display = 'none';
     outputEl.style.display = 'block';
-    outputEl.textContent = rawLogs;
-    outputEl.scrollTop = outputEl.scrollHeight;
-
-    const lineCount = rawLogs.split('\n').length;
-    metaEl.textContent = `${lineCount.toLocaleString()} line${lineCount !== 1 ? 's' : ''}`;
+    updateMeta(true);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let pending = '';
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      pending += decoder.decode(value, { stream: true });
+      const records = pending.split('\n');
+      pending = records.pop();
+
+      let text = '';
+      for (const record of records) {
+        if (!record) continue;                       // keep-alive
+        const msg = JSON.parse(record);
+        if (msg.dropped) dropped += msg.dropped;
+        if (msg.line === undefined) continue;
+        text += msg.line + '\n';
+        lineCount += 1;
+        _logViewerState.cursor = msg.ts;
+      }
+      if (text) append(text);
+      updateMeta(true);
+    }
+    updateMeta(false);
 
   } catch (error) {
+    if (error.name === 'AbortError') return;
     loadingState.style.display = 'none';
     errorState.style.display = 'flex';
     document.getElementById('logErrorText').textContent = error.message;
@@ -299,7 +423,8 @@ function closeLogViewer() {
   overlay.style.display = 'none';
   overlay.classList.remove('active', 'visible');
   document.body.style.overflow = '';
-  _logViewerState = { containerId: null, containerName: null };
+  if (_logViewerState.controller) _logViewerState.controller.abort();
+  _logViewerState = { containerId: null, containerName: null, cursor: null, controller: null };
 }
 
 function copyLogs() {
@@ -353,7 +478,25 @@ function openTerminal(containerId, name) {
     socket.emit('terminal_join', { container_id: containerId });
     term.onData(data => socket.emit('terminal_input', { input: data }));
     socket.off('terminal_output');
-    socket.on('terminal_output', data => term.write(data.output));
+    /* Binary frames arrive as { data: ArrayBuffer, bytes }; ack once
+       rendered so the server keeps streaming (credit-based flow control). */
+    socket.on('terminal_output', data => {
+      if (!term) return;
+      if (data && data.replay) term.reset();
+      const ack = data && data.bytes
+        ? () => socket.emit('terminal_ack', { bytes: data.bytes })
+        : undefined;
+      if (data && data.data) {
+        term.write(new Uint8Array(data.data), ack);
+        return;
+      }
+      const text = typeof data === 'string' ? data : ((data && data.output) || '');
+      if (text || ack) term.write(text, ack);
+    });
+    /* A reconnect gets a new sid; rejoin to reattach to the same shell */
+    if (_terminalRejoin) socket.off('connect', _terminalRejoin);
+    _terminalRejoin = () => socket.emit('terminal_join', { container_id: containerId });
+    socket.on('connect', _terminalRejoin);
   } else {
     term.write('\r\n\x1b[31mError: Socket.IO connection not found.\x1b[0m\r\n');
   }
@@ -366,7 +509,11 @@ function closeTerminal() {
   const modal = document.getElementById('terminalModal');
   if (modal) modal.style.display = 'none';
   if (term) { term.dispose(); term = null; }
-  if (typeof socket !== 'undefined') socket.off('terminal_output');
+  if (typeof socket !== 'undefined') {
+    socket.off('terminal_output');
+    if (_terminalRejoin) socket.off('connect', _terminalRejoin);
+  }
+  _terminalRejoin = null;
 }
 
 function showToast(message, type = 'info') {
@@ -428,6 +575,7 @@ function escapeHtml(text) {
 Object.assign(window, {
   loadContainers,
   containerAction,
+  bulkContainerAction,
   viewLogs,
   closeLogViewer,
   retryLogFetch,
@@ -758,6 +758,7 @@ async function launchEnvironment(projectId, btnElement) {
       box.querySelector('.ssh-command').value = data.connection.ssh_command;
 
       showToast('Environment provisioned successfully!', 'success');
+      if (data.notice) showToast(data.notice, 'info');
     } else {
       throw new Error(data.error);
     }
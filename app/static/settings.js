@@ -78,10 +78,20 @@ class FormManager {
         location: document.getElementById('location').value
       };
 
-      setTimeout(() => {
-        showToast('Profile updated successfully!', 'success');
-        console.log('Profile data:', formData);
-      }, 500);
+      fetch('/api/account', {
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ username: formData.username, email: formData.email })
+      })
+        .then(res => res.json())
+        .then(data => {
+          if (data.success) {
+            showToast('Profile updated successfully!', 'success');
+          } else {
+            showToast(data.error || 'Profile update failed', 'error');
+          }
+        })
+        .catch(() => showToast('Profile update failed', 'error'));
     });
   }
 
@@ -111,10 +121,21 @@ class FormManager {
         return;
       }
 
-      setTimeout(() => {
-        showToast('Password updated successfully!', 'success');
-        form.reset();
-      }, 500);
+      fetch('/api/account/password', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ current_password: currentPassword, new_password: newPassword })
+      })
+        .then(res => res.json())
+        .then(data => {
+          if (data.success) {
+            showToast('Password updated successfully!', 'success');
+            form.reset();
+          } else {
+            showToast(data.error || 'Password update failed', 'error');
+          }
+        })
+        .catch(() => showToast('Password update failed', 'error'));
     });
   }
 
@@ -35,21 +35,34 @@
   let _resizeObserver = null;
   let _connected = false;
   let _outputListener = null;
+  let _reconnectListener = null;
 
 
   let _writeBuffer = [];
+  let _pendingAck = 0;
   let _writeRafId = null;
 
+  /* Chunks are strings or Uint8Arrays (binary frames). Once xterm has
+     rendered the last one, the byte count is acked so the server keeps
+     streaming (credit-based flow control). */
   function _flushWriteBuffer() {
     if (!_term || _writeBuffer.length === 0) { _writeRafId = null; return; }
-    const payload = _writeBuffer.join('');
+    const chunks = _writeBuffer;
+    const ackBytes = _pendingAck;
     _writeBuffer = [];
+    _pendingAck = 0;
     _writeRafId = null;
-    _term.write(payload);
+    chunks.forEach((chunk, i) => {
+      const done = (i === chunks.length - 1 && ackBytes)
+        ? () => { if (_socket) _socket.emit('terminal_ack', { bytes: ackBytes }); }
+        : undefined;
+      _term.write(chunk, done);
+    });
   }
 
-  function _bufferWrite(data) {
+  function _bufferWrite(data, ackBytes = 0) {
     _writeBuffer.push(data);
+    _pendingAck += ackBytes;
     if (!_writeRafId) {
       _writeRafId = requestAnimationFrame(_flushWriteBuffer);
     }
@@ -216,12 +229,30 @@
 
     _outputListener = (data) => {
       if (!_term) return;
+      if (data && data.replay) {
+        /* Reattached to a live shell: its scrollback replaces what we show */
+        _writeBuffer = [];
+        _pendingAck = 0;
+        _term.reset();
+      }
+      if (data && data.data) {
+        _bufferWrite(new Uint8Array(data.data), data.bytes || 0);
+        return;
+      }
       const text = typeof data === 'string' ? data : (data.output ?? '');
-      if (text) _bufferWrite(text);
+      if (text || data.bytes) _bufferWrite(text, data.bytes || 0);
     };
 
     _socket.on('terminal_output', _outputListener);
 
+    /* A reconnect gets a new sid; rejoin to reattach to the same shell */
+    if (!_reconnectListener) {
+      _reconnectListener = () => {
+        if (_connected && _containerId) _socket.emit('terminal_join', { container_id: _containerId });
+      };
+      _socket.on('connect', _reconnectListener);
+    }
+
     if (_term) {
       _term.writeln('\x1b[32m✓ Terminal attached — type to interact\x1b[0m\r\n');
     }
@@ -233,6 +264,10 @@
       _socket.off('terminal_output', _outputListener);
       _outputListener = null;
     }
+    if (_socket && _reconnectListener) {
+      _socket.off('connect', _reconnectListener);
+      _reconnectListener = null;
+    }
     if (_term) _term.writeln('\r\n\x1b[33m⟳ Disconnected.\x1b[0m');
   }
 
@@ -0,0 +1,157 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+REDIS_URL    = os.getenv("REDIS_URL", "")                # e.g. redis://redis:6379/0
+STORE_PREFIX = os.getenv("STORE_PREFIX", "cloudx:")      # namespace for every key this store writes
+
+try:
+    import redis as _redis
+    _REDIS_AVAILABLE = True
+except ImportError:
+    _redis = None
+    _REDIS_AVAILABLE = False
+
+
+# ── Stores ─────────────────────────────────────────────────────────────────────
+
+class MemoryStore:
+    """
+    Thread-safe in-process key/value store with per-key TTL.
+    Stand-in for Redis in single-worker deployments and in tests.
+    """
+
+    def __init__(self):
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ttl: float | None = None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        """Set *key* only if it is absent (or expired); True if this call set it."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > now):
+                return False
+            self._data[key] = (value, now + ttl if ttl else None)
+            return True
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def ping(self) -> dict:
+        return {"backend": "memory"}
+
+
+class RedisStore:
+    """
+    Same interface as MemoryStore, backed by the Redis service from
+    docker-compose so every worker shares one view. Redis errors are logged
+    and treated as cache misses – the store is never the source of truth.
+
+    Keys are namespaced under *prefix*: the database is shared with the
+    Socket.IO message queue, so clear() must only touch our own keys.
+    """
+
+    def __init__(self, url: str, prefix: str = STORE_PREFIX):
+        self._client = _redis.Redis.from_url(
+            url, socket_timeout=0.5, socket_connect_timeout=0.5, decode_responses=True
+        )
+        self._prefix = prefix
+
+    def get(self, key: str):
+        try:
+            return self._client.get(self._prefix + key)
+        except Exception as exc:
+            logger.warning("store: redis GET %s failed – %s", key, exc)
+            return None
+
+    def set(self, key: str, value, ttl: float | None = None):
+        try:
+            self._client.set(self._prefix + key, value, ex=int(ttl) if ttl else None)
+        except Exception as exc:
+            logger.warning("store: redis SET %s failed – %s", key, exc)
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        """SET NX; a Redis error counts as "someone else has it"."""
+        try:
+            return bool(self._client.set(self._prefix + key, value, ex=int(ttl) if ttl else None, nx=True))
+        except Exception as exc:
+            logger.warning("store: redis SET NX %s failed – %s", key, exc)
+            return False
+
+    def delete(self, *keys: str):
+        if not keys:
+            return
+        try:
+            self._client.delete(*(self._prefix + key for key in keys))
+        except Exception as exc:
+            logger.warning("store: redis DEL failed – %s", exc)
+
+    def clear(self):
+        """Delete every key under this store's prefix – never FLUSHDB."""
+        try:
+            batch = []
+            for key in self._client.scan_iter(match=self._prefix + "*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self._client.delete(*batch)
+                    batch = []
+            if batch:
+                self._client.delete(*batch)
+        except Exception as exc:
+            logger.warning("store: redis clear of %s* failed – %s", self._prefix, exc)
+
+    def ping(self) -> dict:
+        """Round trip to Redis for /health. Unlike the other methods, errors propagate."""
+        self._client.ping()
+        return {"backend": "redis"}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the process-wide shared store: RedisStore when REDIS_URL is set and
+    the redis client is installed, otherwise a MemoryStore.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if REDIS_URL and _REDIS_AVAILABLE:
+                    _store = RedisStore(REDIS_URL)
+                    logger.info("store: using Redis at %s", REDIS_URL)
+                else:
+                    if REDIS_URL:
+                        logger.warning("store: redis not installed, using in-memory store")
+                    _store = MemoryStore()
+    return _store
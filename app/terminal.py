@@ -0,0 +1,665 @@
+import os
+import time
+import codecs
+import select
+import logging
+import threading
+from collections import deque
+
+from metrics import LatencyHistogram
+
+try:
+    from socketio import PubSubManager as _PubSubManager
+except ImportError:                    # only the message-queue shortcut needs it
+    _PubSubManager = None
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ──────────────────────────────────────────────────────────────
+
+TERMINAL_BUFFER_BYTES   = int(os.getenv("TERMINAL_BUFFER_BYTES",      4096))        # flush threshold
+TERMINAL_FLUSH_INTERVAL = float(os.getenv("TERMINAL_FLUSH_INTERVAL",  0.05))        # seconds
+TERMINAL_MAX_UNACKED    = int(os.getenv("TERMINAL_MAX_UNACKED_BYTES", 256 * 1024))  # in-flight cap
+TERMINAL_SCROLLBACK     = int(os.getenv("TERMINAL_SCROLLBACK_BYTES",  64 * 1024))   # replay on reattach
+TERMINAL_DETACH_GRACE   = int(os.getenv("TERMINAL_DETACH_GRACE",      300))         # seconds
+TERMINAL_IDLE_TIMEOUT   = int(os.getenv("TERMINAL_IDLE_MINUTES",      30)) * 60     # seconds
+TERMINAL_MAX_PER_USER   = int(os.getenv("TERMINAL_MAX_PER_USER",      5))
+TERMINAL_MAX_TOTAL      = int(os.getenv("TERMINAL_MAX_TOTAL",         200))
+TERMINAL_REAP_INTERVAL  = int(os.getenv("TERMINAL_REAP_INTERVAL",     30))          # seconds
+TERMINAL_INPUT_WINDOW   = float(os.getenv("TERMINAL_INPUT_WINDOW",    0.005))       # coalescing window, s
+TERMINAL_INPUT_BATCH    = int(os.getenv("TERMINAL_INPUT_BATCH_BYTES", 4096))        # flush threshold
+
+READ_CHUNK = 4096
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def raw_socket(sock):
+    """Docker's exec_start(socket=True) wraps the real socket in a SocketIO object."""
+    return sock._sock if hasattr(sock, '_sock') else sock
+
+
+def emit_to_sid(socketio, event: str, payload, sid: str):
+    """
+    Emit *event* to one client. Behind a message queue, a client connected to
+    this worker is written to directly rather than round-tripping every
+    output frame through Redis; a client attached from another worker (a
+    relayed terminal) is still reached through the queue.
+    """
+    manager = getattr(getattr(socketio, "server", None), "manager", None)
+    if (_PubSubManager is not None and isinstance(manager, _PubSubManager)
+            and manager.is_connected(sid, "/")):
+        socketio.emit(event, payload, room=sid, ignore_queue=True)
+    else:
+        socketio.emit(event, payload, room=sid)
+
+
+# ── Scrollback ─────────────────────────────────────────────────────────────────
+
+class ScrollbackBuffer:
+    """Fixed-size byte ring buffer: keeps the most recent *capacity* bytes."""
+
+    def __init__(self, capacity: int = TERMINAL_SCROLLBACK):
+        self.capacity = capacity
+        self._buf     = bytearray(capacity)
+        self._start   = 0
+        self._size    = 0
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data: bytes):
+        n, cap = len(data), self.capacity
+        if not n or not cap:
+            return
+        if n >= cap:
+            self._buf[:] = data[-cap:]
+            self._start, self._size = 0, cap
+            return
+
+        end   = (self._start + self._size) % cap
+        first = min(n, cap - end)
+        self._buf[end:end + first] = data[:first]
+        self._buf[:n - first]      = data[first:]
+
+        overflow    = max(0, self._size + n - cap)
+        self._size  = min(cap, self._size + n)
+        self._start = (self._start + overflow) % cap
+
+    def getvalue(self) -> bytes:
+        end = self._start + self._size
+        if end <= self.capacity:
+            return bytes(self._buf[self._start:end])
+        return bytes(self._buf[self._start:]) + bytes(self._buf[:end - self.capacity])
+
+
+# ── TerminalSession ────────────────────────────────────────────────────────────
+
+class TerminalSession:
+    """
+    One interactive bash exec, attachable to one Socket.IO client at a time.
+
+    Output is emitted as ``terminal_output`` events carrying the raw bytes
+    (``{'data': bytes, 'bytes': n}``, sent as a binary frame). Clients that
+    want text attach with ``binary=False`` and get ``{'output': str, 'bytes': n}``
+    produced by an incremental UTF-8 decoder, so characters split across reads
+    are never mangled.
+
+    Flow control is credit based: the client acks the ``bytes`` of each frame
+    once rendered (``terminal_ack``). When TERMINAL_MAX_UNACKED bytes are in
+    flight the reader stops reading the exec socket, which pushes back on the
+    process in the container instead of queueing output in server memory.
+
+    Input is coalesced: a keystroke after a quiet period is written straight
+    away, but input arriving within TERMINAL_INPUT_WINDOW of the previous one
+    (paste bursts, fast typists on a laggy link) is batched into one write.
+    The time from a write to the next output frame leaving the server is
+    recorded as the session's keystroke-to-echo latency.
+
+    The session outlives its client: all output also goes into a scrollback
+    ring buffer, the reader keeps draining the exec while detached, and
+    attach() replays the scrollback (flagged ``replay``) before resuming.
+    """
+
+    def __init__(self, socketio, exec_sock, container_id: str, user_id=None,
+                 buffer_bytes: int = TERMINAL_BUFFER_BYTES,
+                 flush_interval: float = TERMINAL_FLUSH_INTERVAL,
+                 max_unacked: int = TERMINAL_MAX_UNACKED,
+                 scrollback_bytes: int = TERMINAL_SCROLLBACK,
+                 input_window: float = TERMINAL_INPUT_WINDOW,
+                 input_batch: int = TERMINAL_INPUT_BATCH,
+                 latency_sink: LatencyHistogram | None = None,
+                 on_close=None):
+        self.container_id = container_id
+        self.user_id      = user_id
+        self.sid          = None
+        self.created_at   = time.monotonic()
+        self.detached_at  = self.created_at
+        self.last_activity = self.created_at
+
+        self.bytes_in       = 0         # keystrokes written to the exec
+        self.bytes_out      = 0         # output read from the exec
+        self.ack_latency_ms = None      # EWMA of emit → client ack
+        self.reader_alive   = False
+        self.input_events   = 0         # terminal_input events received
+        self.input_writes   = 0         # writes actually issued to the exec
+        self.echo_latency   = LatencyHistogram()
+
+        self._socketio       = socketio
+        self._sock           = exec_sock
+        self._raw            = raw_socket(exec_sock)
+        self._decoder        = None
+        self._buffer_bytes   = buffer_bytes
+        self._flush_interval = flush_interval
+        self._max_unacked    = max_unacked
+        self._scrollback     = ScrollbackBuffer(scrollback_bytes)
+        self._on_close       = on_close
+
+        self._cond      = threading.Condition()
+        self._emit_lock = threading.Lock()      # orders scrollback writes vs. attach/replay
+        self._unacked   = 0
+        self._closed    = False
+
+        self._sent_total  = 0           # bytes emitted / acked since attach,
+        self._acked_total = 0           # used to time acks against emits
+        self._in_flight: deque = deque()
+
+        self._input_window    = input_window
+        self._input_batch     = input_batch
+        self._input_lock      = threading.Lock()
+        self._pending_input   = bytearray()
+        self._input_scheduled = False
+        self._last_input_at   = 0.0
+        self._echo_since      = None    # time of the first write not yet echoed
+        self._latency_sink    = latency_sink
+
+    # ── Public API ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        self._socketio.start_background_task(self._read_loop)
+
+    def attach(self, sid: str, binary: bool = True):
+        """Route output to *sid*, replaying the scrollback first."""
+        with self._emit_lock:
+            with self._cond:
+                self.sid      = sid
+                self._decoder = None if binary else codecs.getincrementaldecoder("utf-8")(errors="replace")
+                self._reset_credit()
+                self._cond.notify_all()
+            self._emit(self._scrollback.getvalue(), replay=True)
+
+    def detach(self, sid: str | None = None):
+        """Stop routing output to a client (only if still attached to *sid*, when given)."""
+        with self._emit_lock:
+            with self._cond:
+                if sid is not None and self.sid != sid:
+                    return
+                self.sid         = None
+                self.detached_at = time.monotonic()
+                self._reset_credit()
+                self._cond.notify_all()
+
+    def write(self, data: bytes):
+        now = time.monotonic()
+        with self._input_lock:
+            self.input_events  += 1
+            self.bytes_in      += len(data)
+            self.last_activity  = now
+            if self._echo_since is None:
+                self._echo_since = now
+
+            quiet = now - self._last_input_at >= self._input_window
+            self._last_input_at = now
+            self._pending_input += data
+
+            if (quiet and not self._input_scheduled) or len(self._pending_input) >= self._input_batch:
+                self._flush_input()
+            elif not self._input_scheduled:
+                self._input_scheduled = True
+                self._socketio.start_background_task(self._delayed_input_flush)
+
+    def ack(self, nbytes: int):
+        """Return *nbytes* of credit; wakes the reader if it was paused."""
+        now = time.monotonic()
+        with self._cond:
+            self._unacked = max(0, self._unacked - nbytes)
+            self._acked_total += nbytes
+            while self._in_flight and self._in_flight[0][0] <= self._acked_total:
+                _, sent_at = self._in_flight.popleft()
+                sample = (now - sent_at) * 1000
+                self.ack_latency_ms = (sample if self.ack_latency_ms is None
+                                       else 0.8 * self.ack_latency_ms + 0.2 * sample)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            self._raw.close()
+        except Exception:
+            pass
+        if self._on_close:
+            self._on_close(self)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def unacked(self) -> int:
+        return self._unacked
+
+    @property
+    def memory_bytes(self) -> int:
+        """Server-side buffers held for this session (scrollback is preallocated)."""
+        return self._scrollback.capacity + self._unacked
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "container_id":   self.container_id,
+            "attached":       self.sid is not None,
+            "age_s":          round(now - self.created_at, 1),
+            "idle_s":         round(now - self.last_activity, 1),
+            "bytes_in":       self.bytes_in,
+            "bytes_out":      self.bytes_out,
+            "unacked":        self._unacked,
+            "ack_latency_ms": round(self.ack_latency_ms, 2) if self.ack_latency_ms is not None else None,
+            "memory_bytes":   self.memory_bytes,
+            "input_events":   self.input_events,
+            "input_writes":   self.input_writes,
+            "echo_latency":   self.echo_latency.snapshot(),
+        }
+
+    # ── Internal ───────────────────────────────────────────────────────────────
+
+    def _flush_input(self):
+        """Caller holds _input_lock."""
+        if not self._pending_input:
+            return
+        data = bytes(self._pending_input)
+        self._pending_input.clear()
+        self._raw.sendall(data)
+        self.input_writes += 1
+
+    def _delayed_input_flush(self):
+        self._socketio.sleep(self._input_window)
+        with self._input_lock:
+            self._input_scheduled = False
+            if self._closed:
+                self._pending_input.clear()
+                return
+            try:
+                self._flush_input()
+            except Exception as exc:
+                logger.error("Terminal write error (container=%s): %s", self.container_id, exc)
+
+    def _observe_echo(self):
+        since = self._echo_since
+        if since is None:
+            return
+        self._echo_since = None
+        ms = (time.monotonic() - since) * 1000
+        self.echo_latency.observe(ms)
+        if self._latency_sink is not None:
+            self._latency_sink.observe(ms)
+
+    def _reset_credit(self):
+        """Caller holds _cond."""
+        self._unacked     = 0
+        self._sent_total  = 0
+        self._acked_total = 0
+        self._in_flight.clear()
+
+    def _emit(self, chunk: bytes, final: bool = False, replay: bool = False):
+        """Send *chunk* to the attached client, if any. Caller holds _emit_lock."""
+        if self.sid is None:
+            return
+        if self._decoder is None:
+            if not chunk and not replay:
+                return
+            payload = {"data": chunk, "bytes": len(chunk)}
+        else:
+            text = self._decoder.decode(chunk, final=final)
+            if not text and not chunk and not replay:
+                return
+            payload = {"output": text, "bytes": len(chunk)}
+        if replay:
+            payload["replay"] = True
+
+        with self._cond:
+            self._unacked += len(chunk)
+            if chunk:
+                self._sent_total += len(chunk)
+                self._in_flight.append((self._sent_total, time.monotonic()))
+        if chunk and not replay:
+            self._observe_echo()
+        emit_to_sid(self._socketio, "terminal_output", payload, self.sid)
+
+    def _output(self, chunk: bytes, final: bool = False):
+        with self._emit_lock:
+            self._scrollback.write(chunk)
+            self._emit(chunk, final=final)
+
+    def _wait_for_credit(self):
+        with self._cond:
+            while (self.sid is not None and self._unacked >= self._max_unacked
+                   and not self._closed):
+                self._cond.wait(timeout=1.0)
+
+    def _read_loop(self):
+        self.reader_alive = True
+        buf = bytearray()
+        last_flush = time.monotonic()
+
+        def flush(final: bool = False):
+            nonlocal buf, last_flush
+            if buf or final:
+                self._output(bytes(buf), final=final)
+            buf = bytearray()
+            last_flush = time.monotonic()
+
+        try:
+            while not self._closed:
+                if len(buf) == 0:
+                    self._wait_for_credit()
+                    if self._closed:
+                        break
+
+                now = time.monotonic()
+                time_until_flush = self._flush_interval - (now - last_flush)
+
+                readable, _, _ = select.select([self._raw], [], [], max(0.0, time_until_flush))
+
+                if readable:
+                    chunk = self._raw.recv(READ_CHUNK)
+                    if not chunk:
+                        # EOF – the container exec session ended
+                        break
+
+                    buf += chunk
+                    self.bytes_out += len(chunk)
+                    self.last_activity = time.monotonic()
+                    if len(buf) >= self._buffer_bytes:
+                        flush()
+                else:
+                    flush()
+
+        except Exception as exc:
+            if not self._closed:
+                logger.error("Terminal reader error (container=%s): %s", self.container_id, exc)
+        finally:
+            flush(final=True)
+            sid = self.sid
+            if sid is not None and not self._closed:
+                emit_to_sid(self._socketio, "terminal_exit", {"container_id": self.container_id}, sid)
+            self.close()
+            self.reader_alive = False
+            logger.debug("Terminal reader exited (container=%s)", self.container_id)
+
+
+# ── TerminalManager ────────────────────────────────────────────────────────────
+
+class TerminalLimitError(Exception):
+    """Raised when opening a session would exceed a per-user or global cap."""
+
+
+class TerminalManager:
+    """
+    Owns every TerminalSession in the worker.
+
+    Sessions are keyed by (user_id, container_id) and attached to at most one
+    Socket.IO sid. The manager enforces TERMINAL_MAX_PER_USER and
+    TERMINAL_MAX_TOTAL when opening, and a background reaper closes sessions
+    that have been detached for longer than TERMINAL_DETACH_GRACE or have seen
+    no input/output for TERMINAL_IDLE_TIMEOUT. *on_close* is called with each
+    session once it has closed, whatever closed it.
+
+    With *slots* (a cluster.SlotPool of max_per_user) every session also
+    holds a slot in the shared store, so the per-user cap spans workers; the
+    reaper refreshes them, so the pool's TTL must outlast reap_interval.
+    """
+
+    def __init__(self, socketio,
+                 max_per_user: int = TERMINAL_MAX_PER_USER,
+                 max_total: int = TERMINAL_MAX_TOTAL,
+                 detach_grace: float = TERMINAL_DETACH_GRACE,
+                 idle_timeout: float = TERMINAL_IDLE_TIMEOUT,
+                 reap_interval: float = TERMINAL_REAP_INTERVAL,
+                 on_close=None, slots=None):
+        self._socketio      = socketio
+        self._slots         = slots
+        self._on_close      = on_close
+        self._max_per_user  = max_per_user
+        self._max_total     = max_total
+        self._detach_grace  = detach_grace
+        self._idle_timeout  = idle_timeout
+        self._reap_interval = reap_interval
+
+        self._lock     = threading.Lock()
+        self._sessions: dict = {}       # (user_id, container_id) → TerminalSession
+        self._sids: dict     = {}       # sid → (user_id, container_id)
+        self._opening: dict  = {}       # (user_id, container_id) → user_id, exec being created
+        self._held: dict     = {}       # (user_id, container_id) → SharedSlot
+        self._reaper_started = False
+        self._stopping       = False
+        self._reaped         = {"idle": 0, "detached": 0}
+        self.echo_latency    = LatencyHistogram()      # across all sessions, ever
+
+    # ── Sessions ───────────────────────────────────────────────────────────────
+
+    def get(self, user_id, container_id):
+        with self._lock:
+            term = self._sessions.get((user_id, container_id))
+        return term if term and not term.closed else None
+
+    def open(self, user_id, container_id, exec_factory, **session_kwargs) -> TerminalSession:
+        """
+        Create and start a session. *exec_factory* is only called (and the
+        bash exec only created) once the caps have been checked.
+
+        The slot is reserved under the lock before the exec is created, so
+        concurrent opens can't overshoot the caps. A live session already
+        under the same key is returned instead of opening a second one.
+        """
+        key = (user_id, container_id)
+        with self._lock:
+            if self._stopping:
+                raise TerminalLimitError("Terminal service is shutting down.")
+            existing = self._sessions.get(key)
+            if existing is not None and not existing.closed:
+                return existing
+            if key in self._opening:
+                raise TerminalLimitError("This terminal is already opening, try again in a moment.")
+            live = [t.user_id for t in self._sessions.values() if not t.closed]
+            live.extend(self._opening.values())
+            if len(live) >= self._max_total:
+                raise TerminalLimitError("Server terminal capacity reached, try again later.")
+            if live.count(user_id) >= self._max_per_user:
+                raise TerminalLimitError(
+                    f"You already have {self._max_per_user} terminals open. Close one first."
+                )
+            self._opening[key] = user_id
+
+        slot = None
+        try:
+            if self._slots is not None:
+                slot = self._slots.acquire(user_id)
+                if slot is None:
+                    raise TerminalLimitError(
+                        f"You already have {self._max_per_user} terminals open. Close one first."
+                    )
+            exec_sock = exec_factory()
+            term = TerminalSession(self._socketio, exec_sock, container_id, user_id=user_id,
+                                   latency_sink=self.echo_latency, on_close=self._forget,
+                                   **session_kwargs)
+        except BaseException:
+            with self._lock:
+                del self._opening[key]
+            if slot is not None:
+                slot.release()
+            raise
+        with self._lock:
+            del self._opening[key]
+            previous = self._sessions.get(key)
+            stale = self._held.pop(key, None)
+            self._sessions[key] = term
+            if slot is not None:
+                self._held[key] = slot
+        if previous is not None:
+            previous.close()        # closed already, or closing; make sure of it
+        if stale is not None:
+            stale.release()
+        term.start()
+        self._ensure_reaper()
+        return term
+
+    def attach(self, sid: str, term: TerminalSession, binary: bool = True):
+        """Attach *sid* to *term*, detaching whatever either side was attached to."""
+        key = (term.user_id, term.container_id)
+        with self._lock:
+            previous_key = self._sids.get(sid)
+            previous_sid = term.sid
+            if previous_sid and previous_sid != sid:
+                self._sids.pop(previous_sid, None)
+            self._sids[sid] = key
+            other = self._sessions.get(previous_key) if previous_key not in (None, key) else None
+
+        if other:
+            other.detach(sid)
+        if previous_sid and previous_sid != sid:
+            emit_to_sid(self._socketio, "terminal_detached", {"container_id": term.container_id},
+                        previous_sid)
+        term.attach(sid, binary=binary)
+
+    def for_sid(self, sid: str):
+        with self._lock:
+            key = self._sids.get(sid)
+            return self._sessions.get(key) if key else None
+
+    def detach_sid(self, sid: str):
+        with self._lock:
+            key = self._sids.pop(sid, None)
+            term = self._sessions.get(key) if key else None
+        if term:
+            term.detach(sid)
+
+    def shutdown(self):
+        """Close every session and stop the reaper."""
+        with self._lock:
+            self._stopping = True
+            sessions = list(self._sessions.values())
+        for term in sessions:
+            term.close()
+        logger.info("TerminalManager stopped (%d sessions closed)", len(sessions))
+
+    # ── Stats ──────────────────────────────────────────────────────────────────
+
+    def container_ids(self) -> set:
+        """Containers that have at least one open session."""
+        with self._lock:
+            return {t.container_id for t in self._sessions.values() if not t.closed}
+
+    def session_keys(self) -> list:
+        """(user_id, container_id) of every open session."""
+        with self._lock:
+            return [key for key, t in self._sessions.items() if not t.closed]
+
+    def stats(self, user_id=None) -> dict:
+        """
+        Counts and memory for sizing hosts. With *user_id*, only that user's
+        sessions are listed (totals stay global).
+        """
+        with self._lock:
+            sessions = [t for t in self._sessions.values() if not t.closed]
+            reaped   = dict(self._reaped)
+        attached = sum(1 for t in sessions if t.sid is not None)
+
+        result = {
+            "sessions":       len(sessions),
+            "attached":       attached,
+            "detached":       len(sessions) - attached,
+            "readers_alive":  sum(1 for t in sessions if t.reader_alive),
+            "users":          len({t.user_id for t in sessions}),
+            "bytes_in":       sum(t.bytes_in for t in sessions),
+            "bytes_out":      sum(t.bytes_out for t in sessions),
+            "memory_bytes":   sum(t.memory_bytes for t in sessions),
+            "input_events":   sum(t.input_events for t in sessions),
+            "input_writes":   sum(t.input_writes for t in sessions),
+            "echo_latency":   self.echo_latency.snapshot(),
+            "reaped":         reaped,
+            "limits": {
+                "per_user":      self._max_per_user,
+                "total":         self._max_total,
+                "idle_timeout_s": self._idle_timeout,
+                "detach_grace_s": self._detach_grace,
+            },
+        }
+        if user_id is not None:
+            result["mine"] = [t.stats() for t in sessions if t.user_id == user_id]
+        return result
+
+    # ── Internal ───────────────────────────────────────────────────────────────
+
+    def _forget(self, term: TerminalSession):
+        key = (term.user_id, term.container_id)
+        with self._lock:
+            if self._sessions.get(key) is not term:
+                return
+            del self._sessions[key]
+            slot = self._held.pop(key, None)
+            for sid, k in list(self._sids.items()):
+                if k == key:
+                    del self._sids[sid]
+        if slot is not None:
+            slot.release()
+        if self._on_close:
+            try:
+                self._on_close(term)
+            except Exception as exc:
+                logger.error("TerminalManager on_close error: %s", exc)
+
+    def _ensure_reaper(self):
+        with self._lock:
+            if self._reaper_started:
+                return
+            self._reaper_started = True
+        self._socketio.start_background_task(self._reap_loop)
+
+    def _reap_loop(self):
+        while not self._stopping:
+            self._socketio.sleep(self._reap_interval)
+            try:
+                self.reap()
+            except Exception as exc:
+                logger.error("TerminalManager reap error: %s", exc, exc_info=True)
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            held = list(self._held.values())
+        for slot in held:
+            slot.refresh()
+
+        for term in sessions:
+            reason = None
+            if term.sid is None and now - term.detached_at >= self._detach_grace:
+                reason = "detached"
+            elif now - term.last_activity >= self._idle_timeout:
+                reason = "idle"
+            if not reason:
+                continue
+
+            sid = term.sid
+            if sid is not None:
+                emit_to_sid(self._socketio, "terminal_exit",
+                            {"container_id": term.container_id, "reason": reason}, sid)
+            logger.info("Reaping %s terminal for user %s on %s",
+                        reason, term.user_id, term.container_id)
+            with self._lock:
+                self._reaped[reason] += 1
+            term.close()
@@ -0,0 +1,55 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from activity import ActivityWriter
+
+
+def test_writer_batches_and_flushes_on_stop():
+    """Queued events are written in batches and flushed on shutdown"""
+    batches = []
+    writer = ActivityWriter({}, writer=lambda cfg, rows: batches.append(rows),
+                            batch_size=3, flush_interval=60)
+    writer.start()
+    for i in range(7):
+        assert writer.enqueue(1, f"action_{i}")
+    writer.stop()
+
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert batches[0][0][1] == "action_0"
+    assert writer.stats()["written"] == 7
+
+
+def test_writer_drops_when_full_and_counts_failures():
+    """A full queue drops events; a failing DB counts rows as failed"""
+    def broken(cfg, rows):
+        raise RuntimeError("db down")
+
+    writer = ActivityWriter({}, writer=broken, queue_size=2, flush_interval=60)
+    assert writer.enqueue(1, "a") and writer.enqueue(1, "b")
+    assert not writer.enqueue(1, "c")
+    writer._drain()
+
+    stats = writer.stats()
+    assert stats["dropped"] == 1
+    assert stats["failed"] == 2
+    assert stats["queue_depth"] == 0
+
+
+def test_on_flush_gets_the_committed_batch_users_only():
+    """on_flush sees each written batch's user ids; failed batches don't call it"""
+    flushed = []
+    writer = ActivityWriter({}, writer=lambda cfg, rows: None, flush_interval=60,
+                            on_flush=flushed.append)
+    for user_id in (1, 2, 1, None):
+        writer.enqueue(user_id, "page_view")
+    writer._drain()
+    assert flushed == [{1, 2}]
+
+    def broken(cfg, rows):
+        raise RuntimeError("db down")
+    writer = ActivityWriter({}, writer=broken, flush_interval=60, on_flush=flushed.append)
+    writer.enqueue(3, "page_view")
+    writer._drain()
+    assert flushed == [{1, 2}]
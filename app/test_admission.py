@@ -0,0 +1,59 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from admission import AdmissionController, AdmissionError, decide
+
+ROOMY = {"cpu_percent": 20.0, "mem_available_mb": 8192}
+
+
+def test_policy_downsizes_then_queues_as_memory_runs_out():
+    """Full size with headroom, smaller when tight, wait when nothing fits."""
+    assert decide(ROOMY, 0, 0).action == "admit"
+    tight = decide({"cpu_percent": 20.0, "mem_available_mb": 1024 + 300}, 0, 0)
+    assert (tight.action, tight.mem_mb) == ("downsize", 300)
+    assert decide({"cpu_percent": 90.0, "mem_available_mb": 8192}, 0, 0).cpus < 1.0
+    assert decide({"cpu_percent": 20.0, "mem_available_mb": 1100}, 0, 0).action == "queue"
+    assert decide(ROOMY, 0, 3, quota=3).action == "reject"
+
+
+def test_controller_counts_in_flight_launches_against_quota_and_memory():
+    """Tickets not yet released still hold quota and memory; queued launches time out."""
+    snapshot = lambda: ({"cpu_percent": 10.0, "mem_available_mb": 1024 + 600}, 0, {})
+    ctl = AdmissionController(snapshot, sleep=lambda s: None, queue_timeout=0)
+
+    first = ctl.admit("1")
+    assert first.mem_mb == 512
+    with pytest.raises(AdmissionError) as exc:
+        ctl.admit("2")                         # only 88 MB left for a second launch
+    assert exc.value.status == 503 and exc.value.retry_after
+
+    first.release()
+    with ctl.admit("2") as second:
+        assert second.mem_mb == 512
+    assert ctl.stats()["in_flight"] == 0
+
+
+def test_quota_counts_launches_in_flight_on_other_workers():
+    """With a shared SlotPool, two workers' controllers share one user's quota"""
+    from cluster import SlotPool
+    from store import MemoryStore
+
+    store = MemoryStore()
+    snapshot = lambda: ({"cpu_percent": 10.0, "mem_available_mb": 64_000}, 0, {"1": 1})
+    workers = [AdmissionController(snapshot, sleep=lambda s: None, queue_timeout=0,
+                                   slots=SlotPool(store, "launch", 3, ttl=60)) for _ in range(2)]
+
+    first = workers[0].admit("1")
+    second = workers[1].admit("1")             # one running + two launching = quota of 3
+    with pytest.raises(AdmissionError) as exc:
+        workers[0].admit("1")
+    assert exc.value.status == 429 and exc.value.reason == "quota"
+
+    second.release()
+    workers[0].admit("1").release()
+    first.release()
+    assert SlotPool(store, "launch", 3, ttl=60).count("1") == 0
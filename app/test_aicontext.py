@@ -0,0 +1,40 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aicontext import ChunkCache, build_context
+
+
+def _module(n_funcs=200):
+    parts = ["import os", "import sys", ""]
+    for i in range(n_funcs):
+        parts += [f"def helper_{i}(x):", f"    total = x + {i}", "    for _ in range(3):",
+                  "        total *= 2", "    return total", ""]
+    parts += ["class Service:", "    def run(self, x):", "        y = helper_7(x)",
+              "        return y + 1", ""]
+    return "\n".join(parts)
+
+
+def test_small_context_passes_through_unchanged():
+    """Anything within budget is sent as-is."""
+    ctx = build_context("print('hi')\n", budget=100, cache=ChunkCache())
+    assert not ctx.truncated and ctx.text == "print('hi')\n"
+
+
+def test_large_file_keeps_cursor_definitions_and_references():
+    """The enclosing method, its class header and referenced helpers survive the cut."""
+    src = _module()
+    lines = src.split("\n")
+    cursor = lines.index("        y = helper_7(x)") + 1
+    cache = ChunkCache()
+
+    ctx = build_context(src, "why is helper_42 slow?", cursor_line=cursor, budget=300, cache=cache)
+    assert ctx.truncated and ctx.tokens <= 300 < ctx.original_tokens
+    for needed in ("class Service:", "    def run(self, x):", "        return y + 1",
+                   "def helper_7(x):", "    total = x + 7", "def helper_42(x):", "import os"):
+        assert needed in ctx.text.split("\n"), needed
+    assert "⋯ lines" in ctx.text
+
+    build_context(src, "again", cursor_line=cursor, budget=300, cache=cache)
+    assert cache.stats() == {"hits": 1, "misses": 1, "files": 1}
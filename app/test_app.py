@@ -22,13 +22,25 @@ def test_home_page(client):
 
 def test_health_check(client):
     """Test the health check endpoint"""
+    import time
+    from app import socketio
+    deadline = time.monotonic() + 10            # the worker's first probe round runs in the background
     response = client.get('/health')
+    while response.get_json()['status'] == 'pending' and time.monotonic() < deadline:
+        socketio.sleep(0.05)                    # yields to the probe task under eventlet
+        response = client.get('/health')
     assert response.status_code == 200
     
     # Check if response is JSON
     json_data = response.get_json()
     assert json_data is not None
-    assert json_data['status'] == 'healthy'
+    # Docker and the other optional services may be missing here: degraded, not down
+    assert json_data['status'] in ('healthy', 'degraded')
+    assert json_data['components']['database']['status'] == 'healthy'
+    # Unauthenticated: statuses and latencies only, no worker or service internals
+    for component in json_data['components'].values():
+        assert set(component) <= {'status', 'latency_ms'}
+    assert 'terminals' not in json_data['components']
     assert 'timestamp' in json_data
     # CORRECTED: Updated assertion from 'CloudX Flask App' to the service name returned by app.py: 'CloudX Platform'
     assert json_data['service'] == 'CloudX Platform'
@@ -43,4 +55,160 @@ def test_dbtest_page_loads(client):
 def test_nonexistent_route(client):
     """Test that non-existent routes return 404"""
     response = client.get('/nonexistent-route')
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+
+def test_worker_services_start_after_fork_not_on_import():
+    """Importing app starts nothing; gunicorn's post_worker_init starts the monitor, bus and probes"""
+    import importlib.util
+    import app as app_module
+
+    assert app_module.system_monitor is None
+    spec = importlib.util.spec_from_file_location(
+        'gunicorn_conf', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+
+    conf.post_worker_init(worker=None)
+    assert app_module.system_monitor is not None and app_module.system_monitor.is_alive()
+    assert app_module._health_checker is not None
+    monitor = app_module.system_monitor
+    conf.post_worker_init(worker=None)          # idempotent
+    assert app_module.system_monitor is monitor
+
+
+def test_load_user_cache_hit_miss_and_invalidation(monkeypatch):
+    """load_user reads the row once, serves repeats from cache and refetches after invalidate"""
+    import json
+    import app as app_module
+    from store import get_store
+
+    reads = []
+    def get_by_id(user_id):
+        reads.append(user_id)
+        return app_module.User(user_id, 'alice', 'alice@example.com', 'pbkdf2:secret')
+    monkeypatch.setattr(app_module.User, 'get_by_id', staticmethod(get_by_id))
+    app_module.User.invalidate(4242)
+
+    user = app_module.load_user('4242')
+    assert reads == [4242] and user.username == 'alice'
+    assert user.password_hash is None
+    assert 'password_hash' not in json.loads(get_store().get('user:4242'))
+
+    assert app_module.load_user('4242') is user                 # per-worker hit
+    app_module._user_cache.pop(4242)
+    assert app_module.load_user('4242').email == 'alice@example.com'
+    assert reads == [4242]                                      # shared-store hit
+
+    app_module.User.invalidate(4242)
+    app_module.load_user('4242')
+    assert reads == [4242, 4242]
+    app_module.User.invalidate(4242)
+
+
+def test_dashboard_cache_dropped_when_activity_lands(client, monkeypatch):
+    """/api/dashboard is served from cache until the activity writer commits that user's rows"""
+    import app as app_module
+    from activity import ActivityWriter
+
+    monkeypatch.setattr(app_module.User, 'get_by_id',
+                        staticmethod(lambda uid: app_module.User(uid, 'bob', 'bob@example.com', 'x')))
+    computed = []
+    monkeypatch.setattr(app_module, 'get_dashboard_stats',
+                        lambda: computed.append(1) or {'total_activities': len(computed)})
+    app_module.invalidate_dashboard(4243)
+    with client.session_transaction() as sess:
+        sess['_user_id'] = '4243'
+        sess['_fresh'] = True
+
+    assert client.get('/api/dashboard').get_json()['total_activities'] == 1
+    assert client.get('/api/dashboard').get_json()['total_activities'] == 1
+    assert len(computed) == 1
+
+    writer = ActivityWriter({}, writer=lambda cfg, rows: None, flush_interval=60,
+                            on_flush=app_module.invalidate_dashboards)
+    writer.enqueue(4243, 'project_created')
+    writer._drain()
+    assert client.get('/api/dashboard').get_json()['total_activities'] == 2
+    app_module.invalidate_dashboard(4243)
+    app_module.User.invalidate(4243)
+
+
+def test_health_details_require_login(client):
+    """The detailed health view is behind login"""
+    response = client.get('/api/metrics/health')
+    assert response.status_code in (302, 401)
+
+
+def test_cursor_round_trip_and_rejects_malformed_input():
+    """Cursors decode to what was encoded; truncated, tampered or foreign input is a ValueError"""
+    import base64
+    from datetime import datetime
+    import app as app_module
+
+    ts = datetime(2024, 6, 1, 12, 0, 0, 123456)
+    cursor = app_module._encode_cursor(ts, 42)
+    assert '=' not in cursor
+    assert app_module._decode_cursor(cursor) == (ts, 42)
+
+    def forged(raw):
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    for bad in ('', '!!!', cursor[:-3], forged('2024-06-01T12:00:00|abc'),
+                forged('yesterday|42'), forged('2024-06-01T12:00:00'), 'éééé'):
+        with pytest.raises(ValueError):
+            app_module._decode_cursor(bad)
+
+
+def test_cursor_pages_break_timestamp_ties_by_id(client):
+    """Rows sharing created_at are paged by id without skipping or repeating any"""
+    import psycopg
+    import app as app_module
+
+    try:
+        conn = psycopg.connect(**app_module.DB_CONFIG)
+    except psycopg.OperationalError:
+        pytest.skip("PostgreSQL not available")
+    with conn:
+        user_id = conn.execute("INSERT INTO users (username, email, password_hash) "
+                               "VALUES ('cursor_probe', 'cursor_probe@example.com', 'x') "
+                               "RETURNING id").fetchone()[0]
+        conn.execute("INSERT INTO projects (name, owner_id, created_at) "
+                     "SELECT 'p' || n, %s, '2024-06-01 12:00:00' FROM generate_series(1, 5) n",
+                     (user_id,))
+        conn.commit()
+        try:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+                sess['_fresh'] = True
+            seen, cursor = [], None
+            while True:
+                query = '/api/projects?limit=2' + (f'&cursor={cursor}' if cursor else '')
+                body = client.get(query).get_json()
+                assert (body['pagination']['total'] is None) == bool(cursor)
+                seen += [p['id'] for p in body['data']]
+                cursor = body['pagination']['next_cursor']
+                if not cursor:
+                    break
+            assert len(seen) == 5 and seen == sorted(set(seen), reverse=True)
+            assert client.get('/api/projects?cursor=bogus').status_code == 400
+        finally:
+            conn.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            conn.commit()
+            app_module.User.invalidate(user_id)
+
+
+def test_activity_writer_counters_are_exposed(client, monkeypatch):
+    """/api/metrics/activity reports the writer's dropped and failed counts, behind login"""
+    import app as app_module
+
+    assert client.get('/api/metrics/activity').status_code in (302, 401)
+    monkeypatch.setattr(app_module.User, 'get_by_id',
+                        staticmethod(lambda uid: app_module.User(uid, 'dave', 'dave@example.com', 'x')))
+    with client.session_transaction() as sess:
+        sess['_user_id'] = '4245'
+        sess['_fresh'] = True
+    body = client.get('/api/metrics/activity').get_json()
+    assert body['success'] is True
+    assert {'enqueued', 'written', 'dropped', 'failed', 'queue_depth'} <= set(body['activity'])
+    app_module.User.invalidate(4245)
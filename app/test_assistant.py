@@ -0,0 +1,206 @@
+import sys
+import os
+import json
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from assistant import (AIMetrics, AIBusyError, AIConcurrencyLimiter, FakeModel, ResponseCache,
+                       cache_key, complete, stream_events)
+
+
+def _chunk(text):
+    part = SimpleNamespace(text=text)
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class FakeStreamingModel:
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        pieces = self.pieces
+
+        class Response:
+            usage_metadata = SimpleNamespace(prompt_token_count=7, candidates_token_count=len(pieces))
+
+            def __iter__(self):
+                return (_chunk(p) for p in pieces)
+
+        return Response()
+
+
+def _parse(frame):
+    event, data = frame.strip().split("\n")
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+def test_stream_emits_tokens_then_done_with_timings():
+    """Each chunk becomes a token event; done carries usage and time-to-first-token."""
+    metrics = AIMetrics()
+    finished = []
+    frames = [_parse(f) for f in stream_events(FakeStreamingModel(["Hel", "lo\n"]), "q",
+                                               metrics, lambda r, t: finished.append((r, t)))]
+
+    assert frames[:2] == [("token", {"text": "Hel"}), ("token", {"text": "lo\n"})]
+    event, done = frames[2]
+    assert event == "done" and done["usage"]["prompt_tokens"] == 7
+    assert done["ttft_ms"] <= done["total_ms"]
+    assert finished == [(done, "Hello\n")]
+    assert metrics.snapshot()["ttft"]["count"] == 1
+
+
+def test_closing_the_stream_counts_as_cancelled():
+    """A client disconnect closes the generator mid-stream."""
+    metrics = AIMetrics()
+    gen = stream_events(FakeStreamingModel(["a", "b", "c"]), "q", metrics)
+    next(gen)
+    gen.close()
+    snap = metrics.snapshot()
+    assert snap["cancelled"] == 1 and snap["completed"] == 0
+
+
+def test_cache_keys_ignore_whitespace_and_evict_lru():
+    """Reformatted context hits the same entry; the oldest entry goes first."""
+    a = cache_key("m", "sys", "def f():\r\n    pass  \n", "explain   this")
+    assert a == cache_key("m", "sys", "def f():\n    pass", " explain this ")
+    assert a != cache_key("m", "sys", "def f():\n    pass", "explain that")
+
+    cache = ResponseCache(max_entries=2, ttl=60)
+    for key in ("k1", "k2", "k3"):
+        assert cache.claim(key) == (False, None)
+        cache.release(key, {"suggestion": key, "usage": {"prompt_tokens": 10}})
+    assert cache.claim("k1") == (False, None)
+    cache.release("k1", None)
+    assert cache.claim("k3")[1]["suggestion"] == "k3"
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["hits"] == 1 and stats["saved_prompt_tokens"] == 10
+
+
+def test_identical_in_flight_requests_share_one_call():
+    """Followers wait for the leader's answer; a failed leader hands over."""
+    import threading
+
+    cache = ResponseCache(max_entries=10, ttl=60)
+    assert cache.claim("k") == (False, None)
+    results = []
+    followers = [threading.Thread(target=lambda: results.append(cache.claim("k"))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    cache.release("k", {"suggestion": "answer"})
+    for t in followers:
+        t.join(timeout=5)
+    assert results == [(True, {"suggestion": "answer"})] * 3
+    assert cache.stats()["misses"] == 1
+
+    assert cache.claim("j") == (False, None)
+    follower = threading.Thread(target=lambda: results.append(cache.claim("j")))
+    follower.start()
+    cache.release("j", None)
+    follower.join(timeout=5)
+    assert results[-1] == (False, None)
+
+
+def test_limiter_lets_other_users_past_a_burst():
+    """A user at their limit queues behind themselves; others get the free slots."""
+    import threading
+    import time
+
+    limiter = AIConcurrencyLimiter(max_concurrent=3, per_user=2, max_queued=1, queue_timeout=5)
+    held = [limiter.acquire("alice"), limiter.acquire("alice")]
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(limiter.acquire("alice")))
+    waiter.start()
+    while limiter.stats()["queue_depth"] == 0:
+        time.sleep(0.01)
+
+    try:
+        limiter.acquire("alice")
+    except AIBusyError as exc:
+        assert exc.status == 429
+    else:
+        raise AssertionError("expected the per-user queue limit to reject")
+
+    bob = limiter.acquire("bob")              # skips alice's queued request
+    assert not granted and limiter.stats()["active"] == 3
+    held[0].release()
+    waiter.join(timeout=5)
+    assert granted and granted[0].user_id == "alice"
+    for slot in (held[1], granted[0], bob):
+        slot.release()
+    assert limiter.stats()["active"] == 0 and limiter.stats()["wait"]["count"] == 4
+
+
+def test_upstream_errors_are_retried_with_backoff():
+    """429/5xx are retried; other errors and exhausted retries are raised."""
+    metrics, naps = AIMetrics(), []
+    model = FakeModel(reply="ok", latency=0, failures=[429, 503])
+    assert complete(model, "q", metrics, retries=2, sleep=naps.append).candidates
+    assert model.calls == 3 and len(naps) == 2 and metrics.snapshot()["retries"] == 2
+
+    frames = list(stream_events(FakeModel(reply="streamed", latency=0, failures=[500]), "q",
+                                metrics, retries=1, sleep=naps.append))
+    assert [f.split("\n")[0] for f in frames] == ["event: token", "event: done"]
+
+    model = FakeModel(latency=0, failures=[400])
+    try:
+        complete(model, "q", metrics, sleep=naps.append)
+    except Exception as exc:
+        assert exc.code == 400 and model.calls == 1
+    else:
+        raise AssertionError("a 400 must not be retried")
+
+
+def test_per_user_limit_holds_across_workers():
+    """Limiters sharing a SlotPool wait for a slot another worker releases"""
+    import threading
+    from cluster import SlotPool
+    from store import MemoryStore
+
+    store = MemoryStore()
+    workers = [AIConcurrencyLimiter(max_concurrent=4, per_user=1, queue_timeout=2,
+                                    slots=SlotPool(store, "ai", 1, ttl=60), poll_interval=0.01)
+               for _ in range(2)]
+    held = workers[0].acquire("alice")
+    assert workers[1].acquire("bob")            # other users aren't held up
+
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(workers[1].acquire("alice")))
+    waiter.start()
+    waiter.join(timeout=0.1)
+    assert not granted                          # alice's one slot is in use on worker 0
+    held.release()
+    waiter.join(timeout=2)
+    assert granted and granted[0].user_id == "alice"
+
+    quick = AIConcurrencyLimiter(per_user=1, queue_timeout=0.05,
+                                 slots=SlotPool(store, "ai", 1, ttl=60), poll_interval=0.01)
+    try:
+        quick.acquire("alice")
+    except AIBusyError:
+        pass
+    else:
+        raise AssertionError("expected a timeout while alice's slot is held elsewhere")
+
+
+def test_shared_slot_outlives_its_ttl_while_the_stream_runs():
+    """A stream longer than the pool TTL keeps its slot; other workers can't over-admit"""
+    from cluster import SlotPool
+    from store import MemoryStore
+
+    store = MemoryStore()
+    pool = SlotPool(store, "ai", 1, ttl=0.15)
+    limiter = AIConcurrencyLimiter(per_user=1, slots=pool, poll_interval=0.01)
+    slot = limiter.acquire("alice")
+
+    def slow_events():
+        for i in range(8):
+            time.sleep(0.05)                   # 0.4 s in all, well past the TTL
+            yield f"token {i}"
+
+    for _ in slot.hold(slow_events()):
+        assert pool.count("alice") == 1
+    assert pool.acquire("alice") is None       # still held at the end of the stream
+    slot.release()
+    assert pool.count("alice") == 0
@@ -0,0 +1,84 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import socketio
+
+from cluster import LocalChannels, LocalPubSubManager, WorkerBus, TerminalDirectory, SlotPool
+from store import MemoryStore
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def _server(channels, sent):
+    """A Socket.IO server on the shared channel whose packets land in *sent*."""
+    sio = socketio.Server(async_mode="threading",
+                          client_manager=LocalPubSubManager(channel="test", channels=channels))
+    sio._send_eio_packet = lambda eio_sid, packet: sent.append(packet.data)
+    sio.manager_initialized = True
+    sio.manager.initialize()                        # starts the queue listener
+    return sio
+
+
+def test_emits_reach_clients_on_other_workers():
+    """Two servers on one message queue share rooms: A's emit reaches B's client."""
+    channels, sent_a, sent_b = LocalChannels(), [], []
+    sio_a, sio_b = _server(channels, sent_a), _server(channels, sent_b)
+    sid = sio_b.manager.connect("eio-1", "/")
+    sio_b.manager.enter_room(sid, "/", "project-1")
+
+    sio_a.emit("local-only", {"n": 0}, to="project-1", ignore_queue=True)
+    sio_a.emit("news", {"n": 1}, to="project-1")
+
+    assert _wait_for(lambda: sent_b)
+    assert sent_b == ['2["news",{"n":1}]'] and sent_a == []
+
+
+def test_worker_bus_routes_to_the_terminal_owner():
+    """Directed messages reach one worker; the directory only points at live owners."""
+    store, got = MemoryStore(), []
+    a = WorkerBus("local", store, worker="a", channel="bus-test")
+    b = WorkerBus("local", store, worker="b", channel="bus-test")
+    a.on("terminal_input", lambda payload, sender: got.append((payload, sender)))
+    b.on("terminal_input", lambda payload, sender: got.append(("wrong worker", sender)))
+    a.start()
+    b.start()
+
+    dir_a, dir_b = TerminalDirectory(store, a), TerminalDirectory(store, b)
+    dir_a.claim(7, "c1")
+    assert dir_a.owner(7, "c1") is None             # it's ours
+    assert dir_b.owner(7, "c1") == "a"
+
+    assert b.send("a", "terminal_input", {"sid": "s1", "input": "ls\n"})
+    assert _wait_for(lambda: got)
+    assert got == [({"sid": "s1", "input": "ls\n"}, "b")]
+
+    a.stop()                                         # heartbeat gone → not an owner any more
+    b.stop()
+    assert dir_b.owner(7, "c1") is None
+
+
+def test_slot_pool_caps_holders_across_workers_and_lapses():
+    """Slots are shared through the store, released by their holder and expire after the TTL"""
+    store = MemoryStore()
+    a, b = SlotPool(store, "terminal", 2, ttl=0.05), SlotPool(store, "terminal", 2, ttl=0.05)
+
+    first, second = a.acquire("u1"), b.acquire("u1")
+    assert first and second and a.acquire("u1") is None and b.count("u1") == 2
+    assert b.acquire("u2") is not None          # counted per key
+
+    first.release()
+    third = b.acquire("u1")
+    assert third is not None
+    first.release()                             # not ours any more: a no-op
+    assert a.count("u1") == 2
+
+    time.sleep(0.06)                            # holders that never come back lapse
+    assert a.count("u1") == 0
@@ -0,0 +1,36 @@
+import sys
+import os
+import gzip
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, Response
+
+from compression import choose_encoding, compress_response
+
+
+def test_accept_encoding_negotiation():
+    """Brotli beats gzip when both are allowed; q=0 and unknown codings are honoured."""
+    assert choose_encoding("gzip, deflate, br", brotli_ok=True) == "br"
+    assert choose_encoding("gzip, deflate, br", brotli_ok=False) == "gzip"
+    assert choose_encoding("br;q=0, gzip;q=0.5", brotli_ok=True) == "gzip"
+    assert choose_encoding("*;q=0.1", brotli_ok=False) == "gzip"
+    assert choose_encoding("identity", brotli_ok=True) is None
+    assert choose_encoding("", brotli_ok=True) is None
+
+
+def test_only_large_buffered_text_responses_are_compressed():
+    """Big JSON is gzipped; small bodies, streams and other types pass through."""
+    app = Flask(__name__)
+    body = b'{"rows":[' + b",".join(b'{"id":%d}' % i for i in range(500)) + b"]}"
+    with app.app_context():
+        big = compress_response(Response(body, mimetype="application/json"), "gzip")
+        small = compress_response(Response(b"{}", mimetype="application/json"), "gzip")
+        stream = compress_response(Response(iter([body]), mimetype="text/event-stream"), "gzip")
+        image = compress_response(Response(body, mimetype="image/png"), "gzip")
+
+    assert big.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in big.headers["Vary"]
+    assert gzip.decompress(big.get_data()) == body
+    assert int(big.headers["Content-Length"]) < len(body) // 4
+    for response in (small, stream, image):
+        assert "Content-Encoding" not in response.headers
@@ -0,0 +1,221 @@
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import app as app_module
+from app import app
+
+USER_ID = 4244
+
+
+class FakeContainer:
+    def __init__(self, cid, name, owner=None, fail=None):
+        self.id = cid * 8
+        self.short_id = self.id[:12]
+        self.name = name
+        self.labels = {app_module.LABEL_OWNER: str(owner)} if owner is not None else {}
+        self.status = "running"
+        self.actions = []
+        self._fail = fail
+
+    def _do(self, action):
+        if self._fail:
+            raise RuntimeError(self._fail)
+        self.actions.append(action)
+
+    def stop(self, timeout=None):
+        self._do("stop")
+
+    def restart(self, timeout=None):
+        self._do("restart")
+
+    def remove(self, force=False):
+        self._do("remove")
+
+
+class FakeClient:
+    """Answers containers.list() label and name filters the way the Docker API does."""
+
+    def __init__(self, containers):
+        self.containers = self
+        self._containers = containers
+        self.queries = []
+
+    def list(self, all=False, filters=None):
+        filters = filters or {}
+        self.queries.append(filters)
+        found = self._containers
+        if "label" in filters:
+            key, _, value = filters["label"].partition("=")
+            found = [c for c in found if c.labels.get(key) == value]
+        if "name" in filters:
+            found = [c for c in found if filters["name"] in c.name]
+        return list(found)
+
+
+@pytest.fixture
+def user_client(monkeypatch):
+    """A logged-in test client; the user row and activity log stay out of the database."""
+    monkeypatch.setattr(app_module.User, 'get_by_id',
+                        staticmethod(lambda uid: app_module.User(uid, 'carol', 'carol@example.com', 'x')))
+    activity = []
+    monkeypatch.setattr(app_module, 'log_activity', lambda *a, **kw: activity.append(a))
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(USER_ID)
+            sess['_fresh'] = True
+        client.activity = activity
+        yield client
+    app_module.User.invalidate(USER_ID)
+
+
+def _use_docker(monkeypatch, containers):
+    client = FakeClient(containers)
+    monkeypatch.setattr(app_module, 'get_docker', lambda: client)
+    return client
+
+
+def _bulk(client, **body):
+    response = client.post('/api/containers/bulk-action', json=body)
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_bulk_action_filters_by_owner_and_isolates_errors(user_client, monkeypatch):
+    """Foreign and unknown ids are denied, one failure doesn't stop the rest, a summary closes the stream"""
+    mine   = FakeContainer("aaaa", "cloudx-project-1-aaaa", owner=USER_ID)
+    broken = FakeContainer("bbbb", "cloudx-project-1-bbbb", owner=USER_ID, fail="daemon said no")
+    theirs = FakeContainer("cccc", "cloudx-project-2-cccc", owner=USER_ID + 1)
+    _use_docker(monkeypatch, [mine, broken, theirs])
+
+    records = _bulk(user_client, action="restart",
+                    container_ids=[mine.short_id, broken.name, theirs.id, "nope"])
+    summary = records.pop()
+    by_id = {r['id']: r for r in records}
+
+    assert summary == {'done': True, 'succeeded': 1, 'failed': 3}
+    assert by_id[theirs.id] == {'id': theirs.id, 'success': False, 'error': 'Access denied'}
+    assert by_id['nope']['error'] == 'Access denied'
+    assert by_id[mine.short_id]['success'] is True and by_id[mine.short_id]['name'] == mine.name
+    assert by_id[broken.short_id] == {'id': broken.short_id, 'name': broken.name,
+                                      'success': False, 'error': 'daemon said no'}
+    assert mine.actions == ["restart"] and theirs.actions == []
+    assert user_client.activity == [('containers_bulk_restart', '1 succeeded, 3 failed')]
+
+
+def test_bulk_action_all_targets_only_owned_containers(user_client, monkeypatch):
+    """"all" expands to the caller's containers; duplicate ids act once; bad bodies are 400s"""
+    mine   = [FakeContainer(c, f"cloudx-project-1-{c}", owner=USER_ID) for c in ("dddd", "eeee")]
+    theirs = FakeContainer("ffff", "cloudx-project-2-ffff", owner=USER_ID + 1)
+    _use_docker(monkeypatch, mine + [theirs])
+
+    records = _bulk(user_client, action="stop", container_ids="all")
+    assert records[-1] == {'done': True, 'succeeded': 2, 'failed': 0}
+    assert {r['name'] for r in records[:-1]} == {c.name for c in mine}
+    assert theirs.actions == []
+
+    records = _bulk(user_client, action="stop", container_ids=[mine[0].id, mine[0].name])
+    assert records[-1]['succeeded'] == 1 and mine[0].actions == ["stop", "stop"]
+
+    assert user_client.post('/api/containers/bulk-action',
+                            json={'action': 'explode', 'container_ids': 'all'}).status_code == 400
+    assert user_client.post('/api/containers/bulk-action',
+                            json={'action': 'stop', 'container_ids': []}).status_code == 400
+
+
+def test_bulk_action_rejects_malformed_and_oversized_id_lists(user_client, monkeypatch):
+    """Non-string ids and lists over the cap are JSON 400s, not server errors"""
+    monkeypatch.setattr(app_module, "BULK_ACTION_MAX_IDS", 3)
+    _use_docker(monkeypatch, [FakeContainer("aaaa", "cloudx-project-1-aaaa", owner=USER_ID)])
+
+    for ids in ([{}], ["aaaa", 7], ["aaaa"] * 4):
+        resp = user_client.post('/api/containers/bulk-action',
+                                json={'action': 'stop', 'container_ids': ids})
+        assert resp.status_code == 400 and resp.get_json()['success'] is False
+
+
+class FakeDB:
+    """get_db_connection() stand-in answering the owner→projects query."""
+
+    def __init__(self, project_ids):
+        self.project_ids = project_ids
+        self.queries = 0
+
+    def __call__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, row_factory=None):
+        return self
+
+    def execute(self, sql, params):
+        self.queries += 1
+
+    def fetchall(self):
+        return [{'id': pid} for pid in self.project_ids]
+
+
+def test_project_map_is_cached_until_invalidated(monkeypatch):
+    """_get_user_project_ids reads the DB once per TTL; invalidate_project_map forces a reread"""
+    db = FakeDB([7, 9])
+    monkeypatch.setattr(app_module, 'get_db_connection', db)
+    app_module.invalidate_project_map(USER_ID)
+
+    assert app_module._get_user_project_ids(USER_ID) == {'7', '9'}
+    assert app_module._get_user_project_ids(USER_ID) == {'7', '9'}
+    assert db.queries == 1
+
+    db.project_ids = [7, 9, 11]
+    app_module.invalidate_project_map(USER_ID)
+    assert app_module._get_user_project_ids(USER_ID) == {'7', '9', '11'}
+    assert db.queries == 2
+    app_module.invalidate_project_map(USER_ID)
+
+
+def test_user_containers_by_label_and_legacy_name(monkeypatch):
+    """Labelled and legacy-named containers are the user's; foreign ones never are"""
+    monkeypatch.setattr(app_module, 'get_db_connection', FakeDB([7]))
+    app_module.invalidate_project_map(USER_ID)
+    labelled = FakeContainer("aaaa", "cloudx-project-3-aaaa", owner=USER_ID)
+    legacy   = FakeContainer("bbbb", "cloudx-project-7-bbbb")
+    foreign  = FakeContainer("cccc", "cloudx-project-8-cccc")
+    # Named like one of ours but labelled for someone else: the label wins.
+    relabelled = FakeContainer("dddd", "cloudx-project-7-dddd", owner=USER_ID + 1)
+    client = FakeClient([labelled, legacy, foreign, relabelled])
+
+    found = app_module._list_user_containers(client, USER_ID)
+    assert [c.name for c in found] == [labelled.name, legacy.name]
+    assert client.queries == [{'label': f'{app_module.LABEL_OWNER}={USER_ID}'},
+                              {'name': 'cloudx-project-'}]
+
+    assert app_module._container_belongs_to_user(labelled, USER_ID)
+    assert app_module._container_belongs_to_user(legacy, USER_ID)
+    assert not app_module._container_belongs_to_user(foreign, USER_ID)
+    assert not app_module._container_belongs_to_user(relabelled, USER_ID)
+
+    monkeypatch.setattr(app_module, 'CONTAINER_NAME_FALLBACK', False)
+    assert app_module._list_user_containers(client, USER_ID) == [labelled]
+    assert not app_module._container_belongs_to_user(legacy, USER_ID)
+    app_module.invalidate_project_map(USER_ID)
+
+
+def test_fallback_skips_the_project_lookup_when_everything_is_labelled(monkeypatch):
+    """Labelled containers in the name listing are skipped without reading the project map"""
+    db = FakeDB([3])
+    monkeypatch.setattr(app_module, 'get_db_connection', db)
+    app_module.invalidate_project_map(USER_ID)
+    client = FakeClient([FakeContainer("eeee", "cloudx-project-3-eeee", owner=USER_ID),
+                         FakeContainer("ffff", "cloudx-project-3-ffff", owner=USER_ID + 1)])
+
+    assert [c.short_id for c in app_module._list_user_containers(client, USER_ID)] == ["eeee" * 3]
+    assert db.queries == 0
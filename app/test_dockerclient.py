@@ -0,0 +1,55 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+import requests
+
+from dockerclient import DockerCallStats, endpoint_name, instrument
+
+BASE = "http+docker://localhost"
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+class FakeAPI:
+    """Stands in for docker's APIClient: fails the first *failures* requests."""
+
+    base_url = BASE
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise requests.ConnectionError("socket reset")
+        return FakeResponse()
+
+
+def test_endpoint_names_collapse_ids_and_versions():
+    """Container ids and API versions don't explode the metric cardinality."""
+    assert endpoint_name("get", f"{BASE}/v1.43/containers/ab12cd/json", BASE) == "GET /containers/{id}/json"
+    assert endpoint_name("GET", f"{BASE}/v1.43/containers/json?all=1", BASE) == "GET /containers/json"
+    assert endpoint_name("POST", f"{BASE}/v1.43/exec/e1/start", BASE) == "POST /exec/{id}/start"
+
+
+def test_reads_are_retried_and_writes_are_not():
+    """A transient socket error is retried for GET; POST fails straight away."""
+    stats = DockerCallStats()
+    api = instrument(FakeAPI(failures=1), stats, retries=2, sleep=lambda s: None)
+    assert api.request("GET", f"{BASE}/v1.43/containers/x/json").status_code == 200
+
+    api = instrument(FakeAPI(failures=1), stats, retries=2, sleep=lambda s: None)
+    with pytest.raises(requests.ConnectionError):
+        api.request("POST", f"{BASE}/v1.43/containers/x/stop")
+
+    snap = stats.snapshot()
+    assert snap["GET /containers/{id}/json"]["retries"] == 1
+    assert snap["GET /containers/{id}/json"]["errors"] == 0
+    assert snap["POST /containers/{id}/stop"]["errors"] == 1
@@ -0,0 +1,104 @@
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from health import HealthChecker, DatabaseProbe, monitor_probe
+
+
+def _checker(**kwargs):
+    return HealthChecker(spawn=lambda fn: None, sleep=lambda s: None, **kwargs)
+
+
+def test_snapshot_is_cached_and_rolls_up_status():
+    """Probes run per round, not per snapshot; optional failures only degrade."""
+    calls = {"db": 0}
+
+    def db():
+        calls["db"] += 1
+        return {}
+
+    def docker():
+        raise ConnectionError("socket missing")
+
+    checker = _checker()
+    checker.register("database", db)
+    checker.register("docker", docker, critical=False)
+    checker.register("ai", lambda: {"status": "disabled"}, critical=False)
+    checker.start()                             # spawns the loop; never probes inline
+    assert calls["db"] == 0 and checker.snapshot()["status"] == "pending"
+    checker.run_once()
+
+    for _ in range(5):
+        snap = checker.snapshot()
+    assert calls["db"] == 1
+    assert snap["status"] == "degraded"
+    assert snap["components"]["database"]["status"] == "healthy"
+    assert "latency_ms" in snap["components"]["database"]
+    assert snap["components"]["docker"]["status"] == "unhealthy"
+    assert snap["components"]["docker"]["error"] == "socket missing"
+    assert snap["components"]["ai"]["status"] == "disabled"
+
+    checker.register("database-2", lambda: 1 / 0)
+    checker.run_once()
+    assert checker.snapshot()["status"] == "unhealthy"
+
+
+def test_hung_probe_and_database_reconnect():
+    """A probe past its timeout shows as down while it runs; the DB probe reopens after errors."""
+    release = threading.Event()
+    checker = _checker(timeout=0.05)
+    checker.register("slow", lambda: release.wait(5))
+    round_ = threading.Thread(target=checker.run_once)
+    round_.start()
+    time.sleep(0.1)
+    snap = checker.snapshot()
+    release.set()
+    round_.join()
+    assert snap["status"] == "unhealthy" and "no answer" in snap["components"]["slow"]["error"]
+
+    class Conn:
+        closed = False
+
+        def __init__(self, fail):
+            self.fail = fail
+
+        def cursor(self):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, sql):
+            if self.fail:
+                raise OSError("server closed the connection")
+
+        def fetchone(self):
+            return (1,)
+
+        def close(self):
+            self.closed = True
+
+    conns = [Conn(fail=True), Conn(fail=False)]
+    opened = []
+    probe = DatabaseProbe(lambda: opened.append(1) or conns[len(opened) - 1])
+    try:
+        probe()
+    except OSError:
+        pass
+    assert conns[0].closed
+    probe()
+    probe()
+    assert len(opened) == 2
+
+    class Monitor:
+        def stats(self):
+            return {"alive": True, "interval_s": 15, "last_tick_s": 1.0, "last_tick_ago_s": 90.0}
+
+    assert monitor_probe(lambda: Monitor())()["status"] == "degraded"
+    assert monitor_probe(lambda: None)()["status"] == "not_started"
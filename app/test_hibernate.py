@@ -0,0 +1,96 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hibernate import WorkspaceHibernator
+from store import MemoryStore
+from cluster import Lease
+
+
+class FakeContainer:
+    def __init__(self, cid, status="running"):
+        self.id = cid * 8
+        self.name = f"cloudx-project-1-{cid}"
+        self.status = status
+
+    def pause(self):
+        self.status = "paused"
+
+    def unpause(self):
+        self.status = "running"
+
+    def stop(self, timeout=None):
+        self.status = "exited"
+
+    def start(self):
+        self.status = "running"
+
+    def reload(self):
+        pass
+
+
+class FakeClient:
+    def __init__(self, containers):
+        self.containers = self
+        self._containers = containers
+
+    def list(self, filters=None):
+        return [c for c in self._containers if c.status == "running"]
+
+
+def _hibernator(containers, **kwargs):
+    client = FakeClient(containers)
+    kwargs.setdefault("cpu_lookup", lambda c: 0.0)
+    return WorkspaceHibernator(lambda: client, MemoryStore(), "cloudx.owner",
+                               idle_minutes=0, **kwargs)
+
+
+def test_idle_workspaces_pause_unless_busy():
+    """Containers with a terminal open or high CPU stay up; the rest pause and wake."""
+    idle, term, hot = FakeContainer("aaaa"), FakeContainer("bbbb"), FakeContainer("cccc")
+    h = _hibernator([idle, term, hot],
+                    busy_containers=lambda: {term.id[:12]},
+                    cpu_lookup=lambda c: 50.0 if c is hot else 0.0)
+
+    h.check()
+    assert (idle.status, term.status, hot.status) == ("paused", "running", "running")
+
+    assert h.wake(idle) is True
+    assert idle.status == "running"
+    assert h.wake(idle) is False
+    assert h.stats()["hibernated"] == 1 and h.stats()["resumed"] == 1
+
+
+def test_stop_mode_only_restarts_containers_it_stopped():
+    """A user-stopped container is left alone; a hibernated one is restarted."""
+    ours, theirs = FakeContainer("dddd"), FakeContainer("eeee", status="exited")
+    h = _hibernator([ours, theirs], mode="stop")
+
+    h.check()
+    assert ours.status == "exited"
+    assert h.wake(theirs) is False and theirs.status == "exited"
+    assert h.wake(ours) is True and ours.status == "running"
+
+
+def test_only_the_lease_holder_hibernates_on_shared_activity():
+    """Workers share touches through the store; only the lease holder pauses anything."""
+    store = MemoryStore()
+    idle, term = FakeContainer("ffff"), FakeContainer("gggg")
+    client = FakeClient([idle, term])
+
+    def worker(name, busy=()):
+        return WorkspaceHibernator(lambda: client, store, "cloudx.owner",
+                                   busy_containers=lambda: busy, cpu_lookup=lambda c: 0.0,
+                                   idle_minutes=0.001, lease=Lease(store, "hibernator", 60, holder=name))
+
+    leader, other = worker("a"), worker("b", busy={term.id[:12]})
+    leader.check()                      # takes the lease, first sighting starts the clocks
+    time.sleep(0.1)
+    other.check()                       # its terminal keeps *term* fresh in the store
+    leader.check()
+
+    assert (idle.status, term.status) == ("paused", "running")
+    assert other.stats()["leader"] is False and other.stats()["skipped"] == 1
+    assert leader.stats()["leader"] is True
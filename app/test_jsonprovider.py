@@ -0,0 +1,46 @@
+import sys
+import os
+import json
+import decimal
+from datetime import datetime, date, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, jsonify
+
+import jsonprovider
+from jsonprovider import FastJSONProvider
+
+
+ROW = {
+    "id": 7,
+    "created_at": datetime(2024, 5, 1, 12, 30, 0, 250000),
+    "deployed_on": date(2024, 5, 2),
+    "duration": decimal.Decimal("1.50"),
+    "tags": None,
+    3: "int key",
+}
+
+
+def test_rows_serialise_compact_with_iso_datetimes():
+    """Rows with datetimes and Decimals go out compact; naive times as UTC."""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    with app.app_context():
+        body = jsonify([ROW]).get_data()
+
+    assert b" " not in body.replace(b"int key", b"")
+    assert json.loads(body) == [{
+        "id": 7, "created_at": "2024-05-01T12:30:00.250000+00:00", "deployed_on": "2024-05-02",
+        "duration": 1.5, "tags": None, "3": "int key",
+    }]
+
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    """Without orjson the same payload encodes to the same JSON."""
+    fast = jsonprovider.dumps_bytes(ROW)
+    monkeypatch.setattr(jsonprovider, "_ORJSON_AVAILABLE", False)
+    slow = jsonprovider.dumps_bytes(ROW)
+    assert json.loads(fast) == json.loads(slow)
+    assert jsonprovider.dumps_bytes({"at": datetime(2024, 1, 1, tzinfo=timezone.utc)}) == \
+        b'{"at":"2024-01-01T00:00:00+00:00"}'
@@ -0,0 +1,126 @@
+import sys
+import os
+import queue
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from logstream import LogSubscriber, LogTailRegistry, parse_time, ts_to_ns
+
+
+class FakeSocketIO:
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def start_background_task(self, target, *args, **kwargs):
+        t = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        t.start()
+        return t
+
+
+class FakeContainer:
+    """
+    Container whose backlog read returns *backlog* once *ready* is set, and
+    whose follow stream yields whatever the test feeds it.
+    """
+
+    def __init__(self, cid="abc123", backlog=b""):
+        self.id = cid
+        self.feed = queue.Queue()
+        self.backlog = backlog
+        self.ready = threading.Event()
+        self.ready.set()
+        self.log_calls = 0
+        self.follow_kwargs = None
+
+    def logs(self, **kwargs):
+        self.log_calls += 1
+        if not kwargs.get("stream"):
+            self.ready.wait(timeout=2)
+            return self.backlog
+        self.follow_kwargs = kwargs
+        return iter(self.feed.get, None)
+
+    def close(self):
+        self.feed.put(None)
+
+
+def _line(second: int, text: str) -> bytes:
+    return f"2024-05-01T10:00:{second:02d}.5Z {text}\n".encode()
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_timestamps_compare_numerically():
+    """Docker trims trailing zeros, so ordering must not rely on string compare."""
+    assert ts_to_ns("2024-05-01T10:00:00.5Z") > ts_to_ns("2024-05-01T10:00:00.123456789Z")
+    assert parse_time("2024-05-01T10:00:00.5Z") == ts_to_ns("2024-05-01T10:00:00.5Z")
+    assert parse_time("1714557600") == ts_to_ns("2024-05-01T10:00:00Z")
+
+
+def test_viewers_share_one_stream_and_resume_from_cursor():
+    """Two subscribers ride one Docker stream; a cursor skips lines already seen."""
+    registry = LogTailRegistry(FakeSocketIO(), reap_interval=3600)
+    container = FakeContainer()
+    tail = registry.get_or_start(container)
+
+    container.feed.put(_line(1, "one") + _line(2, "two")[:10])   # split mid-line
+    container.feed.put(_line(2, "two")[10:])
+    assert _wait_for(lambda: len(tail.lines) == 2)
+
+    first = tail.subscribe()
+    resumed = registry.get_or_start(container).subscribe(after_ns=tail.lines[0][1])
+    container.feed.put(_line(3, "three"))
+
+    assert _wait_for(lambda: len(first._lines) == 3 and len(resumed._lines) == 2)
+
+    assert [l[2] for l in first.drain(timeout=0)[0]] == ["one", "two", "three"]
+    assert [l[2] for l in resumed.drain(timeout=0)[0]] == ["two", "three"]
+    assert container.log_calls == 2           # one backlog read, one follow stream
+
+    container.close()
+    registry.shutdown()
+
+
+def test_tail_covers_nothing_until_backlog_is_loaded():
+    """A tail that has just started must not answer bounded reads with an empty cache."""
+    registry = LogTailRegistry(FakeSocketIO(), reap_interval=3600)
+    container = FakeContainer(backlog=_line(1, "one") + _line(2, "two"))
+    container.ready.clear()
+    tail = registry.get_or_start(container)
+    after_ns = ts_to_ns("2024-05-01T10:00:00Z")
+
+    assert not tail.covers(after_ns)
+    assert not tail.loaded
+
+    container.ready.set()
+    assert _wait_for(lambda: tail.loaded)
+    assert tail.covers(after_ns)
+    assert [l[2] for l in tail.snapshot(after_ns=after_ns)] == ["one", "two"]
+
+    # The follow stream resumes at the last backlog line; Docker's repeat of it is dropped.
+    assert container.follow_kwargs["since"] == tail.lines[-1][1] / 1e9
+    container.feed.put(_line(2, "two") + _line(3, "three"))
+    assert _wait_for(lambda: len(tail.lines) == 3)
+    assert [l[2] for l in tail.lines] == ["one", "two", "three"]
+
+    container.close()
+    registry.shutdown()
+
+
+def test_slow_subscriber_drops_oldest_and_counts_gap():
+    """A viewer that falls behind loses the oldest lines, not the newest."""
+    sub = LogSubscriber(capacity=3)
+    for i in range(5):
+        sub.push(("", i, str(i)))
+    lines, dropped = sub.drain(timeout=0)
+    assert [l[2] for l in lines] == ["2", "3", "4"]
+    assert dropped == 2
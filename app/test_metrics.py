@@ -0,0 +1,18 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import LatencyHistogram
+
+
+def test_latency_histogram_percentiles():
+    """Percentiles resolve to the upper bound of the matching bucket"""
+    hist = LatencyHistogram(buckets=(1, 10, 100))
+    for ms in (0.5, 3, 4, 50, 500):
+        hist.observe(ms)
+    snap = hist.snapshot()
+    assert snap["count"] == 5
+    assert snap["buckets"] == {"le_1": 1, "le_10": 2, "le_100": 1, "le_inf": 1}
+    assert snap["p50_ms"] == 10
+    assert snap["p99_ms"] == ">100"
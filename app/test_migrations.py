@@ -0,0 +1,123 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from migrations import MIGRATIONS, Migration, migrate
+
+
+class FakeCursor:
+    def __init__(self, rows=()):
+        self._rows = rows
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeConnection:
+    """Records statements; schema_migrations starts with *applied* versions."""
+
+    def __init__(self, applied=()):
+        self.applied = set(applied)
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql.strip().split("\n")[0])
+        if sql.startswith("SELECT version FROM schema_migrations"):
+            return FakeCursor([(v,) for v in sorted(self.applied)])
+        if sql.startswith("INSERT INTO schema_migrations"):
+            self.applied.add(params[0])
+        return FakeCursor()
+
+    def transaction(self):
+        return self
+
+    def __enter__(self):
+        self.executed.append("BEGIN")
+
+    def __exit__(self, *exc):
+        self.executed.append("COMMIT" if exc[0] is None else "ROLLBACK")
+
+
+def test_only_pending_migrations_run_under_the_lock():
+    """Applied versions are skipped; each pending one runs in its own transaction."""
+    migrations = MIGRATIONS + [Migration(99, "extra", ["ALTER TABLE users ADD COLUMN x INT"])]
+    conn = FakeConnection(applied={m.version for m in MIGRATIONS})
+
+    assert migrate(conn, migrations) == [99]
+    assert conn.executed[0].startswith("SELECT pg_advisory_lock")
+    assert conn.executed[-1].startswith("SELECT pg_advisory_unlock")
+    body = conn.executed[conn.executed.index("BEGIN"):]
+    assert body[:4] == ["BEGIN", "ALTER TABLE users ADD COLUMN x INT",
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", "COMMIT"]
+
+    assert migrate(conn, migrations) == []
+
+
+def test_versions_are_unique_and_ordered():
+    """Migration versions only ever grow: unique, and listed in order."""
+    versions = [m.version for m in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+def test_counter_triggers_and_backfill_against_postgres():
+    """user_stats follows batched inserts and deletes, and the backfill rebuilds it"""
+    import psycopg
+    import pytest
+    from migrations import COUNTER_BACKFILL, connect
+
+    try:
+        conn = connect(retries=1)
+    except psycopg.OperationalError:
+        pytest.skip("PostgreSQL not available")
+
+    def counts(user_id):
+        return conn.execute("SELECT project_count, activity_count FROM user_stats WHERE user_id = %s",
+                            (user_id,)).fetchone()
+
+    with conn:
+        migrate(conn)
+        with conn.transaction():
+            user_id = conn.execute("INSERT INTO users (username, email, password_hash) "
+                                   "VALUES ('stats_probe', 'stats_probe@example.com', 'x') "
+                                   "RETURNING id").fetchone()[0]
+            conn.execute("INSERT INTO projects (name, owner_id) VALUES ('a', %s), ('b', %s)",
+                         (user_id, user_id))
+            conn.execute("INSERT INTO activity_logs (user_id, action) "
+                         "SELECT %s, 'page_view' FROM generate_series(1, 3)", (user_id,))
+            assert counts(user_id) == (2, 3)
+
+            conn.execute("DELETE FROM projects WHERE owner_id = %s AND name = 'a'", (user_id,))
+            conn.execute("DELETE FROM activity_logs WHERE id IN "
+                         "(SELECT id FROM activity_logs WHERE user_id = %s LIMIT 2)", (user_id,))
+            assert counts(user_id) == (1, 1)
+
+            conn.execute("UPDATE user_stats SET project_count = 0, activity_count = 0 "
+                         "WHERE user_id = %s", (user_id,))
+            conn.execute(COUNTER_BACKFILL)
+            assert counts(user_id) == (1, 1)
+            raise psycopg.Rollback()
+
+
+def test_sort_keys_are_backfilled_and_not_null_against_postgres():
+    """Migration 4 leaves no NULL keyset timestamp behind and refuses new ones"""
+    import psycopg
+    import pytest
+    from migrations import connect
+
+    try:
+        conn = connect(retries=1)
+    except psycopg.OperationalError:
+        pytest.skip("PostgreSQL not available")
+
+    with conn:
+        migrate(conn)
+        for table, column in (("projects", "created_at"), ("deployments", "deployed_at"),
+                              ("activity_logs", "created_at")):
+            nullable = conn.execute("SELECT is_nullable FROM information_schema.columns "
+                                    "WHERE table_name = %s AND column_name = %s",
+                                    (table, column)).fetchone()[0]
+            assert nullable == "NO", table
+        with pytest.raises(psycopg.errors.NotNullViolation):
+            with conn.transaction():
+                conn.execute("INSERT INTO activity_logs (action, created_at) VALUES ('probe', NULL)")
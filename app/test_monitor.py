@@ -0,0 +1,65 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import monitor as monitor_module
+from monitor import SystemMonitor, scope_summary
+from store import MemoryStore
+from cluster import Lease
+
+
+def test_latest_summary_and_history_kept_in_memory(monkeypatch):
+    """The monitor keeps its last summary and a rolling history"""
+    monkeypatch.setattr(monitor_module, "_collect_container_metrics", lambda: [])
+    monkeypatch.setattr(monitor_module, "_bulk_insert", lambda rows: None)
+
+    monitor = SystemMonitor(poll_interval=60)
+    assert monitor.latest_summary() == {}
+
+    for cpu in (10.0, 20.0):
+        monkeypatch.setattr(monitor_module, "_collect_host_metrics",
+                            lambda cpu=cpu: [("host.cpu.percent", cpu, "percent")])
+        monitor._tick()
+
+    assert monitor.latest_summary()["host"]["cpu_percent"] == 20.0
+    assert [p["host"]["cpu_percent"] for p in monitor.history(5)] == [10.0, 20.0]
+    assert len(monitor.history(1)) == 1
+
+
+def test_scope_summary_filters_other_tenants():
+    """Only containers for the caller's projects survive scoping"""
+    summary = {
+        "timestamp": "t",
+        "host": {"cpu_percent": 5.0},
+        "containers": {
+            "cloudx_project_1_ab12": {"cpu_percent": 1.0},
+            "cloudx_project_12_cd34": {"cpu_percent": 2.0},
+        },
+    }
+    scoped = scope_summary(summary, {"1"})
+    assert scoped["host"] == {"cpu_percent": 5.0}
+    assert list(scoped["containers"]) == ["cloudx_project_1_ab12"]
+    assert scope_summary(summary, set())["containers"] == {}
+
+
+def test_only_the_lease_holder_polls_and_followers_share_its_summary(monkeypatch):
+    """One worker collects and writes metrics; the others read its summary from the store"""
+    collected = []
+    monkeypatch.setattr(monitor_module, "_collect_host_metrics",
+                        lambda: collected.append(1) or [("host.cpu.percent", 42.0, "percent")])
+    monkeypatch.setattr(monitor_module, "_collect_container_metrics", lambda: [])
+    monkeypatch.setattr(monitor_module, "_bulk_insert", lambda rows: None)
+
+    store = MemoryStore()
+    leader = SystemMonitor(poll_interval=60, store=store, lease=Lease(store, "monitor", 600, holder="a"))
+    follower = SystemMonitor(poll_interval=60, store=store, lease=Lease(store, "monitor", 600, holder="b"))
+
+    leader._step()
+    follower._step()
+    follower._step()
+
+    assert len(collected) == 1
+    assert follower.latest_summary()["host"]["cpu_percent"] == 42.0
+    assert len(follower.history(5)) == 1
+    assert leader.stats()["leader"] and not follower.stats()["leader"]
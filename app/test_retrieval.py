@@ -0,0 +1,115 @@
+import sys
+import os
+import io
+import tarfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from retrieval import RetrievalRegistry, WorkspaceIndex, scan_workspace, terms
+
+
+class FakeWorkspace:
+    """Answers the find / tar commands scan_workspace runs, from a dict of files."""
+
+    def __init__(self, files):
+        self.name, self.status = "cloudx-project-1-abcd", "running"
+        self.files = files          # path → (text, mtime)
+        self.fetched = []
+
+    def exec_run(self, cmd, demux=False):
+        if "find" in cmd[2]:
+            out = "".join(f"{p}\t{len(t)}\t{m}\n" for p, (t, m) in self.files.items())
+            return SimpleNamespace(exit_code=0, output=out.encode())
+        paths = cmd[4:]
+        self.fetched.extend(paths)
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            for p in paths:
+                data = self.files[p][0].encode()
+                info = tarfile.TarInfo(p)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        return SimpleNamespace(exit_code=0, output=buf.getvalue())
+
+
+def test_terms_split_identifiers():
+    """camelCase and snake_case identifiers also index their parts."""
+    assert terms("def parseHTTPHeader(raw_value):") == [
+        "parsehttpheader", "parse", "http", "header", "raw_value", "raw", "value"]
+
+
+def test_bm25_ranks_matching_chunk_and_updates_on_write():
+    """The defining chunk ranks first; rewriting a file replaces its chunks."""
+    index = WorkspaceIndex()
+    index.update_file("billing.py", "def compute_invoice_total(items):\n    return sum(items)\n")
+    index.update_file("auth.py", "def login(user):\n    return check_password(user)\n")
+    index.update_file("notes.md", "Remember to buy milk.\n")
+
+    hits = index.search("how is the invoice total computed?")
+    assert hits[0].path == "billing.py" and hits[0].start == 1
+    assert "compute_invoice_total" in hits[0].text
+    assert index.search("invoice", exclude={"billing.py"}) == []
+
+    index.update_file("billing.py", "def refund(order):\n    pass\n")
+    assert index.search("invoice") == [] and index.search("refund")[0].path == "billing.py"
+    assert index.stats()["files"] == 3
+
+
+def test_rescan_fetches_only_changed_files():
+    """A second scan lists everything but only re-reads files whose mtime moved."""
+    ws = FakeWorkspace({"a.py": ("def alpha():\n    pass\n", "1"),
+                        "b.py": ("def beta():\n    pass\n", "1"),
+                        "logo.png": ("binary", "1")})
+    index = WorkspaceIndex()
+    assert scan_workspace(ws, index)["fetched"] == 2
+
+    ws.files["b.py"] = ("def beta_two():\n    pass\n", "2")
+    del ws.files["a.py"]
+    result = scan_workspace(ws, index)
+    assert result == {"listed": 1, "fetched": 1, "updated": 1, "removed": 1}
+    assert ws.fetched == ["a.py", "b.py", "b.py"]
+    assert index.search("beta two")[0].path == "b.py" and not index.search("alpha")
+
+    registry = RetrievalRegistry(spawn=lambda fn, *a: fn(*a))
+    registry.ensure(1, lambda: ws)
+    assert registry.search(1, "beta")[0].path == "b.py"
+    assert registry.stats()["projects"]["1"]["files"] == 1
+
+
+def test_files_over_the_cap_are_not_refetched_until_they_change():
+    """A file skipped for the size cap keeps its signature, so rescans leave it alone"""
+    ws = FakeWorkspace({"small.py": ("def small():\n    pass\n", "1"),
+                        "big.py": ("def big():\n    pass\n" * 40, "1")})
+    index = WorkspaceIndex(max_bytes=200)
+    scan_workspace(ws, index)
+    assert index.stats()["files"] == 1 and index.stats()["skipped"] == 1
+
+    assert scan_workspace(ws, index)["fetched"] == 0
+    ws.files["big.py"] = ("def big():\n    pass\n" * 41, "2")
+    assert scan_workspace(ws, index)["fetched"] == 1
+
+    del ws.files["small.py"]                    # room freed: the skipped file gets another go
+    assert scan_workspace(ws, index)["fetched"] == 1
+    assert scan_workspace(ws, index)["fetched"] == 0
+    assert index.stats()["skipped"] == 1
+
+    registry = RetrievalRegistry(spawn=lambda fn, *a: fn(*a))
+    registry.ensure(1, lambda: ws)
+    registry.ensure(2, lambda: ws)
+    assert set(registry.stats(projects={"2"})["projects"]) == {"2"}
+
+
+def test_stopped_workspace_is_retried_at_most_once_per_refresh():
+    """A scan that finds the container down still counts as an attempt"""
+    calls = []
+
+    def stopped():
+        calls.append(1)
+        return SimpleNamespace(status="exited")
+
+    registry = RetrievalRegistry(spawn=lambda fn, *a: fn(*a), refresh=3600)
+    for _ in range(3):
+        registry.ensure(1, stopped)
+    assert len(calls) == 1
+    assert registry.get(1).scanned_at is None and registry.get(1).last_attempt is not None
@@ -0,0 +1,57 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from store import MemoryStore
+
+
+def test_memory_store_ttl_and_delete():
+    """MemoryStore honours per-key TTL and explicit deletes"""
+    store = MemoryStore()
+    store.set("a", "1")
+    store.set("b", "2", ttl=0.01)
+    assert store.get("a") == "1"
+    time.sleep(0.02)
+    assert store.get("b") is None
+    store.delete("a", "missing")
+    assert store.get("a") is None
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match, count=None):
+        return [k for k in list(self.data) if k.startswith(match.rstrip("*"))]
+
+    def flushdb(self):
+        raise AssertionError("FLUSHDB would wipe the Socket.IO queue's keys too")
+
+
+def test_redis_store_clear_only_touches_its_prefix():
+    """RedisStore namespaces its keys and clear() deletes just those"""
+    from store import RedisStore
+    store = RedisStore("redis://localhost:6379/0", prefix="t:")
+    store._client = _FakeRedis()
+    store._client.data["flask-socketio:queue"] = "x"
+    store.set("a", "1")
+    assert store.add("a", "2") is False
+    assert store._client.data["t:a"] == "1" and store.get("a") == "1"
+    store.clear()
+    assert store.get("a") is None
+    assert store._client.data == {"flask-socketio:queue": "x"}
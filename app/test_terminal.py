@@ -0,0 +1,230 @@
+import sys
+import os
+import socket
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from terminal import (
+    ScrollbackBuffer, TerminalLimitError, TerminalManager, TerminalSession
+)
+
+
+class FakeSocketIO:
+    """Records emits and runs background tasks on plain threads."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, payload, room=None):
+        if event == "terminal_output":
+            self.events.append((event, payload, room))
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def start_background_task(self, target, *args, **kwargs):
+        t = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        t.start()
+        return t
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_text_mode_keeps_split_multibyte_characters():
+    """A UTF-8 character split across reads is decoded intact"""
+    sio = FakeSocketIO()
+    ours, theirs = socket.socketpair()
+    term = TerminalSession(sio, ours, "c1", flush_interval=0.01)
+    term.attach("sid1", binary=False)
+    sio.events.clear()
+    term.start()
+
+    encoded = "héllo €".encode()
+    theirs.sendall(encoded[:2])
+    time.sleep(0.05)
+    theirs.sendall(encoded[2:])
+    theirs.close()
+
+    assert _wait_for(lambda: sum(p["bytes"] for _, p, _ in sio.events) == len(encoded))
+    assert "".join(p.get("output", "") for _, p, _ in sio.events) == "héllo €"
+    term.close()
+
+
+def test_reader_pauses_until_client_acks():
+    """No more output is read once the unacked credit is exhausted"""
+    sio = FakeSocketIO()
+    ours, theirs = socket.socketpair()
+    term = TerminalSession(sio, ours, "c1", buffer_bytes=10,
+                           flush_interval=0.01, max_unacked=10)
+    term.attach("sid1")
+    sio.events.clear()
+    term.start()
+
+    theirs.sendall(b"x" * 10)
+    assert _wait_for(lambda: term.unacked == 10)
+    theirs.sendall(b"y" * 10)
+    time.sleep(0.1)
+    assert [p["data"] for _, p, _ in sio.events if p["bytes"]] == [b"x" * 10]
+
+    term.ack(10)
+    assert _wait_for(lambda: sio.events[-1][1]["data"] == b"y" * 10)
+    term.close()
+    theirs.close()
+
+
+def test_scrollback_keeps_most_recent_bytes():
+    """The ring buffer wraps and keeps only the newest capacity bytes"""
+    ring = ScrollbackBuffer(8)
+    ring.write(b"abcde")
+    ring.write(b"fghij")
+    assert ring.getvalue() == b"cdefghij"
+    ring.write(b"0123456789")
+    assert ring.getvalue() == b"23456789"
+
+
+def test_detached_session_replays_scrollback_on_attach():
+    """Output produced while detached is replayed to the next client"""
+    sio = FakeSocketIO()
+    ours, theirs = socket.socketpair()
+    term = TerminalSession(sio, ours, "c1", flush_interval=0.01)
+    term.start()
+
+    theirs.sendall(b"while you were away")
+    time.sleep(0.1)
+    assert sio.events == []
+
+    term.attach("sid2")
+    event, payload, room = sio.events[0]
+    assert payload["replay"] and payload["data"] == b"while you were away"
+    assert room == "sid2"
+    term.close()
+    theirs.close()
+
+
+def test_manager_enforces_caps_and_reaps_detached_sessions():
+    """Per-user caps are enforced and detached sessions are reaped after the grace period"""
+    sio = FakeSocketIO()
+    manager = TerminalManager(sio, max_per_user=1, max_total=5,
+                              detach_grace=0, idle_timeout=3600, reap_interval=3600)
+    pairs = []
+
+    def factory():
+        pairs.append(socket.socketpair())
+        return pairs[-1][0]
+
+    term = manager.open(1, "c1", factory)
+    manager.attach("sid1", term)
+    with pytest.raises(TerminalLimitError):
+        manager.open(1, "c2", factory)
+    assert len(pairs) == 1                      # no exec created for the refused open
+
+    manager.reap()
+    assert not term.closed                      # attached sessions are kept
+    manager.detach_sid("sid1")
+    manager.reap()
+    assert term.closed
+    assert manager.get(1, "c1") is None
+    assert manager.stats()["reaped"]["detached"] == 1
+
+    manager.open(1, "c2", factory)              # the slot is free again
+    manager.shutdown()
+    assert manager.stats()["sessions"] == 0
+    for a, b in pairs:
+        b.close()
+
+
+def test_paste_burst_is_coalesced_and_echo_latency_recorded():
+    """A burst of input events becomes few writes; the echo is timed"""
+    sio = FakeSocketIO()
+    ours, theirs = socket.socketpair()
+    term = TerminalSession(sio, ours, "c1", flush_interval=0.01, input_window=0.05)
+    term.attach("sid1")
+    term.start()
+
+    for ch in "echo hello\n":
+        term.write(ch.encode())
+    time.sleep(0.1)
+    assert theirs.recv(100) == b"echo hello\n"
+    assert term.input_events == 11
+    assert term.input_writes == 2               # first key immediately, the rest batched
+
+    theirs.sendall(b"hello\r\n")
+    assert _wait_for(lambda: term.echo_latency.count == 1)
+    term.close()
+    theirs.close()
+
+
+def test_concurrent_opens_reserve_slots_and_reuse_the_session():
+    """Opens racing through a slow exec can't overshoot the caps or orphan a session"""
+    sio = FakeSocketIO()
+    manager = TerminalManager(sio, max_per_user=2, max_total=5, reap_interval=3600)
+    release, pairs = threading.Event(), []
+
+    def slow_factory():
+        release.wait(2)
+        pairs.append(socket.socketpair())
+        return pairs[-1][0]
+
+    results = []
+    def open_(container_id):
+        try:
+            results.append(manager.open(1, container_id, slow_factory))
+        except TerminalLimitError as exc:
+            results.append(exc)
+
+    threads = [threading.Thread(target=open_, args=(c,)) for c in ("c1", "c1", "c2", "c3")]
+    for t in threads:
+        t.start()
+    assert _wait_for(lambda: sum(isinstance(r, TerminalLimitError) for r in results) == 2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    sessions = [r for r in results if isinstance(r, TerminalSession)]
+    assert len(sessions) == 2 and len(pairs) == 2
+    assert manager.stats()["sessions"] == 2
+    assert manager.open(1, sessions[0].container_id, slow_factory) is sessions[0]
+    assert len(pairs) == 2                      # reused, no second exec
+
+    manager.shutdown()
+    for a, b in pairs:
+        b.close()
+
+
+def test_per_user_cap_spans_workers_with_shared_slots():
+    """Two managers sharing a SlotPool enforce one per-user cap; closing frees the slot"""
+    from cluster import SlotPool
+    from store import MemoryStore
+
+    store, pairs = MemoryStore(), []
+
+    def factory():
+        pairs.append(socket.socketpair())
+        return pairs[-1][0]
+
+    workers = [TerminalManager(FakeSocketIO(), max_per_user=2, reap_interval=3600,
+                               slots=SlotPool(store, "terminal", 2, ttl=60)) for _ in range(2)]
+    workers[0].open(1, "c1", factory)
+    term = workers[1].open(1, "c2", factory)
+    with pytest.raises(TerminalLimitError):
+        workers[0].open(1, "c3", factory)
+    assert len(pairs) == 2
+
+    term.close()
+    workers[0].open(1, "c3", factory)
+    for manager in workers:
+        manager.shutdown()
+    assert SlotPool(store, "terminal", 2, ttl=60).count(1) == 0
+    for a, b in pairs:
+        b.close()
@@ -256,7 +256,7 @@ function ProjectCard({ project, onDelete, onLaunched, onHistory }) {
       if (!data.success) throw new Error(data.error || "Launch failed");
       setConnDetails(data.connection);
       setLaunched(true);
-      onLaunched("success", `Workspace for "${project.name}" is live!`);
+      onLaunched("success", `Workspace for "${project.name}" is live!${data.notice ? ` ${data.notice}` : ""}`);
       setTimeout(() => navigate(`/workspace?project=${project.id}`), 1400);
     } catch (e) {
       onLaunched("error", e.message);
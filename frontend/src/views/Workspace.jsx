@@ -226,6 +226,7 @@ function useTerminal({ mountRef, containerId, socketRef }) {
   const termRef = useRef(null);
   const fitAddonRef = useRef(null);
   const outputListenerRef = useRef(null);
+  const reconnectListenerRef = useRef(null);
   const resizeObserverRef = useRef(null);
 
   const BANNER = (term) => {
@@ -307,12 +308,28 @@ function useTerminal({ mountRef, containerId, socketRef }) {
         term.writeln(`\x1b[33m⟳ Connecting to container \x1b[1m${containerId}\x1b[0m\x1b[33m…\x1b[0m`);
         socketRef.current.emit("terminal_join", { container_id: containerId });
 
+        // Binary frames arrive as { data: ArrayBuffer, bytes }; ack once
+        // rendered so the server keeps streaming (credit-based flow control).
         const listener = (data) => {
+          // Reattached to a live shell: its scrollback replaces what we show
+          if (data?.replay) term.reset();
+          const ack = data?.bytes
+            ? () => socketRef.current?.emit("terminal_ack", { bytes: data.bytes })
+            : undefined;
+          if (data?.data) {
+            term.write(new Uint8Array(data.data), ack);
+            return;
+          }
           const text = typeof data === "string" ? data : (data.output ?? "");
-          if (text) term.write(text);
+          if (text || ack) term.write(text, ack);
         };
         outputListenerRef.current = listener;
         socketRef.current.on("terminal_output", listener);
+
+        // A reconnect gets a new sid; rejoin to reattach to the same shell
+        const rejoin = () => socketRef.current?.emit("terminal_join", { container_id: containerId });
+        reconnectListenerRef.current = rejoin;
+        socketRef.current.on("connect", rejoin);
         term.writeln("\x1b[32m✓ Terminal attached — type to interact\x1b[0m\r\n");
       }
     }).catch((err) => {
@@ -329,6 +346,10 @@ function useTerminal({ mountRef, containerId, socketRef }) {
         socketRef.current.off("terminal_output", outputListenerRef.current);
         outputListenerRef.current = null;
       }
+      if (reconnectListenerRef.current && socketRef.current) {
+        socketRef.current.off("connect", reconnectListenerRef.current);
+        reconnectListenerRef.current = null;
+      }
       if (termRef.current) {
         termRef.current.dispose();
         termRef.current = null;
@@ -343,7 +364,7 @@ function useTerminal({ mountRef, containerId, socketRef }) {
   return { clear, fit };
 }
 
-function AIPanel({ editorContent, onClose }) {
+function AIPanel({ editorContent, projectId, filePath, getFocus, onClose }) {
   const [messages, setMessages] = useState([
     {
       role: "assistant",
@@ -354,13 +375,18 @@ function AIPanel({ editorContent, onClose }) {
   ]);
   const [query, setQuery] = useState("");
   const [loading, setLoading] = useState(false);
+  const [waiting, setWaiting] = useState(false);
   const [useContext, setUseContext] = useState(false);
   const messagesEndRef = useRef(null);
+  const abortRef = useRef(null);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages]);
 
+  // Abort an in-flight stream when the panel is closed (unmounted).
+  useEffect(() => () => abortRef.current?.abort(), []);
+
   const send = async () => {
     const q = query.trim();
     if (!q || loading) return;
@@ -369,34 +395,76 @@ function AIPanel({ editorContent, onClose }) {
     setMessages((prev) => [...prev, { role: "user", text: q, time: ts }]);
     setQuery("");
     setLoading(true);
+    setWaiting(true);
+
+    const controller = new AbortController();
+    abortRef.current = controller;
+    let text = "";
+    let started = false;
+
+    // Append the reply on the first token, then keep replacing its text.
+    const showReply = (replyText, extra = {}) => {
+      const replyTs = new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" });
+      setMessages((prev) => {
+        const reply = { role: "assistant", text: replyText, isMarkdown: true, time: replyTs, ...extra };
+        return started ? [...prev.slice(0, -1), reply] : [...prev, reply];
+      });
+      started = true;
+      setWaiting(false);
+    };
 
     try {
-      const res = await fetch("/api/ai/assist", {
+      const res = await fetch("/api/ai/assist/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           user_query: q,
           code_context: useContext ? (editorContent ?? "") : "",
+          project_id: projectId || undefined,
+          ...(useContext ? { file_path: filePath, ...getFocus?.() } : {}),
         }),
+        signal: controller.signal,
       });
-      const data = await res.json();
-      const replyTs = new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" });
-      setMessages((prev) => [
-        ...prev,
-        {
-          role: "assistant",
-          text: data.success ? data.suggestion : `⚠️ ${data.error || "Error"}`,
-          isMarkdown: true,
-          time: replyTs,
-        },
-      ]);
+      if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        showReply(`⚠️ ${data.error || `HTTP ${res.status}`}`);
+        return;
+      }
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+          const frame = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          const event = (frame.match(/^event: (.*)$/m) || [])[1];
+          const data = JSON.parse((frame.match(/^data: (.*)$/m) || [, "{}"])[1]);
+          if (event === "token") {
+            text += data.text;
+            showReply(text);
+          } else if (event === "done") {
+            showReply(text, { ttftMs: data.ttft_ms, totalMs: data.total_ms });
+          } else if (event === "error") {
+            showReply(`${text}${text ? "\n\n" : ""}⚠️ ${data.error || "Error"}`);
+          }
+        }
+      }
     } catch (e) {
-      setMessages((prev) => [
-        ...prev,
-        { role: "assistant", text: `⚠️ Network error: ${e.message}`, time: "—" },
-      ]);
+      if (e.name !== "AbortError") {
+        setMessages((prev) => [
+          ...prev,
+          { role: "assistant", text: `⚠️ Network error: ${e.message}`, time: "—" },
+        ]);
+      }
     } finally {
+      if (abortRef.current === controller) abortRef.current = null;
       setLoading(false);
+      setWaiting(false);
     }
   };
 
@@ -497,10 +565,13 @@ function AIPanel({ editorContent, onClose }) {
                 msg.text
               )}
             </div>
-            <span className="text-xs mt-0.5 px-1" style={{ color: "#3d5475" }}>{msg.time}</span>
+            <span className="text-xs mt-0.5 px-1" style={{ color: "#3d5475" }}>
+              {msg.time}
+              {msg.ttftMs != null && ` · first token ${Math.round(msg.ttftMs)} ms`}
+            </span>
           </div>
         ))}
-        {loading && (
+        {loading && waiting && (
           <div className="flex items-start">
             <div
               className="px-3 py-2 rounded-lg text-xs"
@@ -587,10 +658,13 @@ export default function Workspace() {
   const socketRef = useRef(null);
   const termMountRef = useRef(null);
   const dragRef = useRef(null);
+  const editorRef = useRef(null);
 
   // ── Socket.IO setup ────────────────────────────────────────
   useEffect(() => {
+    // WebSocket only: long-polling would need sticky sessions across workers.
     const sock = io({
+      transports: ["websocket"],
       reconnection: true,
       reconnectionAttempts: 5,
       reconnectionDelay: 1500,
@@ -640,6 +714,20 @@ export default function Workspace() {
       });
   }, [activeFile, projectId]);
 
+  // Cursor / selection for the AI context builder (1-based lines)
+  const getEditorFocus = useCallback(() => {
+    const editor = editorRef.current;
+    if (!editor) return {};
+    const focus = {};
+    const pos = editor.getPosition();
+    if (pos) focus.cursor_line = pos.lineNumber;
+    const sel = editor.getSelection();
+    if (sel && !sel.isEmpty()) {
+      focus.selection = { start_line: sel.startLineNumber, end_line: sel.endLineNumber };
+    }
+    return focus;
+  }, []);
+
   // ── Save (Ctrl+S) handler ──────────────────────────────────
   const handleSave = useCallback(async () => {
     if (!projectId || saving) return;
@@ -747,6 +835,7 @@ export default function Workspace() {
               theme="vs-dark"
               value={fileContent}
               onChange={(val) => setEditorContent(val ?? "")}
+              onMount={(editor) => { editorRef.current = editor; }}
               options={{
                 fontFamily: '"JetBrains Mono","DM Mono",monospace',
                 fontSize: 13,
@@ -878,6 +967,9 @@ export default function Workspace() {
         {aiOpen && (
           <AIPanel
             editorContent={editorContent}
+            projectId={projectId}
+            filePath={activeFile}
+            getFocus={getEditorFocus}
             onClose={() => setAiOpen(false)}
           />
         )}